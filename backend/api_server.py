@@ -1,35 +1,90 @@
 # api_server.py - Lightweight API server for auth and emergency requests
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from fastapi import Query
-import json
-import asyncio
-from typing import Dict, Set
-import threading
-import time
+import os
+from typing import Dict, List, Optional
+from pydantic import BaseModel
 
 # Import auth/emergency router
-from auth_emergency import router as auth_emergency_router
+from auth_emergency import router as auth_emergency_router, approval_listeners
+from signal_hub import ALL_JUNCTIONS, DEFAULT_DIRECTION, SignalHub
+from signal_backend import create_signal_backend
+from junction_registry import load_registry
+from signal_controller import PHASES, SignalController
+from signal_preemption import SignalPreemption
 
 app = FastAPI()
 app.include_router(auth_emergency_router)
 
-# Signal status management
-signal_status: Dict[str, str] = {}  # junction -> active_direction
-signal_subscribers: Dict[str, Set] = {}  # junction -> set of queues for SSE
-signal_lock = threading.Lock()
+# Signal status management (event-loop owned, no locks). Updates go through
+# the backend so every uvicorn worker's hub sees them.
+signal_hub = SignalHub()
+signal_status: Dict[str, str] = signal_hub.status  # junction -> active_direction
+signal_backend = create_signal_backend()
+junction_registry = load_registry()
+# Adaptive phase clock (only the elected worker publishes; see signal_controller)
+SIGNAL_CONTROLLER_ENABLED = os.environ.get('SIGNAL_CONTROLLER', '1') == '1'
+signal_controller = SignalController(signal_backend.publish_many, signal_backend.load_counts,
+                                     signal_backend.acquire_controller,
+                                     signal_backend.load_preemptions)
+# Approved emergency requests hold their junction green (see signal_preemption)
+signal_preemption = SignalPreemption(signal_backend, signal_hub,
+                                     signal_controller if SIGNAL_CONTROLLER_ENABLED else None)
 
-def initialize_signals():
-    """Initialize default signal states for all junctions"""
-    junctions = ['01_', '02_', '05_', 'rifatuslu_']
-    for junction in junctions:
-        signal_status[junction] = 'north'
-        signal_subscribers[junction] = set()
+class JunctionConfig(BaseModel):
+    id: str
+    drone_name: Optional[str] = None
+    aliases: List[str] = []
+    default_direction: str = 'north'
 
-# Initialize on startup
-initialize_signals()
+class SignalBatchUpdate(BaseModel):
+    updates: Dict[str, str]  # junction (any alias) -> direction
+
+class JunctionCounts(BaseModel):
+    counts: Dict[str, Dict[str, int]]  # junction (any alias) -> direction -> vehicles
+
+def resolve_junction(name: str) -> str:
+    """Canonical junction id for any alias; 404 for unknown junctions"""
+    junction_id = junction_registry.resolve(name)
+    if junction_id is None and name in signal_status:
+        # Registered at runtime on another worker (its state is shared)
+        junction_id = name
+    if junction_id is None:
+        raise HTTPException(status_code=404, detail=f"Junction {name} not found")
+    return junction_id
+
+async def preempt_for_approval(request: dict, received: float):
+    """Approval listener: turn the request's junction green for the emergency vehicle"""
+    name = request.get("junction")
+    junction_id = junction_registry.resolve(name) or (name if name in signal_status else None)
+    if junction_id is None:
+        print(f"Warning: Approved emergency request for unknown junction {name}")
+        return
+    direction = request.get("direction")
+    if direction not in PHASES:
+        junction = junction_registry.get(junction_id)
+        direction = junction.default_direction if junction else DEFAULT_DIRECTION
+    await signal_preemption.preempt(junction_id, direction, received)
+
+approval_listeners.append(preempt_for_approval)
+
+@app.on_event("startup")
+async def initialize_signals():
+    """Load shared signal state, seeding defaults for junctions never set"""
+    await signal_backend.start(signal_hub, junction_registry.defaults())
+    if SIGNAL_CONTROLLER_ENABLED:
+        signal_controller.add_junctions(signal_status)
+        signal_hub.listeners.append(signal_controller.set_phase)
+        signal_controller.start()
+
+@app.on_event("shutdown")
+async def shutdown_signals():
+    signal_preemption.stop()
+    await signal_controller.stop()
+    await signal_backend.stop()
 
 # Allow frontend access
 app.add_middleware(
@@ -47,54 +102,88 @@ def root():
 def health_check():
     return {"status": "healthy", "service": "api_server"}
 
+@app.get("/junctions")
+async def list_junctions():
+    """Registered junctions with their aliases and current signal"""
+    return {
+        "junctions": [
+            {**junction, "active_signal": signal_hub.get(junction["id"])}
+            for junction in junction_registry.to_list()
+        ]
+    }
+
+@app.post("/junctions")
+async def register_junction(config: JunctionConfig):
+    """Register (or update) a junction at runtime"""
+    try:
+        junction = junction_registry.register(**config.dict())
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if junction.id not in signal_status:
+        await signal_backend.publish(junction.id, junction.default_direction)
+    return {**junction.to_dict(), "active_signal": signal_hub.get(junction.id)}
+
 @app.get("/junction_signal_status")
-def get_signal_status_sse(junction: str = Query(...)):
-    """Server-Sent Events endpoint for real-time signal status"""
-    def event_stream():
-        # Create a queue for this client
-        import queue
-        client_queue = queue.Queue()
-        
-        with signal_lock:
-            signal_subscribers[junction].add(client_queue)
-            # Send current status immediately
-            current_status = signal_status.get(junction, 'north')
-        
-        try:
-            # Send initial status
-            yield f"data: {json.dumps({'active_signal': current_status})}\n\n"
-            
-            # Keep sending updates
-            while True:
-                try:
-                    # Wait for updates with timeout
-                    status = client_queue.get(timeout=30)
-                    yield f"data: {json.dumps({'active_signal': status})}\n\n"
-                except queue.Empty:
-                    # Send keepalive
-                    yield f"data: {json.dumps({'active_signal': signal_status.get(junction, 'north')})}\n\n"
-        finally:
-            # Clean up when client disconnects
-            with signal_lock:
-                signal_subscribers[junction].discard(client_queue)
+async def get_signal_status_sse(junction: str = Query(...),
+                                last_event_id: Optional[int] = Header(None)):
+    """Server-Sent Events endpoint for real-time signal status
     
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+    Reconnecting clients (``Last-Event-ID``) get the updates they missed replayed.
+    """
+    subscriber = signal_hub.subscribe(resolve_junction(junction))
+    return StreamingResponse(signal_hub.stream(subscriber, last_event_id),
+                             media_type="text/event-stream")
+
+@app.get("/junction_signal_status/all")
+async def get_all_signal_status_sse(last_event_id: Optional[int] = Header(None)):
+    """Every junction's signal updates on one SSE stream (for server-side caches)"""
+    subscriber = signal_hub.subscribe(ALL_JUNCTIONS)
+    return StreamingResponse(signal_hub.stream(subscriber, last_event_id),
+                             media_type="text/event-stream")
 
 @app.post("/junction_signal_status")
-def update_signal_status(junction: str = Query(...), direction: str = Query(...)):
-    """Update signal status and notify all subscribers"""
-    with signal_lock:
-        signal_status[junction] = direction
-        # Notify all subscribers for this junction
-        if junction in signal_subscribers:
-            for client_queue in signal_subscribers[junction].copy():
-                try:
-                    client_queue.put_nowait(direction)
-                except:
-                    # Remove dead queues
-                    signal_subscribers[junction].discard(client_queue)
-    
+async def update_signal_status(junction: str = Query(...), direction: str = Query(...)):
+    """Update signal status and notify all subscribers on every worker"""
+    await signal_backend.publish(resolve_junction(junction), direction)
     return {"success": True, "junction": junction, "active_signal": direction}
 
+@app.post("/junction_signal_status/batch")
+async def update_signal_status_batch(batch: SignalBatchUpdate):
+    """Update many junctions at once (e.g. a green wave) with one broadcast pass"""
+    updates = {resolve_junction(junction): direction
+               for junction, direction in batch.updates.items()}
+    await signal_backend.publish_many(updates.items())
+    return {"success": True, "updated": updates}
+
+@app.post("/junction_counts")
+async def update_junction_counts(batch: JunctionCounts):
+    """Per-direction vehicle counts (pushed by the drone server) for the signal controller"""
+    counts = {resolve_junction(junction): junction_counts
+              for junction, junction_counts in batch.counts.items()}
+    await signal_backend.save_counts(counts)
+    return {"success": True, "junctions": len(counts)}
+
+@app.get("/signal_preemption/stats")
+async def get_signal_preemption_stats():
+    """Emergency preemptions and the approve-to-green latency histogram"""
+    return signal_preemption.stats()
+
+@app.get("/signal_controller/stats")
+async def get_signal_controller_stats():
+    return signal_controller.stats()
+
+@app.get("/signal_controller/{junction}")
+async def get_signal_timing(junction: str):
+    """Active direction, seconds remaining and green split computed by the controller"""
+    state = signal_controller.state(resolve_junction(junction))
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"Junction {junction} is not controlled")
+    return state
+
+@app.get("/junction_signal_status/stats")
+async def get_signal_hub_stats():
+    """Subscriber and dropped-event counts per junction"""
+    return signal_hub.stats()
+
 if __name__ == "__main__":
     uvicorn.run("api_server:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -1,18 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, FastAPI
+from fastapi import APIRouter, Depends, HTTPException, status, Request, FastAPI, Query
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from passlib.context import CryptContext
 from jose import JWTError, jwt
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
 from bson import ObjectId
+from bson.errors import InvalidId
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Awaitable, Callable, List, Optional
+import asyncio
 import os
+import time
+
+from auth_cache import TTLCache
+from emergency_feed import EmergencyFeed
 
 SECRET_KEY = os.environ.get('JWT_SECRET', 'supersecretkey')
 ALGORITHM = 'HS256'
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+# Threads for bcrypt; more concurrent logins queue instead of taking more CPU
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', '2'))
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', '10000'))
+TOKEN_CACHE_TTL = float(os.environ.get('TOKEN_CACHE_TTL', '300'))
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', '5'))
+# Feed tickets stand in for the access token in the EventSource URL; signed
+# with a derived key so a ticket is never accepted as an access token
+FEED_TICKET_SECONDS = 30
+FEED_TICKET_KEY = f"{SECRET_KEY}:emergency-feed"
 
 app = FastAPI()
 
@@ -24,14 +43,32 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-client = MongoClient(os.environ.get('MONGO_URI', 'mongodb://localhost:27017'))
+client = AsyncIOMotorClient(os.environ.get('MONGO_URI', 'mongodb://localhost:27017'))
 db = client['traffic_management']
 users_col = db['users']
 emergency_col = db['emergency_requests']
 
+# Emergency request listings are paginated newest first by _id (ObjectIds grow
+# with insertion time), so every listing query is an index range scan
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+REQUEST_PROJECTION = {
+    "junction": 1, "direction": 1, "vehicle_id": 1, "cause": 1, "requested_by": 1,
+    "status": 1, "timestamp": 1, "updated_at": 1,
+}
+
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
+bcrypt_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix='bcrypt')
+# Verified claims per token (never kept past the token's own expiry)
+token_cache = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+user_cache = TTLCache(TOKEN_CACHE_SIZE, USER_CACHE_TTL)
+# Pushes request inserts and status changes to connected clients
+emergency_feed = EmergencyFeed()
+# Called with (approved request, time.perf_counter() when the approval arrived);
+# the API server registers signal preemption here
+approval_listeners: List[Callable[[dict, float], Awaitable[None]]] = []
 
 class User(BaseModel):
     username: str
@@ -39,11 +76,12 @@ class User(BaseModel):
 
 class EmergencyRequest(BaseModel):
     junction: str
+    direction: Optional[str] = None  # approach to turn green; junction default if unset
     vehicle_id: str
     cause: str
     requested_by: Optional[str] = None
     status: str = "pending"
-    timestamp: datetime = datetime.utcnow()
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 # Utility functions
 def verify_password(plain, hashed):
@@ -52,28 +90,130 @@ def verify_password(plain, hashed):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def run_bcrypt(fn, *args):
+    """Run bcrypt hashing/verification on its own bounded pool, off the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(bcrypt_executor, fn, *args)
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_user(username: str):
-    return users_col.find_one({"username": username})
+async def get_user(username: str):
+    user = user_cache.get(username)
+    if user is None:
+        user = await users_col.find_one({"username": username})
+        if user is not None:
+            user_cache.set(username, user)
+    return user
+
+def verify_token(token: str) -> dict:
+    """Verified JWT claims, decoded once per token and then served from the cache"""
+    claims = token_cache.get(token)
+    if claims is None:
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        if claims.get("sub") is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        token_cache.set(token, claims, ttl=claims.get("exp", 0) - time.time())
+    return claims
+
+def create_feed_ticket(claims: dict) -> str:
+    ticket = {"sub": claims["sub"], "exp": datetime.utcnow() + timedelta(seconds=FEED_TICKET_SECONDS)}
+    if "role" in claims:
+        ticket["role"] = claims["role"]
+    return jwt.encode(ticket, FEED_TICKET_KEY, algorithm=ALGORITHM)
+
+def verify_feed_ticket(ticket: str) -> dict:
+    try:
+        return jwt.decode(ticket, FEED_TICKET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired feed ticket")
+
+async def get_current_claims(token: str = Depends(oauth2_scheme)) -> dict:
+    return verify_token(token)
+
+async def get_current_username(claims: dict = Depends(get_current_claims)) -> str:
+    return claims["sub"]
+
+async def get_admin_claims(claims: dict = Depends(get_current_claims)) -> dict:
+    """Claims of an admin token; 403 for any other user"""
+    if claims.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return claims
+
+async def create_indexes():
+    """Indexes backing the emergency request queries"""
+    await emergency_col.create_index([("requested_by", ASCENDING), ("_id", DESCENDING)])
+    await emergency_col.create_index([("status", ASCENDING), ("_id", DESCENDING)])
+    await emergency_col.create_index([("requested_by", ASCENDING), ("status", ASCENDING),
+                                      ("_id", DESCENDING)])
+
+async def find_page(query: dict, limit: int, cursor: Optional[str]):
+    """
+    One page of emergency requests, newest first.
+    
+    ``cursor`` is the ``next_cursor`` of the previous page (the last _id it
+    returned); pages never skip over documents, so cost does not grow with depth.
+    """
+    if cursor:
+        try:
+            query = {**query, "_id": {"$lt": ObjectId(cursor)}}
+        except InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    docs = await emergency_col.find(query, REQUEST_PROJECTION) \
+        .sort("_id", DESCENDING).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = str(docs[limit - 1]['_id']) if len(docs) > limit else None
+    items = docs[:limit]
+    for r in items:
+        r['_id'] = str(r['_id'])
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.on_event("startup")
+async def startup_indexes():
+    try:
+        await create_indexes()
+    except Exception as e:
+        print(f"Warning: Could not create emergency request indexes - {e}")
+    emergency_feed.start(emergency_col)
+
+@router.on_event("shutdown")
+async def shutdown_feed():
+    await emergency_feed.stop()
+
+async def set_request_status(request_id: str, new_status: str):
+    """Update a request's status and notify the feed; 404 if it does not exist"""
+    try:
+        object_id = ObjectId(request_id)
+    except InvalidId:
+        raise HTTPException(status_code=404, detail="Emergency request not found")
+    doc = await emergency_col.find_one_and_update(
+        {"_id": object_id},
+        {"$set": {"status": new_status, "updated_at": datetime.utcnow()}},
+        projection=REQUEST_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Emergency request not found")
+    emergency_feed.notify_local('update', doc)
+    return doc
 
 # Auth endpoints
 @router.post("/auth/signup")
-def signup(user: User):
-    if get_user(user.username):
+async def signup(user: User):
+    if await get_user(user.username):
         raise HTTPException(status_code=400, detail="Username already exists")
-    hashed = get_password_hash(user.password)
-    users_col.insert_one({"username": user.username, "password": hashed})
+    hashed = await run_bcrypt(get_password_hash, user.password)
+    await users_col.insert_one({"username": user.username, "password": hashed})
     return {"msg": "Signup successful"}
 
 @router.post("/auth/token")
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = get_user(form_data.username)
-    if not user or not verify_password(form_data.password, user['password']):
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+    user = await get_user(form_data.username)
+    if not user or not await run_bcrypt(verify_password, form_data.password, user['password']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     # Always include 'sub' field in JWT payload
     payload = {"sub": user['username']}
@@ -93,103 +233,93 @@ def admin_login(form_data: OAuth2PasswordRequestForm = Depends()):
 
 # Emergency request endpoints
 @router.post("/emergency/request")
-def request_emergency(er: EmergencyRequest, token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+async def request_emergency(er: EmergencyRequest, username: str = Depends(get_current_username)):
     er.requested_by = username
-    emergency_col.insert_one(er.dict())
+    doc = er.dict()
+    await emergency_col.insert_one(doc)
+    emergency_feed.notify_local('insert', doc)
     return {"msg": "Emergency request submitted"}
 
 @router.get("/emergency/requests")
-def get_emergency_requests(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    requests = list(emergency_col.find({}))
-    for r in requests:
-        r['_id'] = str(r['_id'])
-    return requests
+async def get_emergency_requests(username: str = Depends(get_current_username),
+                                 status: Optional[str] = None,
+                                 limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                 cursor: Optional[str] = None):
+    query = {"status": status} if status else {}
+    return await find_page(query, limit, cursor)
 
 @router.get("/emergency/my-requests")
-def get_my_emergency_requests(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
+async def get_my_emergency_requests(username: str = Depends(get_current_username),
+                                    status: Optional[str] = None,
+                                    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                    cursor: Optional[str] = None):
     # Filter requests by the authenticated user
-    requests = list(emergency_col.find({"requested_by": username}))
-    for r in requests:
-        r['_id'] = str(r['_id'])
-    return requests
+    query = {"requested_by": username}
+    if status:
+        query["status"] = status
+    return await find_page(query, limit, cursor)
 
 @router.patch("/emergency-requests/{request_id}/approve")
-def approve_emergency_request(request_id: str, token: str = Depends(oauth2_scheme)):
-    try:
-        # Verify admin token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
+async def approve_emergency_request(request_id: str, username: str = Depends(get_current_username)):
+    received = time.perf_counter()
     try:
-        result = emergency_col.update_one(
-            {"_id": ObjectId(request_id)},
-            {"$set": {"status": "approved", "updated_at": datetime.utcnow()}}
-        )
-        if result.modified_count == 0:
-            raise HTTPException(status_code=404, detail="Emergency request not found")
+        request = await set_request_status(request_id, "approved")
+        for listener in approval_listeners:
+            try:
+                await listener(request, received)
+            except Exception as e:
+                print(f"Warning: Approval listener failed for {request_id} - {e}")
         return {"message": "Emergency request approved"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.patch("/emergency-requests/{request_id}/deny")
-def deny_emergency_request(request_id: str, token: str = Depends(oauth2_scheme)):
+async def deny_emergency_request(request_id: str, username: str = Depends(get_current_username)):
     try:
-        # Verify admin token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    try:
-        result = emergency_col.update_one(
-            {"_id": ObjectId(request_id)},
-            {"$set": {"status": "denied", "updated_at": datetime.utcnow()}}
-        )
-        if result.modified_count == 0:
-            raise HTTPException(status_code=404, detail="Emergency request not found")
+        await set_request_status(request_id, "denied")
         return {"message": "Emergency request denied"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/emergency/deny")
-def deny_emergency(request_id: str, token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    emergency_col.update_one({"_id": request_id}, {"$set": {"status": "denied"}})
+async def deny_emergency(request_id: str, username: str = Depends(get_current_username)):
+    await emergency_col.update_one({"_id": request_id}, {"$set": {"status": "denied"}})
     return {"msg": "Request denied"}
 
+@router.post("/emergency/feed/ticket")
+async def create_emergency_feed_ticket(claims: dict = Depends(get_current_claims)):
+    """
+    Short-lived ticket for opening the feed. EventSource cannot send headers,
+    and the access token must not end up in URLs and access logs.
+    """
+    return {"ticket": create_feed_ticket(claims), "expires_in": FEED_TICKET_SECONDS}
+
+@router.get("/emergency/feed")
+async def get_emergency_feed(ticket: str = Query(..., description="Ticket from POST /emergency/feed/ticket")):
+    """
+    Server-Sent Events feed of emergency request inserts and status changes.
+    
+    Admins get every request; other users only their own. The ticket is
+    only checked when the feed is opened.
+    """
+    claims = verify_feed_ticket(ticket)
+    subscriber = emergency_feed.subscribe(claims["sub"], claims.get("role") == "admin")
+    return StreamingResponse(emergency_feed.stream(subscriber), media_type="text/event-stream")
+
+@router.get("/emergency/feed/stats", dependencies=[Depends(get_admin_claims)])
+async def get_emergency_feed_stats():
+    """Feed source (change stream or in-process) and connected clients"""
+    return emergency_feed.stats()
+
+@router.get("/auth/cache_stats", dependencies=[Depends(get_admin_claims)])
+async def get_auth_cache_stats():
+    """Token and user cache hit rates"""
+    return {"tokens": token_cache.stats(), "users": user_cache.stats(),
+            "bcrypt_rounds": BCRYPT_ROUNDS, "bcrypt_workers": BCRYPT_WORKERS}
+
 # Include the router in the app
 app.include_router(router)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Auth throughput benchmark against a running API server (and its MongoDB).
+
+Signs up a benchmark user, then measures
+- logins/sec: concurrent POST /auth/token (bcrypt verification)
+- authorised requests/sec: concurrent GET /emergency/my-requests?limit=1
+  with one bearer token (JWT claims served from the token cache)
+
+    python bench_auth.py --url http://localhost:8000 --logins 200 --requests 5000
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+import aiohttp
+
+
+async def _run_concurrently(total, concurrency, fn):
+    """Run ``fn`` ``total`` times with at most ``concurrency`` in flight; returns (ok, seconds)"""
+    remaining = iter(range(total))
+    ok = 0
+
+    async def worker():
+        nonlocal ok
+        for _ in remaining:
+            if await fn():
+                ok += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return ok, time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark login and authorised request throughput")
+    parser.add_argument('--url', default='http://localhost:8000', help="API server base URL")
+    parser.add_argument('--logins', type=int, default=200, help="Login attempts")
+    parser.add_argument('--requests', type=int, default=5000, help="Authorised requests")
+    parser.add_argument('--concurrency', type=int, default=32, help="Requests in flight")
+    parser.add_argument('--admin-password', default='admin123',
+                        help="Admin password, for reading the cache stats")
+    args = parser.parse_args()
+
+    username = f"bench_{uuid.uuid4().hex[:8]}"
+    password = uuid.uuid4().hex
+    credentials = {"username": username, "password": password}
+
+    async with aiohttp.ClientSession() as session:
+        async with session.post(f"{args.url}/auth/signup", json=credentials) as response:
+            response.raise_for_status()
+
+        token = None
+
+        async def login():
+            nonlocal token
+            async with session.post(f"{args.url}/auth/token", data=credentials) as response:
+                if response.status != 200:
+                    return False
+                token = (await response.json())["access_token"]
+                return True
+
+        ok, elapsed = await _run_concurrently(args.logins, args.concurrency, login)
+        print(f"🔑 {ok}/{args.logins} logins in {elapsed:.2f}s -> {ok / elapsed:.1f} logins/sec")
+
+        headers = {"Authorization": f"Bearer {token}"}
+
+        async def authorised_request():
+            async with session.get(f"{args.url}/emergency/my-requests?limit=1",
+                                   headers=headers) as response:
+                await response.read()
+                return response.status == 200
+
+        ok, elapsed = await _run_concurrently(args.requests, args.concurrency, authorised_request)
+        print(f"📨 {ok}/{args.requests} authorised requests in {elapsed:.2f}s "
+              f"-> {ok / elapsed:.1f} requests/sec")
+
+        async with session.post(f"{args.url}/auth/admin/token",
+                                data={"username": "admin", "password": args.admin_password}) as response:
+            response.raise_for_status()
+            admin_token = (await response.json())["access_token"]
+        async with session.get(f"{args.url}/auth/cache_stats",
+                               headers={"Authorization": f"Bearer {admin_token}"}) as response:
+            print(f"📊 Cache stats: {await response.json()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
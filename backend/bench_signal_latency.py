@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Cross-worker signal latency benchmark.
+
+Starts several listener processes, each with its own SignalHub and
+SQLiteSignalBackend (as uvicorn workers would have), subscribes to a junction
+in each, then publishes updates from a separate process and reports the time
+from publish to delivery on every listener.
+
+    python bench_signal_latency.py --workers 4 --updates 500
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import statistics
+import tempfile
+import time
+
+from signal_backend import SQLiteSignalBackend
+from signal_hub import SignalHub
+
+JUNCTION = 'bench_'
+# Published after the last timed update; listeners stop when they see it
+DONE = 'done'
+
+
+def event_direction(event):
+    """Active signal of a subscriber queue item, an (event id, formatted SSE event) tuple"""
+    _, text = event
+    data = next(line for line in text.splitlines() if line.startswith("data: "))
+    return json.loads(data[len("data: "):])['active_signal']
+
+
+async def _listen(db_path, poll_interval, updates, ready, results):
+    hub = SignalHub(buffer_size=updates + 1)
+    backend = SQLiteSignalBackend(db_path, poll_interval)
+    await backend.start(hub, {})
+    subscriber = hub.subscribe(JUNCTION)
+    ready.set()
+    latencies = []
+    while True:
+        event = await subscriber.queue.get()
+        received = time.time()
+        # Direction carries the publish timestamp
+        direction = event_direction(event)
+        if direction == DONE:
+            break
+        latencies.append(received - float(direction))
+    await backend.stop()
+    results.put(latencies)
+
+
+def listener(db_path, poll_interval, updates, ready, results):
+    asyncio.run(_listen(db_path, poll_interval, updates, ready, results))
+
+
+async def _publish(db_path, updates, interval):
+    backend = SQLiteSignalBackend(db_path)
+    await backend.start(SignalHub(), {})
+    for _ in range(updates):
+        await backend.publish(JUNCTION, repr(time.time()))
+        await asyncio.sleep(interval)
+    await backend.publish(JUNCTION, DONE)
+    await backend.stop()
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cross-worker signal delivery")
+    parser.add_argument('--workers', type=int, default=4, help="Listener processes")
+    parser.add_argument('--updates', type=int, default=500, help="Updates to publish")
+    parser.add_argument('--interval-ms', type=float, default=5, help="Delay between updates")
+    parser.add_argument('--poll-ms', type=float, default=20, help="Backend poll interval")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench_signals.db')
+    results = mp.Queue()
+    ready_events = [mp.Event() for _ in range(args.workers)]
+    listeners = [
+        mp.Process(target=listener,
+                   args=(db_path, args.poll_ms / 1000, args.updates, ready, results))
+        for ready in ready_events
+    ]
+    for process in listeners:
+        process.start()
+    for ready in ready_events:
+        ready.wait()
+
+    started = time.perf_counter()
+    asyncio.run(_publish(db_path, args.updates, args.interval_ms / 1000))
+    latencies = [latency for _ in listeners for latency in results.get()]
+    elapsed = time.perf_counter() - started
+    for process in listeners:
+        process.join()
+
+    ms = [latency * 1000 for latency in latencies]
+    print(f"📡 {args.updates} updates -> {args.workers} workers in {elapsed:.2f}s "
+          f"(poll {args.poll_ms:g} ms)")
+    # A poll delivers only each junction's newest state, so updates published
+    # within one poll interval of each other are superseded, not delayed
+    print(f"   delivered {len(ms) / args.workers:.0f} of {args.updates} updates per worker")
+    print(f"   mean {statistics.mean(ms):.2f} ms | p50 {percentile(ms, 50):.2f} ms | "
+          f"p95 {percentile(ms, 95):.2f} ms | p99 {percentile(ms, 99):.2f} ms | "
+          f"max {max(ms):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
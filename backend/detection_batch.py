@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Columnar containers for the vehicle detections of one frame.
+
+YOLO boxes are copied to the host in a single transfer (``boxes.data``) and
+kept as contiguous NumPy arrays. Class and confidence filtering, centre
+computation and serialisation all operate on whole columns instead of
+per-box Python dicts. ``ClusterResult`` adds the frame's zone assignment.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# COCO vehicle classes: car(2), motorcycle(3), bus(5), truck(7)
+VEHICLE_CLASSES = np.array([2, 3, 5, 7])
+CONFIDENCE_THRESHOLD = 0.5
+
+
+class DetectionBatch:
+    """Detections of one frame as xyxy / conf / cls arrays"""
+
+    __slots__ = ('xyxy', 'conf', 'cls')
+
+    def __init__(self, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray):
+        """
+        Args:
+            xyxy: (N, 4) float32 box corners
+            conf: (N,) float32 confidences
+            cls: (N,) int16 COCO class ids
+        """
+        self.xyxy = np.ascontiguousarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.ascontiguousarray(conf, dtype=np.float32).reshape(-1)
+        self.cls = np.ascontiguousarray(cls, dtype=np.int16).reshape(-1)
+
+    @classmethod
+    def empty(cls) -> 'DetectionBatch':
+        return cls(np.empty((0, 4)), np.empty(0), np.empty(0))
+
+    @classmethod
+    def from_array(cls, data: np.ndarray, classes: Optional[np.ndarray] = VEHICLE_CLASSES,
+                   min_confidence: float = CONFIDENCE_THRESHOLD) -> 'DetectionBatch':
+        """
+        Build from an (N, 6) ``[x1, y1, x2, y2, conf, cls]`` array, keeping
+        only the requested classes above the confidence threshold.
+        """
+        data = np.asarray(data, dtype=np.float32).reshape(-1, 6)
+        keep = data[:, 4] > min_confidence
+        if classes is not None:
+            keep &= np.isin(data[:, 5].astype(np.int16), classes)
+        data = data[keep]
+        return cls(data[:, :4], data[:, 4], data[:, 5])
+
+    @classmethod
+    def from_result(cls, result, classes: Optional[np.ndarray] = VEHICLE_CLASSES,
+                    min_confidence: float = CONFIDENCE_THRESHOLD) -> 'DetectionBatch':
+        """Build from one ultralytics ``Results`` with one device-to-host copy"""
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return cls.empty()
+        return cls.from_array(boxes.data.cpu().numpy(), classes, min_confidence)
+
+    @classmethod
+    def from_dicts(cls, detections: List[Dict]) -> 'DetectionBatch':
+        """Build from legacy ``{'bbox': [x, y, w, h], 'confidence', 'class_id'}`` dicts"""
+        if not detections:
+            return cls.empty()
+        bbox = np.array([d['bbox'] for d in detections], dtype=np.float32)
+        xyxy = np.concatenate([bbox[:, :2], bbox[:, :2] + bbox[:, 2:]], axis=1)
+        conf = [d.get('confidence', 0.0) for d in detections]
+        class_ids = [d.get('class_id', -1) for d in detections]
+        return cls(xyxy, conf, class_ids)
+
+    @classmethod
+    def coerce(cls, detections) -> 'DetectionBatch':
+        """Accept either a DetectionBatch or a list of legacy dicts"""
+        if isinstance(detections, cls):
+            return detections
+        return cls.from_dicts(detections)
+
+    def __len__(self) -> int:
+        return len(self.conf)
+
+    def __getitem__(self, index) -> 'DetectionBatch':
+        """Select detections with an index array or boolean mask"""
+        return DetectionBatch(self.xyxy[index], self.conf[index], self.cls[index])
+
+    @property
+    def nbytes(self) -> int:
+        return self.xyxy.nbytes + self.conf.nbytes + self.cls.nbytes
+
+    def centers(self) -> np.ndarray:
+        """
+        Integer box centres as (N, 2), computed exactly like the dict path
+        did: ``int(x + w / 2)`` with ``w`` taken in float32.
+        """
+        wh = self.xyxy[:, 2:] - self.xyxy[:, :2]
+        centers = self.xyxy[:, :2].astype(np.float64) + wh.astype(np.float64) / 2
+        return centers.astype(np.int64)
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Serialise to the legacy per-box dict format (for JSON payloads)"""
+        bbox = np.concatenate([self.xyxy[:, :2], self.xyxy[:, 2:] - self.xyxy[:, :2]], axis=1)
+        return [
+            {'bbox': b, 'confidence': c, 'class_id': k}
+            for b, c, k in zip(bbox.tolist(), self.conf.tolist(), self.cls.tolist())
+        ]
+
+
+class ClusterResult:
+    """
+    Zone assignment of one frame's detections, computed once and shared by
+    counting, drawing and SSE payloads.
+
+    Holds no image data, so a few seconds of results fit comfortably in a
+    ring buffer (roughly 25 bytes per detection plus a small fixed overhead).
+    """
+
+    __slots__ = ('junction_name', 'detections', 'assignments', 'directions',
+                 'counts', 'frame_index', 'timestamp')
+
+    def __init__(self, junction_name: str, detections: DetectionBatch,
+                 assignments: np.ndarray, directions: List[str], counts: Dict[str, int],
+                 frame_index: int = -1, timestamp: float = 0.0):
+        """
+        Args:
+            junction_name: Junction the detections were clustered for
+            detections: The frame's detections
+            assignments: int8 index into ``directions`` per detection (-1: none)
+            directions: Zone names in assignment-index order
+            counts: Vehicles per direction
+        """
+        self.junction_name = junction_name
+        self.detections = detections
+        self.assignments = assignments
+        self.directions = directions
+        self.counts = counts
+        self.frame_index = frame_index
+        self.timestamp = timestamp
+
+    def __len__(self) -> int:
+        return len(self.detections)
+
+    @property
+    def nbytes(self) -> int:
+        return self.detections.nbytes + self.assignments.nbytes
+
+    def in_direction(self, direction: str) -> DetectionBatch:
+        """Detections assigned to one direction"""
+        if direction not in self.directions:
+            return DetectionBatch.empty()
+        return self.detections[self.assignments == self.directions.index(direction)]
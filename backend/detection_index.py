@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Precomputed detection indexes for recorded videos, and replay from them.
+
+``precompute_detections.py`` runs detection (and hexagonal clustering for
+drone junctions) over every frame of a recording once and writes an index
+directory per video under ``DETECTION_INDEX_DIR/<kind>/<name>/``:
+
+- ``offsets.npy``: int64 (frames + 1) row offsets into the detection columns
+- ``xyxy.npy`` / ``conf.npy`` / ``cls.npy``: float32 / float32 / int16 detections
+- ``assignments.npy``: int8 index into the junction's zones per detection (-1: none)
+- ``counts.npy``: int32 (frames, directions) vehicles per direction
+- ``meta.json``: zones, directions, fps and what the index was built from
+
+With ``DETECTION_REPLAY=1`` the detection and video servers load no model and
+serve vehicle counts from the index instead, so a demo machine can run many
+dashboards without inference headroom. Replay follows the wall clock
+(``position``), so every worker and dashboard shows the same frame.
+"""
+
+import json
+import logging
+import os
+import shutil
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from detection_batch import ClusterResult, DetectionBatch
+
+logger = logging.getLogger(__name__)
+
+DETECTION_INDEX_DIR = os.environ.get(
+    'DETECTION_INDEX_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'detection_index'))
+DETECTION_REPLAY = os.environ.get('DETECTION_REPLAY', '0') == '1'
+INDEX_VERSION = 1
+
+
+def video_identity(video_path: str) -> Dict[str, Any]:
+    """What an index records about its source video, to detect a replaced file"""
+    stat = os.stat(video_path)
+    return {"file": os.path.basename(video_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def index_path(kind: str, name: str, root: str = DETECTION_INDEX_DIR) -> str:
+    return os.path.join(root, kind, name)
+
+
+def write_index(directory: str, detections: List[DetectionBatch],
+                clusters: Optional[List[ClusterResult]], meta: Dict[str, Any]):
+    """
+    Write an index from per-frame detections (and their clustering, if any).
+
+    Counts are stored for every direction the clustering reports, so replayed
+    count payloads match the live ones.
+
+    The index is built in a temporary directory and swapped in, so a server
+    reading the old one never sees a half-written index.
+    """
+    lengths = np.fromiter((len(batch) for batch in detections), dtype=np.int64,
+                          count=len(detections))
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    zones: List[str] = clusters[0].directions if clusters else []
+    directions: List[str] = list(clusters[0].counts) if clusters else []
+    if clusters is not None:
+        assignments = np.concatenate([c.assignments for c in clusters] or [np.empty(0)]).astype(np.int8)
+        counts = np.array([[c.counts.get(d, 0) for d in directions] for c in clusters],
+                          dtype=np.int32).reshape(len(clusters), len(directions))
+    else:
+        assignments = np.full(int(offsets[-1]), -1, dtype=np.int8)
+        counts = np.zeros((len(detections), 0), dtype=np.int32)
+
+    temp_dir = f"{directory}.{os.getpid()}.tmp"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    columns = {
+        'offsets': offsets,
+        'xyxy': np.concatenate([b.xyxy for b in detections] or [np.empty((0, 4))]).astype(np.float32),
+        'conf': np.concatenate([b.conf for b in detections] or [np.empty(0)]).astype(np.float32),
+        'cls': np.concatenate([b.cls for b in detections] or [np.empty(0)]).astype(np.int16),
+        'assignments': assignments,
+        'counts': counts,
+    }
+    for name, column in columns.items():
+        np.save(os.path.join(temp_dir, f"{name}.npy"), column)
+    with open(os.path.join(temp_dir, 'meta.json'), 'w') as f:
+        json.dump({**meta, "version": INDEX_VERSION, "frames": len(detections),
+                   "zones": zones, "directions": directions}, f, indent=2)
+
+    old_dir = f"{directory}.{os.getpid()}.old"
+    if os.path.exists(directory):
+        os.replace(directory, old_dir)
+    os.replace(temp_dir, directory)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def read_meta(directory: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == INDEX_VERSION else None
+
+
+class DetectionIndex:
+    """Memory-mapped, read-only view of one video's precomputed detections"""
+
+    def __init__(self, directory: str):
+        meta = read_meta(directory)
+        if meta is None:
+            raise FileNotFoundError(f"No detection index at {directory}")
+        self.directory = directory
+        self.meta = meta
+        self.zones: List[str] = meta["zones"]
+        self.directions: List[str] = meta["directions"]
+        self.frames: int = meta["frames"]
+        if self.frames <= 0:
+            raise ValueError(f"Detection index at {directory} has no frames")
+        self.fps: float = meta.get("fps") or 30.0
+        columns = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+                   for name in ('offsets', 'xyxy', 'conf', 'cls', 'assignments', 'counts')}
+        self.offsets = columns['offsets']
+        self.xyxy = columns['xyxy']
+        self.conf = columns['conf']
+        self.cls = columns['cls']
+        self.assignments = columns['assignments']
+        self.direction_counts = columns['counts']
+        self.totals = np.diff(self.offsets)
+
+    def stale(self, video_path: str) -> bool:
+        """Whether the source video has changed since the index was built"""
+        try:
+            return video_identity(video_path) != self.meta.get("video")
+        except OSError:
+            return False  # replay deployments may ship the index without the video
+
+    def position(self, timestamp: float) -> int:
+        """Absolute replay frame at a wall-clock time (shared by all viewers and workers)"""
+        return int(timestamp * self.fps)
+
+    def _rows(self, frame: int) -> slice:
+        frame %= self.frames
+        return slice(int(self.offsets[frame]), int(self.offsets[frame + 1]))
+
+    def detections(self, frame: int) -> DetectionBatch:
+        """Detections of a frame (wrapping around the recording)"""
+        rows = self._rows(frame)
+        return DetectionBatch(np.array(self.xyxy[rows]), np.array(self.conf[rows]),
+                              np.array(self.cls[rows]))
+
+    def total(self, frame: int) -> int:
+        return int(self.totals[frame % self.frames])
+
+    def counts(self, frame: int) -> Dict[str, int]:
+        """Vehicles per direction in a frame"""
+        row = self.direction_counts[frame % self.frames].tolist()
+        return dict(zip(self.directions, row))
+
+    def cluster(self, junction_name: str, frame: int, timestamp: float) -> ClusterResult:
+        """A frame's clustering rebuilt from the index, as the live pipeline would produce it"""
+        rows = self._rows(frame)
+        return ClusterResult(junction_name, self.detections(frame), np.array(self.assignments[rows]),
+                             list(self.zones), self.counts(frame), frame, timestamp)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "frames": self.frames,
+            "fps": self.fps,
+            "detections": int(self.offsets[-1]),
+            "zones": self.zones,
+            "source": self.meta.get("video"),
+            "model": self.meta.get("model"),
+            "built_at": self.meta.get("built_at"),
+        }
+
+
+_loaded: Dict[str, DetectionIndex] = {}
+
+
+def load_index(kind: str, name: str) -> Optional[DetectionIndex]:
+    """A video's index (loaded once per process), or None if it has not been precomputed"""
+    directory = index_path(kind, name)
+    if directory not in _loaded:
+        try:
+            _loaded[directory] = DetectionIndex(directory)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Detection index {kind}/{name} unavailable: {e}")
+            return None
+        logger.info(f"📇 Loaded detection index {kind}/{name}")
+    return _loaded[directory]
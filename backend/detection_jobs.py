@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Uploaded-video detection as background jobs.
+
+``POST /detect_vehicles_video/`` used to run YOLO on every frame of the upload
+serially inside the request. Now it stores the upload and processes the video
+as a background job:
+
+- the video is split into frame ranges (segments) that run in parallel on a
+  process pool, one YOLO model per worker process;
+- finished segments are merged in frame order, so the counts seen so far are
+  always a contiguous prefix of the video;
+- ``GET /detect_vehicles_video/jobs/{job_id}`` returns status and counts, and
+  ``.../events`` streams progress and each newly merged run of frames (SSE).
+
+By default the request still waits and answers with the old response shape;
+``?wait=false`` returns the job id at once (202) for clients that follow the
+job instead.
+
+``POST /detect_vehicles_video/stream`` takes the video as the raw request body
+and decodes it while it is still arriving (see ``streaming_ingest``): the
+response streams per-frame counts as they are produced, and the same counts
+can be followed as a job from another connection (``X-Job-Id``).
+
+Finished results are kept in a content-addressed cache (``result_cache``):
+uploads are hashed while they are copied or streamed, and a repeated upload
+of the same video with the same model and parameters is answered from it. A
+streamed upload sent with ``X-Content-SHA256`` whose hash is cached has its
+body hashed without decoding, and is answered from the cache once the hash
+matches.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import cv2
+from fastapi import APIRouter, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from detection_batch import VEHICLE_CLASSES
+from inference_executor import InferenceExecutor, count_frames_in_worker
+from result_cache import HashingStream, ResultCache, copy_and_hash, model_identity
+from streaming_ingest import DuplexStreamingResponse, count_stream, stream_frames, track_body
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_MODEL_PATH = os.environ.get('UPLOAD_MODEL_PATH', 'yolov8n.pt')
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', str(os.cpu_count() or 1)))
+# Frames per segment; 0 picks a size giving each worker several segments
+UPLOAD_SEGMENT_FRAMES = int(os.environ.get('UPLOAD_SEGMENT_FRAMES', '0'))
+MIN_SEGMENT_FRAMES = 32
+SEGMENTS_PER_WORKER = 4
+UPLOAD_BATCH_SIZE = int(os.environ.get('UPLOAD_BATCH_SIZE', '8'))
+# Uploads count every vehicle-class box regardless of confidence
+UPLOAD_MIN_CONFIDENCE = 0.0
+RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE', '1') == '1'
+# Finished jobs kept for status queries
+MAX_FINISHED_JOBS = 100
+KEEPALIVE_SECONDS = 30
+
+
+def plan_segments(total_frames: int, workers: int,
+                  segment_frames: int = UPLOAD_SEGMENT_FRAMES) -> List[Tuple[int, Optional[int]]]:
+    """
+    Split ``total_frames`` into ``[start, stop)`` ranges. The last range is
+    open ended (stop None) because container frame counts are estimates.
+    """
+    if total_frames <= 0:
+        return [(0, None)]
+    if segment_frames <= 0:
+        segment_frames = max(MIN_SEGMENT_FRAMES,
+                             math.ceil(total_frames / (workers * SEGMENTS_PER_WORKER)))
+    starts = list(range(0, total_frames, segment_frames))
+    return [(start, starts[i + 1] if i + 1 < len(starts) else None)
+            for i, start in enumerate(starts)]
+
+
+def probe_frame_count(video_path: str) -> int:
+    """Frame count from the container header (an estimate; 0 if unknown)"""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        return int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    finally:
+        cap.release()
+
+
+class DetectionJob:
+    """One uploaded video being counted segment by segment"""
+
+    def __init__(self, job_id: str, video_path: str, filename: Optional[str],
+                 segments: List[Tuple[int, Optional[int]]], total_frames: int):
+        self.id = job_id
+        self.video_path = video_path
+        self.filename = filename
+        self.segments = segments
+        self.total_frames = total_frames
+        self.status = 'queued'
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        # Per-segment counts as they finish, and the in-order merged prefix
+        self.results: List[Optional[List[int]]] = [None] * len(segments)
+        self.counts: List[int] = []
+        self._next_segment = 0
+        self.segments_done = 0
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.cache_key: Optional[str] = None
+        self.source_bytes = 0
+        self.cached = False
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    def add_segment(self, index: int, counts: List[int]) -> List[int]:
+        """Store a finished segment; returns the frames newly merged in order"""
+        self.results[index] = counts
+        self.segments_done += 1
+        merged_from = len(self.counts)
+        while self._next_segment < len(self.results) and self.results[self._next_segment] is not None:
+            self.counts.extend(self.results[self._next_segment])
+            self.results[self._next_segment] = []  # merged; drop the copy
+            self._next_segment += 1
+        return self.counts[merged_from:]
+
+    def append_counts(self, counts: List[int]) -> int:
+        """Append counts of the next frames (streamed jobs); returns the first frame index"""
+        start = len(self.counts)
+        self.counts.extend(counts)
+        return start
+
+    def progress(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "segments_done": self.segments_done,
+            "segments": len(self.segments),
+            "frames_merged": len(self.counts),
+            "total_frames": self.total_frames,
+            "cached": self.cached,
+        }
+
+    def to_dict(self, include_counts: bool = True) -> Dict[str, Any]:
+        result = {
+            "job_id": self.id,
+            "filename": self.filename,
+            **self.progress(),
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+        if include_counts:
+            result["vehicle_counts"] = frames_payload(0, self.counts)
+        return result
+
+    def broadcast(self, event: Dict[str, Any]):
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+
+def frames_payload(first_frame: int, counts: List[int]) -> List[Dict[str, int]]:
+    """Counts in the original response shape: ``[{"frame": i, "vehicles": n}, ...]``"""
+    return [{"frame": first_frame + i, "vehicles": count} for i, count in enumerate(counts)]
+
+
+class DetectionJobQueue:
+    """Runs upload jobs on a shared process pool, segments of all jobs interleaved"""
+
+    def __init__(self, model_path: str = UPLOAD_MODEL_PATH, workers: int = UPLOAD_WORKERS,
+                 executor: Optional[InferenceExecutor] = None, cache: Optional[ResultCache] = None):
+        self.model_path = model_path
+        self.workers = max(1, workers)
+        self._executor = executor
+        self.cache = cache
+        self.jobs: 'OrderedDict[str, DetectionJob]' = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def executor(self) -> InferenceExecutor:
+        # Created on first use so importing the server does not start processes
+        if self._executor is None:
+            self._executor = InferenceExecutor(
+                'process', self.workers, self.model_path, start_method='spawn',
+                torch_threads=max(1, (os.cpu_count() or 1) // self.workers))
+        return self._executor
+
+    def cache_key(self, content_hash: str) -> str:
+        params = {"min_confidence": UPLOAD_MIN_CONFIDENCE, "classes": VEHICLE_CLASSES.tolist()}
+        return ResultCache.key(content_hash, model_identity(self.model_path), params)
+
+    async def lookup(self, content_hash: str) -> Optional[List[int]]:
+        """Cached per-frame counts of an upload's content, or None on a miss"""
+        if self.cache is None:
+            return None
+        return await asyncio.to_thread(self.cache.get, self.cache_key(content_hash))
+
+    async def cached(self, content_hash: str, source_bytes: int,
+                     filename: Optional[str] = None) -> Optional[DetectionJob]:
+        """A finished job from the result cache, or None on a miss"""
+        counts = await self.lookup(content_hash)
+        if counts is None:
+            return None
+        return self.cached_job(content_hash, counts, source_bytes, filename)
+
+    def cached_job(self, content_hash: str, counts: List[int], source_bytes: int,
+                   filename: Optional[str] = None) -> DetectionJob:
+        """Register a finished job for counts found in the result cache"""
+        job = DetectionJob(uuid.uuid4().hex, '', filename, [(0, None)], len(counts))
+        job.counts = counts
+        job.segments_done = 1
+        job.status = 'done'
+        job.cached = True
+        job.cache_key = self.cache_key(content_hash)
+        job.source_bytes = source_bytes
+        job.finished_at = time.time()
+        self.jobs[job.id] = job
+        self._evict()
+        return job
+
+    async def _store(self, job: DetectionJob):
+        if self.cache is None or job.cache_key is None or job.status != 'done':
+            return
+        try:
+            await asyncio.to_thread(self.cache.put, job.cache_key, job.counts, job.source_bytes)
+        except OSError as e:
+            logger.warning(f"Could not cache results of job {job.id}: {e}")
+
+    async def submit(self, video_path: str, filename: Optional[str] = None,
+                     content_hash: Optional[str] = None, source_bytes: int = 0) -> DetectionJob:
+        # Opening the container can take a while; keep it off the event loop
+        total_frames = await asyncio.to_thread(probe_frame_count, video_path)
+        job = DetectionJob(uuid.uuid4().hex, video_path, filename,
+                           plan_segments(total_frames, self.workers), total_frames)
+        if content_hash is not None:
+            job.cache_key = self.cache_key(content_hash)
+            job.source_bytes = source_bytes
+        self.jobs[job.id] = job
+        self._tasks[job.id] = asyncio.create_task(self._run(job))
+        self._evict()
+        return job
+
+    def start_stream(self, filename: Optional[str] = None) -> DetectionJob:
+        """Register a job whose frames are decoded from an upload still in progress"""
+        job = DetectionJob(uuid.uuid4().hex, '', filename, [(0, None)], 0)
+        job.status = 'running'
+        self.jobs[job.id] = job
+        self._evict()
+        return job
+
+    async def run_stream(self, job: DetectionJob, chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+        """SSE body for a streamed upload: one event per frame as soon as it is counted"""
+        started = time.perf_counter()
+        upload = HashingStream(chunks)
+        try:
+            async for counts in count_stream(stream_frames(upload), self.executor):
+                start = job.append_counts(counts)
+                payload = frames_payload(start, counts)
+                job.broadcast({"type": "frames", "vehicle_counts": payload})
+                for frame in payload:
+                    yield f"data: {json.dumps(frame)}\n\n"
+            if not job.counts:
+                raise ValueError("No frames could be decoded from the upload")
+            job.segments_done = 1
+            job.total_frames = len(job.counts)
+            job.status = 'done'
+            if upload.complete:
+                job.cache_key = self.cache_key(upload.hexdigest())
+                job.source_bytes = upload.size
+                await self._store(job)
+            logger.info(f"🎬 Streamed job {job.id}: {len(job.counts)} frames, "
+                        f"{time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            logger.error(f"Streamed detection job {job.id} failed: {e}")
+            yield f"data: {json.dumps({'type': 'failed', 'error': job.error})}\n\n"
+        finally:
+            if not job.finished:
+                # Client went away mid-upload
+                job.status = 'failed'
+                job.error = 'upload interrupted'
+            job.finished_at = time.time()
+            job.broadcast({"type": "progress", **job.progress()})
+            job.broadcast({"type": job.status})
+
+    def get(self, job_id: str) -> DetectionJob:
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        return job
+
+    async def wait(self, job: DetectionJob):
+        task = self._tasks.get(job.id)
+        if task is not None:
+            await asyncio.shield(task)
+
+    async def _run_segment(self, job: DetectionJob, index: int) -> Tuple[int, List[int]]:
+        start, stop = job.segments[index]
+        counts = await self.executor.run(count_frames_in_worker, job.video_path, start, stop,
+                                         UPLOAD_BATCH_SIZE, UPLOAD_MIN_CONFIDENCE)
+        return index, counts
+
+    async def _run(self, job: DetectionJob):
+        job.status = 'running'
+        started = time.perf_counter()
+        pending = [asyncio.create_task(self._run_segment(job, i)) for i in range(len(job.segments))]
+        try:
+            for next_done in asyncio.as_completed(pending):
+                index, counts = await next_done
+                start = len(job.counts)
+                merged = job.add_segment(index, counts)
+                if merged:
+                    job.broadcast({"type": "frames", "vehicle_counts": frames_payload(start, merged)})
+                job.broadcast({"type": "progress", **job.progress()})
+            job.status = 'done'
+            logger.info(f"🎬 Job {job.id}: {len(job.counts)} frames in {len(job.segments)} "
+                        f"segments, {time.perf_counter() - started:.1f}s")
+            await self._store(job)
+        except Exception as e:
+            for task in pending:
+                task.cancel()
+            job.status = 'failed'
+            job.error = str(e)
+            logger.error(f"Detection job {job.id} failed: {e}")
+        finally:
+            job.finished_at = time.time()
+            job.broadcast({"type": "progress", **job.progress()})
+            job.broadcast({"type": job.status})
+            self._tasks.pop(job.id, None)
+            try:
+                os.remove(job.video_path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    async def events(self, job: DetectionJob) -> AsyncIterator[str]:
+        """SSE: frames merged so far, then progress and new frames until the job ends"""
+        queue: asyncio.Queue = asyncio.Queue()
+        job.subscribers.add(queue)
+        try:
+            if job.counts:
+                yield f"data: {json.dumps({'type': 'frames', 'vehicle_counts': frames_payload(0, job.counts)})}\n\n"
+            yield f"data: {json.dumps({'type': 'progress', **job.progress()})}\n\n"
+            if job.finished:
+                yield f"data: {json.dumps({'type': job.status})}\n\n"
+                return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+                if event["type"] in ('done', 'failed'):
+                    return
+        finally:
+            job.subscribers.discard(queue)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "result_cache": self.cache.stats() if self.cache is not None else None,
+            "job_count": len(self.jobs),
+            "running": sum(1 for job in self.jobs.values() if job.status == 'running'),
+            "executor": self._executor.stats() if self._executor is not None else None,
+        }
+
+    def shutdown(self):
+        for task in self._tasks.values():
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+
+job_queue = DetectionJobQueue(cache=ResultCache() if RESULT_CACHE_ENABLED else None)
+router = APIRouter()
+
+
+@router.on_event("shutdown")
+async def shutdown_jobs():
+    job_queue.shutdown()
+
+
+@router.post("/detect_vehicles_video/")
+async def detect_vehicles_video(file: UploadFile = File(...), wait: bool = Query(True)):
+    """Count vehicles in an uploaded video; ``wait=false`` returns a job id instead of the counts"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp_video:
+        content_hash, size = await asyncio.to_thread(copy_and_hash, file.file, temp_video)
+        temp_video_path = temp_video.name
+    job = await job_queue.cached(content_hash, size, file.filename)
+    if job is not None:
+        os.remove(temp_video_path)
+        return JSONResponse(content={"job_id": job.id, "cached": True,
+                                     "vehicle_counts": frames_payload(0, job.counts)})
+    job = await job_queue.submit(temp_video_path, file.filename, content_hash, size)
+    if wait:
+        await job_queue.wait(job)
+        if job.status == 'failed':
+            raise HTTPException(status_code=500, detail=job.error)
+        return JSONResponse(content={"vehicle_counts": frames_payload(0, job.counts)})
+    return JSONResponse(status_code=202, content={
+        "job_id": job.id,
+        "status_url": f"/detect_vehicles_video/jobs/{job.id}",
+        "events_url": f"/detect_vehicles_video/jobs/{job.id}/events",
+        "segments": len(job.segments),
+    })
+
+
+@router.post("/detect_vehicles_video/stream")
+async def detect_vehicles_video_stream(request: Request):
+    """
+    Count vehicles while the video is still uploading.
+
+    Send the video as the raw request body (not multipart); the response is
+    an SSE stream of ``{"frame": i, "vehicles": n}`` per frame.
+    """
+    filename = request.headers.get('x-filename')
+    content_hash = request.headers.get('x-content-sha256', '').lower()
+    counts = await job_queue.lookup(content_hash) if content_hash else None
+    if counts is not None:
+        # The header only names the content: the body is hashed (not decoded)
+        # and the cached counts are served once it really matches
+        upload = HashingStream(request.stream())
+        async for _ in upload:
+            pass
+        if upload.hexdigest() != content_hash:
+            raise HTTPException(status_code=400,
+                                detail="X-Content-SHA256 does not match the request body")
+        job = job_queue.cached_job(content_hash, counts, upload.size, filename)
+        events = (f"data: {json.dumps(frame)}\n\n" for frame in frames_payload(0, job.counts))
+        return StreamingResponse(events, media_type="text/event-stream",
+                                 headers={"X-Job-Id": job.id, "X-Cache": "hit"})
+    job = job_queue.start_stream(filename)
+    body_read = asyncio.Event()
+    return DuplexStreamingResponse(job_queue.run_stream(job, track_body(request.stream(), body_read)),
+                                   body_read, media_type="text/event-stream",
+                                   headers={"X-Job-Id": job.id})
+
+
+@router.get("/detect_vehicles_video/jobs")
+async def list_detection_jobs():
+    """Queued, running and recently finished jobs (without counts)"""
+    return {**job_queue.stats(),
+            "jobs": [job.to_dict(include_counts=False) for job in job_queue.jobs.values()]}
+
+
+@router.get("/detect_vehicles_video/cache_stats")
+async def get_result_cache_stats():
+    """Result cache entries, hit rate and upload bytes not reprocessed"""
+    if job_queue.cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **job_queue.cache.stats()}
+
+
+@router.get("/detect_vehicles_video/jobs/{job_id}")
+async def get_detection_job(job_id: str):
+    """Job status and the counts merged so far (in frame order)"""
+    return job_queue.get(job_id).to_dict()
+
+
+@router.get("/detect_vehicles_video/jobs/{job_id}/events")
+async def get_detection_job_events(job_id: str):
+    """Server-Sent Events: progress and each newly merged run of frame counts"""
+    job = job_queue.get(job_id)
+    return StreamingResponse(job_queue.events(job), media_type="text/event-stream")
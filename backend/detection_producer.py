@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Shared per-junction detection producer for drone videos.
+
+Each junction gets one background task that owns its ``cv2.VideoCapture``.
+Frames are decoded once, YOLO and hexagonal clustering run once, and the
+resulting packet is published to every subscribed SSE / MJPEG consumer.
+Adding dashboards therefore adds fan-out cost only, never inference cost.
+With no consumer attached the task stops; ``sample`` then analyses single
+frames at a low rate so counts for signal timing stay current.
+
+Annotated frames go to the junction's MJPEG feed, which encodes each frame
+once for all viewers. Decoding and drawing run on a frame I/O executor so the event loop stays free
+for other requests while a frame is being prepared.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+import cv2
+import numpy as np
+
+from detection_batch import ClusterResult
+from inference_executor import InferenceExecutor
+from mjpeg_broadcast import FramePacer, MJPEGFeed
+
+logger = logging.getLogger(__name__)
+
+# async (frame, frame_index, video_frame) -> clustered detections; video_frame is
+# the frame's position in the recording, which repeats every loop
+ProcessFn = Callable[[np.ndarray, int, int], Awaitable[ClusterResult]]
+# (frame, cluster result) -> annotated frame
+AnnotateFn = Callable[[np.ndarray, ClusterResult], np.ndarray]
+
+# Seconds of ClusterResults kept for late subscribers and SSE resume
+HISTORY_SECONDS = float(os.environ.get('DETECTION_HISTORY_SECONDS', '30'))
+
+
+class JunctionProducer:
+    """Decodes and analyses one junction video and fans results out to subscribers"""
+
+    def __init__(self, junction_name: str, capture: cv2.VideoCapture,
+                 process_frame: ProcessFn, annotate_frame: AnnotateFn,
+                 io_executor: InferenceExecutor, mjpeg_feed: MJPEGFeed,
+                 frame_interval: float = 1 / 30):
+        """
+        Args:
+            junction_name: Config name of the junction (e.g. junction_01_normal)
+            capture: Video capture owned exclusively by this producer
+            process_frame: Runs detection + clustering once on a decoded frame
+            annotate_frame: Draws zones and detections onto a frame copy
+            io_executor: Thread pool used for decoding and drawing
+            mjpeg_feed: Broadcast feed for annotated frames
+            frame_interval: Seconds between produced frames (~30 FPS)
+        """
+        self.junction_name = junction_name
+        self.capture = capture
+        self.process_frame = process_frame
+        self.annotate_frame = annotate_frame
+        self.io_executor = io_executor
+        self.mjpeg_feed = mjpeg_feed
+        self.frame_interval = frame_interval
+
+        self.frame_index = 0
+        # Position of the next frame in the recording
+        self.video_frame = 0
+        self.latest: Optional[Dict[str, Any]] = None
+        # Recent results without image data, newest last
+        self.history: Deque[ClusterResult] = deque(
+            maxlen=max(1, int(HISTORY_SECONDS / frame_interval)))
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        # Serialises capture access between the run loop and sample()
+        self._capture_lock = asyncio.Lock()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def active(self) -> bool:
+        return bool(self._subscribers) or self.mjpeg_feed.viewer_count > 0
+
+    def start(self):
+        """Start the producer if it is idle (MJPEG viewers call this directly)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def subscribe(self) -> asyncio.Queue:
+        """
+        Register a result consumer and start the producer if it is idle.
+
+        Each subscriber gets a single-slot queue: a slow consumer always
+        sees the newest packet instead of a backlog of stale ones. A None
+        packet means the video cannot be read and the stream has ended.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers.add(queue)
+        if self.latest is not None:
+            # Late subscribers get the current state without waiting a frame
+            queue.put_nowait(self.latest)
+        self.start()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        """Remove a consumer; the producer stops once nobody is listening"""
+        self._subscribers.discard(queue)
+
+    async def stop(self):
+        """Cancel the background task (used on server shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def recent(self, seconds: float) -> List[ClusterResult]:
+        """Results from the last ``seconds`` seconds, oldest first"""
+        cutoff = time.time() - seconds
+        return [result for result in self.history if result.timestamp >= cutoff]
+
+    def since(self, frame_index: int) -> List[ClusterResult]:
+        """Results newer than ``frame_index`` still in the history, oldest first"""
+        return [result for result in self.history if result.frame_index > frame_index]
+
+    async def sample(self, seconds: float) -> Optional[ClusterResult]:
+        """
+        Analyse one frame while the producer is idle, ``seconds`` of video
+        after the previous one, so ``latest`` keeps following the recording
+        without running inference at the full frame rate.
+
+        Returns None (and does nothing) while the producer is running, since
+        its ``latest`` is already current.
+        """
+        if self._task is not None and not self._task.done():
+            return None
+        async with self._capture_lock:
+            skip = max(0, round(seconds / self.frame_interval) - 1)
+            ret, frame, video_frame = await self.io_executor.run(
+                self._read_ahead, self.video_frame + skip)
+            if not ret:
+                return None
+            self.video_frame = video_frame + 1
+            cluster = await self.process_frame(frame, self.frame_index, video_frame)
+            self._record(frame, cluster)
+            return cluster
+
+    def _read_ahead(self, position: int):
+        """Read the frame at ``position``, wrapping around the end of the recording"""
+        frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        if frame_count > 0:
+            position %= frame_count
+        if position != int(self.capture.get(cv2.CAP_PROP_POS_FRAMES)):
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, position)
+        ret, frame = self.capture.read()
+        if not ret and position:
+            position = 0
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.capture.read()
+        return ret, frame, position
+
+    def _record(self, frame: np.ndarray, cluster: ClusterResult):
+        packet = {
+            "frame_index": self.frame_index,
+            "frame": frame,
+            "cluster": cluster,
+            "timestamp": cluster.timestamp,
+        }
+        self.frame_index += 1
+        self.history.append(cluster)
+        self.latest = packet
+        self._publish(packet)
+
+    def _publish(self, packet: Optional[Dict[str, Any]]):
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(packet)
+
+    def _close_subscribers(self):
+        """End every subscriber's stream (see ``subscribe``)"""
+        self._publish(None)
+        self._subscribers.clear()
+
+    async def _run(self):
+        logger.info(f"▶️ Producer started for {self.junction_name}")
+        pacer = FramePacer(1.0 / self.frame_interval)
+        await self._capture_lock.acquire()
+        try:
+            rewound = False
+            while self.active:
+                ret, frame = await self.io_executor.run(self.capture.read)
+                if not ret:
+                    if rewound:
+                        # Not even the first frame reads: missing or broken video
+                        logger.error(f"Cannot read frames for {self.junction_name}")
+                        self._close_subscribers()
+                        self.mjpeg_feed.close()
+                        break
+                    # Loop the recording
+                    await self.io_executor.run(self.capture.set, cv2.CAP_PROP_POS_FRAMES, 0)
+                    self.video_frame = 0
+                    rewound = True
+                    continue
+                rewound = False
+                video_frame = self.video_frame
+                self.video_frame += 1
+
+                try:
+                    cluster = await self.process_frame(frame, self.frame_index, video_frame)
+                    if self.mjpeg_feed.viewer_count:
+                        annotated = await self.io_executor.run(
+                            self.annotate_frame, frame.copy(), cluster)
+                        await self.mjpeg_feed.publish_frame(annotated)
+                except Exception as e:
+                    logger.error(f"Error processing frame for {self.junction_name}: {e}")
+                    await asyncio.sleep(self.frame_interval)
+                    continue
+
+                self._record(frame, cluster)
+                await pacer.wait()
+        finally:
+            self._capture_lock.release()
+            logger.info(f"⏹️ Producer stopped for {self.junction_name}")
@@ -6,20 +6,30 @@ This server extends the existing fisheye detection system to support normal dron
 with improved detection accuracy using hexagonal clustering.
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import cv2
 import json
 import os
 import numpy as np
-from ultralytics import YOLO
 import asyncio
 from typing import Dict, List, Any, Optional
 import logging
-import requests
 import time
 
+from detection_batch import CONFIDENCE_THRESHOLD, ClusterResult, DetectionBatch
+from detection_index import DETECTION_REPLAY, DetectionIndex, load_index
+from detection_producer import HISTORY_SECONDS, JunctionProducer
+from frame_detection_cache import FrameDetectionCache, open_frame_cache
+from inference_batcher import InferenceBatcher
+from junction_registry import load_registry
+from inference_executor import (
+    EXECUTOR_KIND, EXECUTOR_WORKERS, FRAME_IO_WORKERS, InferenceExecutor
+)
+from mjpeg_broadcast import MJPEG_MEDIA_TYPE, MJPEGHub, ViewerLimitError
+from signal_cache import SignalStatusCache
+
 # Import our hexagonal clustering (will handle missing shapely gracefully)
 try:
     from hexagonal_clustering import HexagonalCluster
@@ -31,9 +41,21 @@ except ImportError as e:
     class HexagonalCluster:
         def __init__(self, *args, **kwargs):
             pass
+        def cluster(self, detections, junction_name, frame_index=-1, timestamp=0.0):
+            assignments = np.full(len(detections), -1, dtype=np.int8)
+            counts = {'north': 0, 'east': 0, 'west': 0, 'south': 0}
+            return ClusterResult(junction_name, detections, assignments, [], counts,
+                                 frame_index, timestamp)
         def get_vehicle_counts(self, detections, junction_name):
             return {'north': 0, 'east': 0, 'west': 0, 'south': 0}
 
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError as e:
+    print(f"Warning: API server count push and signal cache not available - {e}")
+    AIOHTTP_AVAILABLE = False
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -50,10 +72,30 @@ app.add_middleware(
 )
 
 # Global variables
-yolo_model = None
+inference_batcher: Optional[InferenceBatcher] = None
+inference_executor: Optional[InferenceExecutor] = None
+frame_io_executor = InferenceExecutor('thread', FRAME_IO_WORKERS)
+# Annotated junction streams, JPEG-encoded once per frame for all viewers
+mjpeg_hub = MJPEGHub(frame_io_executor)
 hexagonal_cluster = None
 drone_videos = {}
 drone_config = {}
+junction_producers: Dict[str, JunctionProducer] = {}
+# Per-frame detections of each looping drone video, so later loops skip inference
+frame_caches: Dict[str, FrameDetectionCache] = {}
+# Replay mode (DETECTION_REPLAY=1): precomputed detections instead of a model
+replay_indexes: Dict[str, DetectionIndex] = {}
+# Junction names shared with the API server (see JUNCTIONS_CONFIG)
+junction_registry = load_registry()
+API_SERVER_URL = os.environ.get('API_SERVER_URL', 'http://localhost:8000')
+# Feed junction counts to the API server's signal controller (adaptive timing).
+# Live, junctions without a viewer are sampled once per push rather than kept
+# running at full frame rate; replay mode reads the indexes.
+PUSH_JUNCTION_COUNTS = os.environ.get('PUSH_JUNCTION_COUNTS', '1') == '1'
+COUNT_PUSH_SECONDS = 1.0
+count_push_task: Optional[asyncio.Task] = None
+# Local mirror of the API server's signal status (one persistent SSE connection)
+signal_cache = SignalStatusCache(f"{API_SERVER_URL}/junction_signal_status/all")
 
 # Paths
 BACKEND_DIR = "/Users/yeshwanthbalaji/Desktop/Sem-7/full_stack_dev/trafficManag/backend"
@@ -62,11 +104,12 @@ YOLO_MODEL_PATH = os.path.join(BACKEND_DIR, "yolov8n.pt")
 DRONE_CONFIG_PATH = os.path.join(DRONE_VIDEOS_DIR, "drone_junctions_config.json")
 
 def load_yolo_model():
-    """Load YOLO model"""
-    global yolo_model
+    """Start the inference executor (its workers load the YOLO model) and batcher"""
+    global inference_batcher, inference_executor
     try:
         if os.path.exists(YOLO_MODEL_PATH):
-            yolo_model = YOLO(YOLO_MODEL_PATH)
+            inference_executor = InferenceExecutor(EXECUTOR_KIND, EXECUTOR_WORKERS, YOLO_MODEL_PATH)
+            inference_batcher = InferenceBatcher(inference_executor)
             logger.info("✅ YOLO model loaded successfully")
         else:
             logger.error(f"❌ YOLO model not found at {YOLO_MODEL_PATH}")
@@ -95,6 +138,12 @@ def load_drone_config():
                 video_path = os.path.join(DRONE_VIDEOS_DIR, config['video_file'])
                 if os.path.exists(video_path):
                     drone_videos[junction_name] = cv2.VideoCapture(video_path)
+                    cache = open_frame_cache(
+                        video_path, YOLO_MODEL_PATH, CONFIDENCE_THRESHOLD,
+                        int(drone_videos[junction_name].get(cv2.CAP_PROP_FRAME_COUNT) or 0))
+                    if cache is not None:
+                        frame_caches[junction_name] = cache
+                    junction_producers[junction_name] = create_junction_producer(junction_name)
                     logger.info(f"✅ Loaded video: {config['video_file']}")
                 else:
                     logger.warning(f"⚠️ Video not found: {video_path}")
@@ -103,70 +152,162 @@ def load_drone_config():
     except Exception as e:
         logger.error(f"❌ Error loading drone config: {e}")
 
-def detect_vehicles_in_frame(frame: np.ndarray) -> List[Dict]:
-    """Detect vehicles in a single frame using YOLO"""
-    if yolo_model is None:
-        return []
-    
+def load_replay_indexes():
+    """Load every drone junction's precomputed detection index (replay mode)"""
+    for junction_name, config in drone_config.items():
+        index = load_index('drone', junction_name)
+        if index is None:
+            logger.warning(f"⚠️ No detection index for {junction_name}; run precompute_detections.py")
+            continue
+        if index.stale(os.path.join(DRONE_VIDEOS_DIR, config['video_file'])):
+            logger.warning(f"⚠️ Detection index for {junction_name} is older than its video")
+        replay_indexes[junction_name] = index
+    logger.info(f"✅ Replay mode: {len(replay_indexes)} junctions served from detection indexes")
+
+async def detect_vehicles_batched(junction_name: str, frame: np.ndarray,
+                                  video_frame: int) -> DetectionBatch:
+    """
+    Detect vehicles through the shared cross-junction inference batcher.
+
+    ``video_frame`` is the frame's position in the junction's recording;
+    positions seen on an earlier loop are served from the frame cache, and in
+    replay mode every position comes from the precomputed index.
+    """
+    index = replay_indexes.get(junction_name)
+    if index is not None:
+        return index.detections(video_frame)
+    cache = frame_caches.get(junction_name)
+    if cache is not None:
+        detections = cache.get(video_frame)
+        if detections is not None:
+            return detections
+    if inference_batcher is None:
+        return DetectionBatch.empty()
     try:
-        results = yolo_model(frame)
-        detections = []
-        
-        for result in results:
-            boxes = result.boxes
-            if boxes is not None:
-                for box in boxes:
-                    # Get detection data
-                    xyxy = box.xyxy[0].cpu().numpy()
-                    confidence = float(box.conf[0].cpu().numpy())
-                    class_id = int(box.cls[0].cpu().numpy())
-                    
-                    # Filter for vehicle classes (assuming COCO classes)
-                    # Vehicle classes: car(2), motorcycle(3), bus(5), truck(7)
-                    vehicle_classes = [2, 3, 5, 7]
-                    if class_id in vehicle_classes and confidence > 0.5:
-                        # Convert to bbox format [x, y, width, height]
-                        x1, y1, x2, y2 = xyxy
-                        bbox = [float(x1), float(y1), float(x2-x1), float(y2-y1)]
-                        
-                        detections.append({
-                            'bbox': bbox,
-                            'confidence': confidence,
-                            'class_id': class_id
-                        })
-        
-        return detections
+        detections = await inference_batcher.submit(junction_name, frame)
     except Exception as e:
         logger.error(f"Error in vehicle detection: {e}")
-        return []
+        return DetectionBatch.empty()
+    if cache is not None:
+        await frame_io_executor.run(cache.put, video_frame, detections)
+    return detections
+
+def annotate_frame(frame: np.ndarray, cluster: ClusterResult, junction_name: str) -> np.ndarray:
+    """Draw zones and already clustered detection boxes onto a frame"""
+    # Draw hexagonal zones if clustering is available
+    if CLUSTERING_AVAILABLE and hexagonal_cluster:
+        frame = hexagonal_cluster.draw_hexagonal_zones(frame, junction_name)
+        frame = hexagonal_cluster.draw_detections_with_clusters(frame, cluster, junction_name)
+    else:
+        # Simple bounding box drawing
+        for x1, y1, x2, y2 in cluster.detections.xyxy.astype(np.int32).tolist():
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+    return frame
+
+def create_junction_producer(junction_name: str) -> JunctionProducer:
+    """Create the shared detection producer for a junction's video"""
+    async def process_frame(frame, frame_index, video_frame):
+        detections = await detect_vehicles_batched(junction_name, frame, video_frame)
+        # Cluster once; counts, drawing and SSE payloads all share the result
+        return hexagonal_cluster.cluster(detections, junction_name, frame_index, time.time())
+
+    def annotate(frame, cluster):
+        return annotate_frame(frame, cluster, junction_name)
+
+    return JunctionProducer(junction_name, drone_videos[junction_name], process_frame, annotate,
+                            frame_io_executor, mjpeg_hub.feed(junction_name))
 
 def get_junction_mapping():
-    """Map junction identifiers to drone video junction names"""
-    mapping = {
-        'normal_01': 'junction_01_normal',
-        'normal_02': 'junction_02_normal', 
-        'flipped_03': 'junction_03_flipped',
-        'flipped_04': 'junction_04_flipped'
+    """Map every registered junction name to its drone video junction name"""
+    return {
+        name: junction.drone_name
+        for junction in junction_registry.junctions.values() if junction.drone_name
+        for name in junction.names()
     }
-    return mapping
+
+def latest_counts(junction_name: str) -> Optional[Dict[str, int]]:
+    """A junction's current per-direction counts (from the replay clock in replay mode)"""
+    if DETECTION_REPLAY:
+        index = replay_indexes.get(junction_name)
+        return index.counts(index.position(time.time())) if index is not None else None
+    producer = junction_producers.get(junction_name)
+    if producer is None or producer.latest is None:
+        return None
+    return producer.latest["cluster"].counts
+
+async def sample_idle_producers():
+    """Analyse one frame of every junction no viewer is keeping running"""
+    results = await asyncio.gather(
+        *(producer.sample(COUNT_PUSH_SECONDS) for producer in junction_producers.values()),
+        return_exceptions=True)
+    for name, result in zip(junction_producers, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Failed to sample counts for {name}: {result}")
+
+async def push_junction_counts():
+    """Push every junction's latest per-direction counts to the API server once a second"""
+    junction_names = list(replay_indexes if DETECTION_REPLAY else junction_producers)
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
+        while True:
+            if not DETECTION_REPLAY:
+                await sample_idle_producers()
+            counts = {}
+            for name in junction_names:
+                api_junction = junction_registry.resolve(name)
+                latest = latest_counts(name)
+                if api_junction is not None and latest is not None:
+                    counts[api_junction] = latest
+            if counts:
+                try:
+                    async with session.post(f"{API_SERVER_URL}/junction_counts",
+                                            json={"counts": counts}) as response:
+                        if response.status != 200:
+                            logger.warning(f"API server rejected junction counts: {response.status}")
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.warning(f"Failed to push junction counts to API server: {e}")
+            await asyncio.sleep(COUNT_PUSH_SECONDS)
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize models and configurations on startup"""
+    global count_push_task
     logger.info("🚀 Starting Enhanced YOLO Detection Server...")
-    load_yolo_model()
+    if not DETECTION_REPLAY:
+        load_yolo_model()
     load_drone_config()
+    if DETECTION_REPLAY:
+        load_replay_indexes()
+    if PUSH_JUNCTION_COUNTS and AIOHTTP_AVAILABLE and (junction_producers or replay_indexes):
+        count_push_task = asyncio.create_task(push_junction_counts())
+    if AIOHTTP_AVAILABLE:
+        signal_cache.start()
     logger.info("✅ Server startup complete")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop junction producers"""
+    if count_push_task is not None:
+        count_push_task.cancel()
+    await signal_cache.stop()
+    for producer in junction_producers.values():
+        await producer.stop()
+    if inference_batcher is not None:
+        await inference_batcher.stop()
+    if inference_executor is not None:
+        inference_executor.shutdown()
+    frame_io_executor.shutdown()
+
 @app.get("/")
 async def root():
     """Root endpoint"""
     return {
         "message": "Enhanced YOLO Detection Server", 
         "status": "running",
-        "yolo_loaded": yolo_model is not None,
+        "yolo_loaded": inference_executor is not None,
+        "replay_mode": DETECTION_REPLAY,
         "clustering_available": CLUSTERING_AVAILABLE,
-        "drone_junctions": list(drone_config.keys()) if drone_config else []
+        "drone_junctions": list(drone_config.keys()) if drone_config else [],
+        "inference_queue_depth": inference_executor.queue_depth if inference_executor else 0
     }
 
 @app.get("/drone/junctions")
@@ -178,57 +319,110 @@ async def get_drone_junctions():
         "clustering_available": CLUSTERING_AVAILABLE
     }
 
+@app.get("/drone/inference_stats")
+async def get_inference_stats():
+    """Batched inference throughput, per-junction frame counts and executor queue depth"""
+    if inference_batcher is None:
+        return {"yolo_loaded": False, "frame_io_executor": frame_io_executor.stats()}
+    return {**inference_batcher.stats(), "frame_io_executor": frame_io_executor.stats()}
+
+@app.get("/drone/detection_index_stats")
+async def get_detection_index_stats():
+    """Frames, detections and source of each junction's precomputed index (replay mode)"""
+    return {"replay_mode": DETECTION_REPLAY,
+            "junctions": {name: index.stats() for name, index in replay_indexes.items()}}
+
+@app.get("/drone/frame_cache_stats")
+async def get_frame_cache_stats():
+    """Cached frames and hit rate of each junction video's detection cache"""
+    return {name: cache.stats() for name, cache in frame_caches.items()}
+
 @app.get("/drone/junction_vehicle_count/{direction}")
-async def get_drone_vehicle_count(direction: str, junction: str = "normal_01"):
-    """Get vehicle count for a specific direction in drone footage"""
+async def get_drone_vehicle_count(direction: str, junction: str = "normal_01",
+                                  last_event_id: Optional[int] = Header(None)):
+    """Get vehicle count for a specific direction in drone footage
+    
+    Events carry the frame index as their id. A reconnecting client
+    (``Last-Event-ID``) first gets the per-second counts it missed, replayed
+    from the producer's result history without running detection again.
+    
+    In replay mode the counts come from the junction's precomputed index at
+    the shared replay clock; no video is decoded.
+    """
     
     # Map junction identifier to config name
-    junction_mapping = get_junction_mapping()
-    junction_name = junction_mapping.get(junction, junction)
+    junction_name = junction_registry.drone_name(junction)
     
-    if junction_name not in drone_videos:
-        raise HTTPException(status_code=404, message=f"Junction {junction} not found")
+    if junction_name not in (replay_indexes if DETECTION_REPLAY else junction_producers):
+        raise HTTPException(status_code=404, detail=f"Junction {junction} not found")
+    
+    def format_count_event(frame_index: int, counts: Dict[str, int], total: int) -> str:
+        data = {
+            "junction": junction,
+            "direction": direction,
+            "vehicles": counts.get(direction, 0),
+            "total_detections": total,
+            "all_directions": counts,
+            "timestamp": cv2.getTickCount()
+        }
+        return f"id: {frame_index}\ndata: {json.dumps(data)}\n\n"
+    
+    def format_cluster_event(cluster: ClusterResult) -> str:
+        return format_count_event(cluster.frame_index, cluster.counts, len(cluster))
+    
+    async def replay_count():
+        index = replay_indexes[junction_name]
+        now = index.position(time.time())
+        if last_event_id is not None and last_event_id < now:
+            # One event per second of the gap, within the live history window
+            step = max(1, round(index.fps))
+            start = max(last_event_id + step, now - int(HISTORY_SECONDS * index.fps))
+            for frame in range(start, now, step):
+                yield format_count_event(frame, index.counts(frame), index.total(frame))
+        while True:
+            frame = index.position(time.time())
+            yield format_count_event(frame, index.counts(frame), index.total(frame))
+            await asyncio.sleep(1)
     
     async def generate_count():
-        cap = drone_videos[junction_name]
+        producer = junction_producers[junction_name]
+        queue = producer.subscribe()
+        sent = -1
         
-        while True:
-            try:
-                ret, frame = cap.read()
-                if not ret:
-                    # Reset video to beginning
-                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                    continue
-                
-                # Detect vehicles
-                detections = detect_vehicles_in_frame(frame)
-                
-                # Get vehicle counts using hexagonal clustering
-                counts = hexagonal_cluster.get_vehicle_counts(detections, junction_name)
-                
-                # Get count for requested direction
-                vehicle_count = counts.get(direction, 0)
-                
-                # Prepare response data
-                data = {
-                    "junction": junction,
-                    "direction": direction,
-                    "vehicles": vehicle_count,
-                    "total_detections": len(detections),
-                    "all_directions": counts,
-                    "timestamp": cv2.getTickCount()
-                }
-                
-                yield f"data: {json.dumps(data)}\n\n"
-                await asyncio.sleep(1)  # Update every second
-                
-            except Exception as e:
-                logger.error(f"Error in drone vehicle count: {e}")
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
-                await asyncio.sleep(1)
+        try:
+            if last_event_id is not None and last_event_id < producer.frame_index:
+                # Replay one result per second of the gap, as the live stream would have sent
+                next_time = 0.0
+                for cluster in producer.since(last_event_id):
+                    if cluster.timestamp >= next_time:
+                        yield format_cluster_event(cluster)
+                        sent = cluster.frame_index
+                        next_time = cluster.timestamp + 1
+            
+            while True:
+                try:
+                    # Latest packet from the shared producer
+                    packet = await queue.get()
+                    if packet is None:
+                        # The producer cannot read the junction video
+                        break
+                    cluster = packet["cluster"]
+                    if cluster.frame_index <= sent:
+                        continue
+                    sent = cluster.frame_index
+                    
+                    yield format_cluster_event(cluster)
+                    await asyncio.sleep(1)  # Update every second
+                    
+                except Exception as e:
+                    logger.error(f"Error in drone vehicle count: {e}")
+                    yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                    await asyncio.sleep(1)
+        finally:
+            producer.unsubscribe(queue)
     
     return StreamingResponse(
-        generate_count(),
+        replay_count() if DETECTION_REPLAY else generate_count(),
         media_type="text/plain",
         headers={
             "Cache-Control": "no-cache",
@@ -241,106 +435,76 @@ async def get_drone_vehicle_count(direction: str, junction: str = "normal_01"):
 
 @app.get("/drone/junction_signal_status")
 async def get_drone_signal_status(junction: str = "normal_01"):
-    """Get signal status for drone junction from API server"""
+    """Get signal status for drone junction from the local API server mirror
     
-    try:
-        # Map junction names to API server format
-        junction_map = {
-            'junction_01_normal': '01_',
-            'junction_02_normal': '02_',
-            'junction_03_flipped': '05_',
-            'junction_04_flipped': 'rifatuslu_',
-            'normal_01': '01_',
-            'normal_02': '02_',
-            'flipped_03': '05_',
-            'flipped_04': 'rifatuslu_'
+    ``cache_age_seconds`` is the time since the mirror last heard from the
+    API server; ``stale`` is set when the connection is down.
+    """
+    # Map junction names to API server format
+    api_junction = junction_registry.resolve(junction) or junction
+    active_direction = signal_cache.get(api_junction)
+    current_time = int(time.time())
+    
+    if active_direction is not None:
+        return {
+            "junction": junction,
+            "active_direction": active_direction,
+            "timestamp": current_time,
+            "source": "api_server",
+            "stale": signal_cache.stale,
+            "cache_age_seconds": signal_cache.age,
+            "changed_at": signal_cache.changed_at.get(api_junction)
         }
-        
-        api_junction = junction_map.get(junction, junction)
-        
-        # Make SSE request to api_server to get current signal status
-        import requests
-        response = requests.get(f"http://localhost:8000/junction_signal_status?junction={api_junction}", 
-                              timeout=2, stream=True)
-        
-        if response.status_code == 200:
-            # Parse the first SSE message to get current status
-            for line in response.iter_lines(decode_unicode=True):
-                if line.startswith('data: '):
-                    data = json.loads(line[6:])  # Remove 'data: ' prefix
-                    return {
-                        "junction": junction,
-                        "active_direction": data.get('active_signal', 'north'),
-                        "timestamp": int(time.time())
-                    }
-                    break
-    except Exception as e:
-        logger.warning(f"Failed to get signal status from API server: {e}")
     
     # Fallback to simulated cycling if API server is unavailable
     directions = ['north', 'east', 'south', 'west']
-    import time
-    current_time = int(time.time())
     active_direction = directions[(current_time // 30) % len(directions)]
     
     return {
         "junction": junction,
         "active_direction": active_direction,
-        "timestamp": current_time
+        "timestamp": current_time,
+        "source": "simulated",
+        "stale": True,
+        "cache_age_seconds": signal_cache.age
     }
 
+@app.get("/drone/signal_cache_stats")
+async def get_signal_cache_stats():
+    """Connection state, staleness and reconnect count of the signal status mirror"""
+    return signal_cache.stats()
+
 @app.get("/drone/video_stream/{junction}")
-async def get_drone_video_stream(junction: str):
-    """Stream processed drone video with detection overlays"""
+async def get_drone_video_stream(junction: str, width: Optional[int] = None,
+                                 quality: Optional[int] = None):
+    """Stream processed drone video with detection overlays
     
-    junction_mapping = get_junction_mapping()
-    junction_name = junction_mapping.get(junction, junction)
+    ``width`` and ``quality`` select a smaller / lower-quality rendition,
+    encoded once per frame and shared by every viewer that asks for it.
+    """
     
-    if junction_name not in drone_videos:
+    junction_name = junction_registry.drone_name(junction)
+    
+    if junction_name not in junction_producers:
         raise HTTPException(status_code=404, detail=f"Junction {junction} not found")
     
-    async def generate_stream():
-        cap = drone_videos[junction_name]
-        
-        while True:
-            try:
-                ret, frame = cap.read()
-                if not ret:
-                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                    continue
-                
-                # Detect vehicles
-                detections = detect_vehicles_in_frame(frame)
-                
-                # Draw hexagonal zones if clustering is available
-                if CLUSTERING_AVAILABLE and hexagonal_cluster:
-                    frame = hexagonal_cluster.draw_hexagonal_zones(frame, junction_name)
-                    frame = hexagonal_cluster.draw_detections_with_clusters(frame, detections, junction_name)
-                else:
-                    # Simple bounding box drawing
-                    for detection in detections:
-                        bbox = detection['bbox']
-                        x1, y1, w, h = bbox
-                        cv2.rectangle(frame, (int(x1), int(y1)), (int(x1+w), int(y1+h)), (0, 255, 0), 2)
-                
-                # Encode frame
-                _, buffer = cv2.imencode('.jpg', frame)
-                frame_bytes = buffer.tobytes()
-                
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-                
-                await asyncio.sleep(1/30)  # ~30 FPS
-                
-            except Exception as e:
-                logger.error(f"Error in video stream: {e}")
-                break
+    producer = junction_producers[junction_name]
+    try:
+        viewer = mjpeg_hub.subscribe(junction_name, width, quality)
+    except ViewerLimitError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    producer.start()
     
     return StreamingResponse(
-        generate_stream(),
-        media_type="multipart/x-mixed-replace; boundary=frame"
+        mjpeg_hub.stream(junction_name, viewer),
+        media_type=MJPEG_MEDIA_TYPE
     )
 
+@app.get("/drone/video_stream_stats")
+async def get_video_stream_stats():
+    """Viewers, renditions, encoded frames and per-viewer dropped frames for each junction stream"""
+    return mjpeg_hub.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8002)
\ No newline at end of file
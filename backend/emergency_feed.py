@@ -0,0 +1,162 @@
+"""
+Push feed of emergency request inserts and status changes.
+
+Clients keep one SSE connection (``GET /emergency/feed``) instead of polling
+the request lists. Admins receive every change; other users only changes to
+their own requests, looked up by ``requested_by`` rather than by scanning
+every subscriber.
+
+Changes come from a MongoDB change stream when the deployment supports one
+(replica set or sharded cluster), which also covers writes made by other
+API workers. On a standalone server the stream cannot be opened and the
+endpoints notify the feed directly after each write (``notify_local``), which
+reaches the clients of the worker that made the change.
+"""
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_BUFFER = 64
+KEEPALIVE_SECONDS = 30
+WATCH_RETRY_SECONDS = 5
+
+FIELDS = ("junction", "direction", "vehicle_id", "cause", "requested_by", "status", "timestamp", "updated_at")
+
+
+def serialize_request(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON-safe copy of an emergency request document (list projection fields only)"""
+    result = {"_id": str(doc["_id"]) if isinstance(doc.get("_id"), ObjectId) else doc.get("_id")}
+    for field in FIELDS:
+        value = doc.get(field)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        if value is not None:
+            result[field] = value
+    return result
+
+
+class FeedSubscriber:
+    """One SSE client of the feed"""
+
+    __slots__ = ('username', 'is_admin', 'queue', 'dropped')
+
+    def __init__(self, username: str, is_admin: bool, buffer_size: int = SUBSCRIBER_BUFFER):
+        self.username = username
+        self.is_admin = is_admin
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def offer(self, event: str):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class EmergencyFeed:
+    """Fans emergency request changes out to admins and to each request's owner"""
+
+    def __init__(self):
+        self.admins: Set[FeedSubscriber] = set()
+        self.users: Dict[str, Set[FeedSubscriber]] = defaultdict(set)
+        # 'starting', 'change_stream' or 'in_process'
+        self.mode = 'starting'
+        self.delivered = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, collection):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._watch(collection))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _watch(self, collection):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        while True:
+            try:
+                async with collection.watch(pipeline, full_document='updateLookup') as stream:
+                    self.mode = 'change_stream'
+                    logger.info("Emergency feed following the MongoDB change stream")
+                    async for change in stream:
+                        doc = change.get("fullDocument")
+                        if doc is not None:
+                            kind = 'insert' if change["operationType"] == 'insert' else 'update'
+                            self.publish(kind, doc)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                # Standalone server: change streams are not available
+                self.mode = 'in_process'
+                logger.info(f"Emergency feed using in-process notifications ({e})")
+                return
+            except Exception as e:
+                self.mode = 'in_process'
+                logger.warning(f"Emergency change stream failed, retrying: {e}")
+                await asyncio.sleep(WATCH_RETRY_SECONDS)
+
+    def notify_local(self, kind: str, doc: Dict[str, Any]):
+        """Called after a write; skipped when the change stream will deliver it"""
+        if self.mode != 'change_stream':
+            self.publish(kind, doc)
+
+    def publish(self, kind: str, doc: Dict[str, Any]) -> int:
+        request = serialize_request(doc)
+        event = f"data: {json.dumps({'type': kind, 'request': request})}\n\n"
+        targets = list(self.admins)
+        owner = request.get("requested_by")
+        if owner in self.users:
+            targets.extend(self.users[owner])
+        for subscriber in targets:
+            subscriber.offer(event)
+        self.delivered += len(targets)
+        return len(targets)
+
+    def subscribe(self, username: str, is_admin: bool) -> FeedSubscriber:
+        subscriber = FeedSubscriber(username, is_admin)
+        if is_admin:
+            self.admins.add(subscriber)
+        else:
+            self.users[username].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: FeedSubscriber):
+        if subscriber.is_admin:
+            self.admins.discard(subscriber)
+            return
+        subscribers = self.users.get(subscriber.username)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.users[subscriber.username]
+
+    async def stream(self, subscriber: FeedSubscriber) -> AsyncIterator[str]:
+        """SSE body: a ready event, then every relevant change, with keepalive comments"""
+        try:
+            yield f"data: {json.dumps({'type': 'ready', 'mode': self.mode})}\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscriber.queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "admins": len(self.admins),
+            "users": sum(len(subscribers) for subscribers in self.users.values()),
+            "delivered": self.delivered,
+        }
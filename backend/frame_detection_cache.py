@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Persistent per-frame detection cache for recorded (looping) videos.
+
+The drone and junction videos loop forever, so every pass used to run YOLO
+again on identical frames. ``FrameDetectionCache`` keeps each frame's vehicle
+detections beside the video, in ``<video>.<key>.detcache/``:
+
+- ``index.i64``: (frames, 2) memmap of (first row, row count) per frame,
+  -1 while the frame has not been seen
+- ``xyxy.f32`` / ``conf.f32`` / ``cls.i16``: append-only detection columns,
+  memory-mapped for reading
+- ``meta.json``: the key the cache was built for
+
+The key covers the video file (size and mtime), the model identity and the
+detection thresholds, and is part of the directory name, so servers running
+different models or thresholds on the same video keep separate caches instead
+of rebuilding each other's. After one full pass, serving counts and overlays
+needs no inference.
+Writes from several worker processes are serialised with a file lock.
+
+Set ``FRAME_CACHE=0`` to disable.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from detection_batch import VEHICLE_CLASSES, DetectionBatch
+from result_cache import model_identity
+
+logger = logging.getLogger(__name__)
+
+FRAME_CACHE_ENABLED = os.environ.get('FRAME_CACHE', '1') == '1'
+CACHE_VERSION = 1
+COLUMNS = {'xyxy': (np.float32, 4), 'conf': (np.float32, 1), 'cls': (np.int16, 1)}
+
+
+class FrameDetectionCache:
+    """Memory-mapped detections of every frame of one video file"""
+
+    def __init__(self, video_path: str, frame_count: int, model_id: str,
+                 min_confidence: float, classes: np.ndarray = VEHICLE_CLASSES):
+        """
+        Args:
+            video_path: Source video; the cache lives in ``<video_path>.<key>.detcache``
+            frame_count: Frames in the video (frames beyond it are not cached)
+            model_id: Model identity (see ``result_cache.model_identity``)
+            min_confidence: Confidence threshold the detections were filtered with
+            classes: Class ids the detections were filtered to
+        """
+        self.video_path = video_path
+        self.frame_count = frame_count
+        stat = os.stat(video_path)
+        self.key = hashlib.sha256(json.dumps({
+            "version": CACHE_VERSION,
+            "video": [os.path.basename(video_path), stat.st_size, stat.st_mtime_ns],
+            "model": model_id,
+            "min_confidence": min_confidence,
+            "classes": np.asarray(classes).tolist(),
+        }, sort_keys=True).encode()).hexdigest()
+        self.directory = f"{video_path}.{self.key[:16]}.detcache"
+        self.hits = 0
+        self.misses = 0
+        self._columns: Dict[str, np.ndarray] = {}
+        self._rows = 0  # rows covered by the current column maps
+        self._open()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._file('.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            meta = None
+            try:
+                with open(self._file('meta.json')) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                pass
+            if meta is None or meta.get("key") != self.key or meta.get("frames") != self.frame_count:
+                if meta is not None:
+                    logger.info(f"♻️ Cache does not match the video, rebuilding {self.directory}")
+                self._reset()
+        self.index = np.memmap(self._file('index.i64'), dtype=np.int64, mode='r+',
+                               shape=(self.frame_count, 2))
+
+    def _reset(self):
+        """Create empty files for the current key (caller holds the lock)"""
+        for name in os.listdir(self.directory):
+            if name != '.lock':
+                path = self._file(name)
+                shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+        index = np.memmap(self._file('index.i64'), dtype=np.int64, mode='w+',
+                          shape=(self.frame_count, 2))
+        index[:] = -1
+        index.flush()
+        del index
+        for column in COLUMNS:
+            open(self._column_path(column), 'wb').close()
+        with open(self._file('meta.json'), 'w') as f:
+            json.dump({"key": self.key, "frames": self.frame_count,
+                       "video": os.path.basename(self.video_path)}, f)
+
+    def _column_path(self, column: str) -> str:
+        dtype, _ = COLUMNS[column]
+        return self._file(f"{column}.{'f32' if dtype == np.float32 else 'i16'}")
+
+    def _column_rows(self) -> int:
+        """Complete rows present in every column file"""
+        return min(os.path.getsize(self._column_path(column)) // (np.dtype(dtype).itemsize * width)
+                   for column, (dtype, width) in COLUMNS.items())
+
+    def _map_columns(self, rows: int):
+        """(Re)map the column files so at least ``rows`` rows are readable"""
+        if rows <= self._rows:
+            return
+        available = self._column_rows()
+        for column, (dtype, width) in COLUMNS.items():
+            shape = (available, width) if width > 1 else (available,)
+            self._columns[column] = np.memmap(self._column_path(column), dtype=dtype, mode='r',
+                                              shape=shape)
+        self._rows = available
+
+    def get(self, frame: int) -> Optional[DetectionBatch]:
+        """Cached detections of a frame, or None if it has not been processed"""
+        if not 0 <= frame < self.frame_count:
+            return None
+        start, count = self.index[frame]
+        if start < 0:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if count == 0:
+            return DetectionBatch.empty()
+        self._map_columns(start + count)
+        end = start + count
+        # Copied out so callers never hold views into a map that a rebuild may truncate
+        return DetectionBatch(np.array(self._columns['xyxy'][start:end]),
+                              np.array(self._columns['conf'][start:end]),
+                              np.array(self._columns['cls'][start:end]))
+
+    def put(self, frame: int, detections: DetectionBatch):
+        """Store a frame's detections (no-op if already cached or out of range)"""
+        if not 0 <= frame < self.frame_count or self.index[frame, 0] >= 0:
+            return
+        with open(self._file('.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if self.index[frame, 0] >= 0:
+                return  # another worker got there first
+            # Rows past the shortest column are left over from an interrupted put
+            start = self._column_rows()
+            for column, (dtype, width) in COLUMNS.items():
+                with open(self._column_path(column), 'r+b') as f:
+                    f.seek(start * np.dtype(dtype).itemsize * width)
+                    f.truncate()
+                    f.write(np.ascontiguousarray(getattr(detections, column), dtype=dtype).tobytes())
+            self.index[frame] = (start, len(detections))
+            self.index.flush()
+
+    @property
+    def cached_frames(self) -> int:
+        return int(np.count_nonzero(self.index[:, 0] >= 0))
+
+    @property
+    def complete(self) -> bool:
+        return self.cached_frames == self.frame_count
+
+    def counts(self) -> np.ndarray:
+        """Detections per frame (-1 for frames not cached yet), read from the index alone"""
+        return np.where(self.index[:, 0] >= 0, self.index[:, 1], -1)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "video": os.path.basename(self.video_path),
+            "frames": self.frame_count,
+            "cached_frames": self.cached_frames,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def open_frame_cache(video_path: str, model_path: str, min_confidence: float,
+                     frame_count: Optional[int] = None) -> Optional[FrameDetectionCache]:
+    """The detection cache for a video, or None if disabled or unusable"""
+    if not FRAME_CACHE_ENABLED:
+        return None
+    try:
+        if frame_count is None:
+            import cv2
+            cap = cv2.VideoCapture(video_path)
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            cap.release()
+        if frame_count <= 0:
+            return None
+        return FrameDetectionCache(video_path, frame_count, model_identity(model_path),
+                                   min_confidence)
+    except OSError as e:
+        logger.warning(f"Frame detection cache unavailable for {video_path}: {e}")
+        return None
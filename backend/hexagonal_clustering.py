@@ -12,6 +12,83 @@ from typing import List, Tuple, Dict, Any
 import json
 import os
 
+from detection_batch import ClusterResult, DetectionBatch
+
+DIRECTIONS = ['north', 'east', 'west', 'south']
+
+# Frame size the zone lookup tables cover at minimum (drone videos are 1080p);
+# the table grows to fit zones drawn outside it
+DEFAULT_FRAME_SIZE = (1920, 1080)
+# Pixels: bound on how far a zone's raster (cv2.fillPoly) strays from the
+# polygon, with room to spare; pixels this close to a decision are classified exactly
+LUT_MARGIN = 2
+
+DIRECTION_COLORS = {
+    'north': (0, 255, 0),    # Green
+    'east': (255, 0, 0),     # Blue
+    'west': (0, 255, 255),   # Yellow
+    'south': (255, 0, 255)   # Magenta
+}
+
+def _classify_points(px: np.ndarray, py: np.ndarray, polygons: List[np.ndarray]) -> np.ndarray:
+    """
+    Vectorised equivalent of the shapely contains / closest-polygon lookup.
+    
+    A point belongs to the first polygon that strictly contains it (points on
+    an edge are not contained, as with ``Polygon.contains``). Otherwise it goes
+    to the polygon at the smallest distance, evaluated with the same
+    point-to-segment formula GEOS uses, first polygon winning ties.
+    
+    Args:
+        px, py: int64 point coordinates of equal shape
+        polygons: (K, 2) int64 vertex arrays
+        
+    Returns:
+        int8 array of polygon indices, same shape as px
+    """
+    contained = np.full(px.shape, -1, dtype=np.int8)
+    nearest = np.full(px.shape, -1, dtype=np.int8)
+    best = np.full(px.shape, np.inf)
+    pxf = px.astype(np.float64)
+    pyf = py.astype(np.float64)
+    
+    for index, vertices in enumerate(polygons):
+        crossings = np.zeros(px.shape, dtype=bool)
+        on_edge = np.zeros(px.shape, dtype=bool)
+        distance = np.full(px.shape, np.inf)
+        
+        for (x1, y1), (x2, y2) in zip(vertices.tolist(), np.roll(vertices, -1, axis=0).tolist()):
+            dx, dy = x2 - x1, y2 - y1
+            # Exact integer orientation of the point against the edge
+            cross = (px - x1) * dy - (py - y1) * dx
+            within = ((px >= min(x1, x2)) & (px <= max(x1, x2)) &
+                      (py >= min(y1, y2)) & (py <= max(y1, y2)))
+            on_edge |= (cross == 0) & within
+            # Even-odd ray casting towards +x
+            spans = (y1 > py) != (y2 > py)
+            crossings ^= spans & ((cross < 0) if dy > 0 else (cross > 0))
+            
+            # GEOS Distance::pointToSegment
+            start = np.sqrt((pxf - x1) ** 2 + (pyf - y1) ** 2)
+            len2 = float(dx * dx + dy * dy)
+            if len2 == 0:
+                seg = start
+            else:
+                r = ((pxf - x1) * dx + (pyf - y1) * dy) / len2
+                end = np.sqrt((pxf - x2) ** 2 + (pyf - y2) ** 2)
+                middle = np.abs(cross / len2) * np.sqrt(len2)
+                seg = np.where(r <= 0, start, np.where(r >= 1, end, middle))
+            np.minimum(distance, seg, out=distance)
+        
+        inside = crossings & ~on_edge
+        contained[(contained == -1) & inside] = index
+        distance[inside | on_edge] = 0.0
+        closer = distance < best
+        best[closer] = distance[closer]
+        nearest[closer] = index
+    
+    return np.where(contained >= 0, contained, nearest).astype(np.int8)
+
 class HexagonalCluster:
     """Handles hexagonal clustering for vehicle detection"""
     
@@ -24,6 +101,10 @@ class HexagonalCluster:
         """
         self.config = {}
         self.polygons = {}
+        # junction -> int8 image of zone indices (containing zone, else nearest)
+        self.zone_luts = {}
+        # junction -> pre-rendered zone overlay (see _render_zone_overlay)
+        self.zone_overlays = {}
         
         if config_path and os.path.exists(config_path):
             self.load_config(config_path)
@@ -42,6 +123,8 @@ class HexagonalCluster:
                 # Create polygon from points
                 polygon = Polygon(points)
                 self.polygons[junction_name][direction] = polygon
+            self.zone_luts.pop(junction_name, None)
+            self.zone_overlays.pop(junction_name, None)
     
     def set_manual_points(self, junction_name: str, hexagonal_points: Dict[str, List[Tuple[int, int]]]):
         """Manually set hexagonal points for a junction"""
@@ -53,18 +136,140 @@ class HexagonalCluster:
         for direction, points in hexagonal_points.items():
             polygon = Polygon(points)
             self.polygons[junction_name][direction] = polygon
+        self.zone_luts.pop(junction_name, None)
+        self.zone_overlays.pop(junction_name, None)
     
     def point_in_polygon(self, point: Tuple[int, int], polygon: Polygon) -> bool:
         """Check if a point is inside a polygon"""
         shapely_point = Point(point[0], point[1])
         return polygon.contains(shapely_point)
     
-    def cluster_detections(self, detections: List[Dict], junction_name: str) -> Dict[str, List[Dict]]:
+    def assign_directions(self, detections, junction_name: str) -> np.ndarray:
+        """
+        Assign each detection to a directional zone
+        
+        Args:
+            detections: DetectionBatch (or legacy list of detection dicts)
+            junction_name: Name of the junction to use for clustering
+            
+        Returns:
+            int8 array with an index into the junction's directions per
+            detection, -1 where no zone could be assigned
+        """
+        batch = DetectionBatch.coerce(detections)
+        assignments = np.full(len(batch), -1, dtype=np.int8)
+        junction_polygons = self.polygons.get(junction_name)
+        if not junction_polygons or len(batch) == 0:
+            return assignments
+        
+        lut = self.get_zone_lut(junction_name)
+        centers = batch.centers()
+        cx, cy = centers[:, 0], centers[:, 1]
+        in_lut = (cx >= 0) & (cy >= 0) & (cx < lut.shape[1]) & (cy < lut.shape[0])
+        assignments[in_lut] = lut[cy[in_lut], cx[in_lut]]
+        if not in_lut.all():
+            # Centres outside the precomputed raster are classified directly
+            outside = ~in_lut
+            assignments[outside] = _classify_points(cx[outside], cy[outside],
+                                                    self._zone_vertices(junction_name))
+        
+        return assignments
+    
+    def _zone_vertices(self, junction_name: str) -> List[np.ndarray]:
+        hex_points = self.config[junction_name]['hexagonal_points']
+        return [np.array(points, dtype=np.int64).reshape(-1, 2) for points in hex_points.values()]
+    
+    def get_zone_lut(self, junction_name: str) -> np.ndarray:
+        """
+        Per-pixel zone lookup table for a junction, built on first use.
+        
+        Each pixel holds the index of the zone that contains it or, for pixels
+        in no zone, of the nearest zone, so assigning a frame's detections is a
+        single array index.
+        
+        The zones are rasterised with ``cv2.fillPoly`` (first zone on top where
+        they overlap) and every other pixel takes the zone with the nearest
+        raster pixel (an exact ``cv2.distanceTransform`` per zone). A raster
+        is within ``LUT_MARGIN`` of its polygon, so only pixels near a zone
+        edge, or almost equally near two zones, can differ from the shapely
+        lookup; those are classified with ``_classify_points``. The table is
+        therefore identical to the shapely lookup, and takes a few hundred
+        milliseconds to build for a 1080p frame.
+        """
+        lut = self.zone_luts.get(junction_name)
+        if lut is not None:
+            return lut
+        
+        vertices = self._zone_vertices(junction_name)
+        all_points = np.concatenate(vertices)
+        width = max(DEFAULT_FRAME_SIZE[0], int(all_points[:, 0].max()) + 1)
+        height = max(DEFAULT_FRAME_SIZE[1], int(all_points[:, 1].max()) + 1)
+        
+        masks = []
+        for points in vertices:
+            mask = np.zeros((height, width), dtype=np.uint8)
+            cv2.fillPoly(mask, [points.astype(np.int32)], 1)
+            masks.append(mask)
+        if not all(mask.any() for mask in masks):
+            # A degenerate zone covers no pixel; classify the whole raster directly
+            px, py = np.meshgrid(np.arange(width, dtype=np.int64), np.arange(height, dtype=np.int64))
+            lut = _classify_points(px, py, vertices)
+        else:
+            # 0: no zone, else zone index + 1
+            zones = np.zeros((height, width), dtype=np.uint8)
+            for index, mask in enumerate(masks):
+                zones[(mask > 0) & (zones == 0)] = index + 1
+            # Nearest and second nearest zone raster of every pixel
+            nearest = np.zeros((height, width), dtype=np.int8)
+            best = np.full((height, width), np.inf, dtype=np.float32)
+            second = np.full((height, width), np.inf, dtype=np.float32)
+            for index, mask in enumerate(masks):
+                distance = cv2.distanceTransform(1 - mask, cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+                closer = distance < best
+                np.minimum(second, np.where(closer, best, distance), out=second)
+                best[closer] = distance[closer]
+                nearest[closer] = index
+            lut = np.where(zones > 0, zones.astype(np.int8) - 1, nearest)
+            uncertain = np.zeros((height, width), dtype=np.uint8)
+            cv2.polylines(uncertain, [points.astype(np.int32) for points in vertices], True, 1,
+                          thickness=2 * LUT_MARGIN + 1)
+            uncertain = (uncertain > 0) | ((zones == 0) & (second - best <= 2 * LUT_MARGIN))
+            ys, xs = np.nonzero(uncertain)
+            lut[ys, xs] = _classify_points(xs.astype(np.int64), ys.astype(np.int64), vertices)
+        
+        self.zone_luts[junction_name] = lut
+        return lut
+    
+    def cluster(self, detections, junction_name: str, frame_index: int = -1,
+                timestamp: float = 0.0) -> ClusterResult:
+        """
+        Cluster a frame's detections once into a shareable ClusterResult
+        
+        Args:
+            detections: DetectionBatch (or legacy list of detection dicts)
+            junction_name: Name of the junction to use for clustering
+            frame_index: Source frame index, carried along for consumers
+            timestamp: Capture time, carried along for consumers
+        """
+        batch = DetectionBatch.coerce(detections)
+        assignments = self.assign_directions(batch, junction_name)
+        directions = list(self.polygons.get(junction_name, {}).keys())
+        
+        counts = {direction: 0 for direction in DIRECTIONS}
+        if directions:
+            per_zone = np.bincount(assignments[assignments >= 0], minlength=len(directions))
+            for direction, count in zip(directions, per_zone.tolist()):
+                counts[direction] = count
+        
+        return ClusterResult(junction_name, batch, assignments, directions, counts,
+                             frame_index, timestamp)
+    
+    def cluster_detections(self, detections, junction_name: str) -> Dict[str, List[Dict]]:
         """
         Cluster YOLO detections into directional zones
         
         Args:
-            detections: List of YOLO detection dictionaries with 'bbox' and 'confidence'
+            detections: DetectionBatch or list of YOLO detection dictionaries with 'bbox' and 'confidence'
             junction_name: Name of the junction to use for clustering
             
         Returns:
@@ -72,31 +277,12 @@ class HexagonalCluster:
         """
         if junction_name not in self.polygons:
             print(f"Warning: Junction {junction_name} not found in config")
-            return {'north': [], 'east': [], 'west': [], 'south': []}
-        
-        clustered = {'north': [], 'east': [], 'west': [], 'south': []}
-        junction_polygons = self.polygons[junction_name]
+            return {direction: [] for direction in DIRECTIONS}
         
-        for detection in detections:
-            # Get center point of bounding box
-            bbox = detection['bbox']
-            center_x = int(bbox[0] + bbox[2] / 2)
-            center_y = int(bbox[1] + bbox[3] / 2)
-            center_point = (center_x, center_y)
-            
-            # Check which polygon contains this point
-            assigned = False
-            for direction, polygon in junction_polygons.items():
-                if self.point_in_polygon(center_point, polygon):
-                    clustered[direction].append(detection)
-                    assigned = True
-                    break
-            
-            # If not assigned to any polygon, could be in intersection - assign to closest
-            if not assigned:
-                closest_direction = self.find_closest_polygon(center_point, junction_polygons)
-                if closest_direction:
-                    clustered[closest_direction].append(detection)
+        result = self.cluster(detections, junction_name)
+        clustered = {direction: [] for direction in DIRECTIONS}
+        for direction in result.directions:
+            clustered[direction] = result.in_direction(direction).to_dicts()
         
         return clustered
     
@@ -114,70 +300,103 @@ class HexagonalCluster:
         
         return closest_direction
     
-    def get_vehicle_counts(self, detections: List[Dict], junction_name: str) -> Dict[str, int]:
+    def get_vehicle_counts(self, detections, junction_name: str) -> Dict[str, int]:
         """Get vehicle counts for each direction"""
-        clustered = self.cluster_detections(detections, junction_name)
-        return {direction: len(vehicles) for direction, vehicles in clustered.items()}
+        return self.cluster(detections, junction_name).counts
     
-    def draw_hexagonal_zones(self, frame: np.ndarray, junction_name: str) -> np.ndarray:
-        """Draw hexagonal zones on frame for visualization"""
-        if junction_name not in self.config:
-            return frame
-        
+    def _render_zone_overlay(self, junction_name: str, shape: Tuple[int, ...]):
+        """Render a junction's zone outlines and labels once onto a blank layer"""
         hex_points = self.config[junction_name]['hexagonal_points']
-        colors = {
-            'north': (0, 255, 0),    # Green
-            'east': (255, 0, 0),     # Blue  
-            'west': (0, 255, 255),   # Yellow
-            'south': (255, 0, 255)   # Magenta
-        }
+        layer = np.zeros(shape, dtype=np.uint8)
+        mask = np.zeros(shape[:2], dtype=np.uint8)
         
         for direction, points in hex_points.items():
-            color = colors.get(direction, (255, 255, 255))
+            color = DIRECTION_COLORS.get(direction, (255, 255, 255))
             
             # Convert points to numpy array
             pts = np.array(points, np.int32)
             pts = pts.reshape((-1, 1, 2))
+            centroid = pts.reshape(-1, 2).mean(axis=0).astype(int)
+            label_origin = (int(centroid[0]) - 20, int(centroid[1]))
             
-            # Draw polygon
-            cv2.polylines(frame, [pts], True, color, 2)
-            
-            # Add direction label
-            centroid_x = int(np.mean([p[0] for p in points]))
-            centroid_y = int(np.mean([p[1] for p in points]))
-            cv2.putText(frame, direction.upper(), (centroid_x-20, centroid_y), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+            # Draw polygon and direction label on the layer and its mask
+            for canvas, ink in ((layer, color), (mask, 255)):
+                cv2.polylines(canvas, [pts], True, ink, 2)
+                cv2.putText(canvas, direction.upper(), label_origin, 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, ink, 2)
+        
+        # Keep only the drawn pixels as flat byte indices. Solid pixels are
+        # copied; anti-aliased edges (partial coverage in the mask) are blended.
+        channels = shape[2] if len(shape) > 2 else 1
+        alpha = np.repeat(mask.reshape(-1), channels)
+        values = layer.reshape(-1)
+        solid = np.flatnonzero(alpha == 255)
+        edge = np.flatnonzero((alpha > 0) & (alpha < 255))
+        return {
+            'shape': shape,
+            'solid': solid,
+            'solid_values': values[solid],
+            'edge': edge,
+            'edge_alpha': alpha[edge].astype(np.uint16),
+            'edge_values': values[edge].astype(np.uint16),
+        }
+    
+    def draw_hexagonal_zones(self, frame: np.ndarray, junction_name: str) -> np.ndarray:
+        """Draw hexagonal zones on frame for visualization
+        
+        The zones never change between frames, so they are rendered once per
+        junction (and frame size) and copied onto each frame through a
+        precomputed pixel mask. The cache is dropped when the junction's
+        points are reloaded or set manually.
+        """
+        if junction_name not in self.config:
+            return frame
+        
+        overlay = self.zone_overlays.get(junction_name)
+        if overlay is None or overlay['shape'] != frame.shape:
+            overlay = self._render_zone_overlay(junction_name, frame.shape)
+            self.zone_overlays[junction_name] = overlay
+        
+        if not frame.flags['C_CONTIGUOUS']:
+            frame = np.ascontiguousarray(frame)
+        # Masked copy through a flat byte view of the frame
+        flat = frame.reshape(-1)
+        flat[overlay['solid']] = overlay['solid_values']
+        if overlay['edge'].size:
+            # The layer was drawn on black, so it is already colour * alpha
+            alpha = overlay['edge_alpha']
+            under = flat[overlay['edge']].astype(np.uint16)
+            flat[overlay['edge']] = ((under * (255 - alpha) + 127) // 255
+                                     + overlay['edge_values']).astype(np.uint8)
         
         return frame
     
-    def draw_detections_with_clusters(self, frame: np.ndarray, detections: List[Dict], 
+    def draw_detections_with_clusters(self, frame: np.ndarray, detections, 
                                     junction_name: str) -> np.ndarray:
-        """Draw detections colored by their cluster assignment"""
-        clustered = self.cluster_detections(detections, junction_name)
-        
-        colors = {
-            'north': (0, 255, 0),    # Green
-            'east': (255, 0, 0),     # Blue  
-            'west': (0, 255, 255),   # Yellow
-            'south': (255, 0, 255)   # Magenta
-        }
+        """Draw detections colored by their cluster assignment
+        
+        ``detections`` may be an already computed ClusterResult, in which case
+        no clustering is repeated.
+        """
+        result = detections
+        if not isinstance(result, ClusterResult):
+            result = self.cluster(detections, junction_name)
+        batch, assignments, directions = result.detections, result.assignments, result.directions
         
-        for direction, direction_detections in clustered.items():
-            color = colors.get(direction, (255, 255, 255))
+        boxes = batch.xyxy.astype(np.int32).tolist()
+        for (x1, y1, x2, y2), confidence, d in zip(boxes, batch.conf.tolist(), assignments.tolist()):
+            if d < 0:
+                continue
+            direction = directions[d]
+            color = DIRECTION_COLORS.get(direction, (255, 255, 255))
+            
+            # Draw bounding box
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
             
-            for detection in direction_detections:
-                bbox = detection['bbox']
-                x1, y1, w, h = bbox
-                x2, y2 = x1 + w, y1 + h
-                
-                # Draw bounding box
-                cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), color, 2)
-                
-                # Draw confidence score
-                confidence = detection.get('confidence', 0.0)
-                label = f"{direction}: {confidence:.2f}"
-                cv2.putText(frame, label, (int(x1), int(y1-10)), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+            # Draw confidence score
+            label = f"{direction}: {confidence:.2f}"
+            cv2.putText(frame, label, (x1, y1-10), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
         
         return frame
 
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Cross-junction batched YOLO inference.
+
+Producers submit frames tagged with their junction name; the batcher collects
+up to ``max_batch_size`` frames (or whatever arrived within ``max_wait``
+seconds of the first one) and runs them through ultralytics as a single
+batch. Each result is routed back to the future of the frame it came from.
+
+Batches run on an ``InferenceExecutor``; up to one batch per executor worker
+is in flight while the next one is being collected.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from detection_batch import DetectionBatch
+from inference_executor import InferenceExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = int(os.environ.get('INFERENCE_BATCH_SIZE', '4'))
+DEFAULT_MAX_WAIT = float(os.environ.get('INFERENCE_MAX_WAIT_MS', '10')) / 1000.0
+
+
+class InferenceBatcher:
+    """Groups frames from all junctions into batched YOLO calls"""
+
+    def __init__(self, executor: InferenceExecutor, max_batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_wait: float = DEFAULT_MAX_WAIT):
+        """
+        Args:
+            executor: Pool whose workers each hold a loaded YOLO model
+            max_batch_size: Largest number of frames run in one call
+            max_wait: Seconds to wait for more frames after the first arrives
+        """
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+
+        self._pending: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._slots = asyncio.Semaphore(executor.max_workers)
+        self._dispatching: Set[asyncio.Task] = set()
+
+        # Throughput accounting
+        self._started_at = time.time()
+        self._frames = 0
+        self._batches = 0
+        self._inference_seconds = 0.0
+        self._frames_per_junction: Dict[str, int] = defaultdict(int)
+
+    async def submit(self, junction_name: str, frame: np.ndarray) -> DetectionBatch:
+        """Queue a frame for the next batch and wait for its vehicle detections"""
+        if self._pending is None:
+            self._pending = asyncio.Queue()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._pending.put((junction_name, frame, future))
+        return await future
+
+    async def submit_many(self, junction_name: str, frames: List[np.ndarray]) -> List[DetectionBatch]:
+        """Queue several frames from one junction; they may share a batch"""
+        return list(await asyncio.gather(*(self.submit(junction_name, f) for f in frames)))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _collect(self) -> List[Tuple[str, np.ndarray, asyncio.Future]]:
+        batch = [await self._pending.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._pending.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _dispatch(self, batch: List[Tuple[str, np.ndarray, asyncio.Future]]):
+        frames = [frame for _, frame, _ in batch]
+        started = time.perf_counter()
+        try:
+            results = await self.executor.predict(frames)
+        except Exception as e:
+            logger.error(f"Error in batched inference: {e}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        self._inference_seconds += time.perf_counter() - started
+
+        self._batches += 1
+        self._frames += len(batch)
+        for (junction_name, _, future), result in zip(batch, results):
+            self._frames_per_junction[junction_name] += 1
+            if not future.done():
+                future.set_result(result)
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatching.add(task)
+            task.add_done_callback(self._dispatching.discard)
+
+    def stats(self) -> Dict[str, Any]:
+        """Throughput summary, including frames/sec per CPU core"""
+        cores = os.cpu_count() or 1
+        elapsed = max(time.time() - self._started_at, 1e-9)
+        # Batches overlap when the executor has several workers
+        busy_seconds = self._inference_seconds / self.executor.max_workers
+        busy_fps = self._frames / busy_seconds if busy_seconds else 0.0
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "frames": self._frames,
+            "batches": self._batches,
+            "avg_batch_size": self._frames / self._batches if self._batches else 0.0,
+            "frames_per_sec": self._frames / elapsed,
+            "inference_frames_per_sec": busy_fps,
+            "inference_frames_per_sec_per_core": busy_fps / cores,
+            "cores": cores,
+            "frames_per_junction": dict(self._frames_per_junction),
+            "executor": self.executor.stats(),
+        }
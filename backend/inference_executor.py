@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Dedicated executors for blocking detection work.
+
+Frame decoding, YOLO inference and JPEG encoding are all blocking calls. The
+async endpoints submit them here and await the result, so one slow frame no
+longer stalls every other request on the event loop.
+
+Inference can run in a thread pool (default) or a process pool; each worker
+loads its own YOLO model because ultralytics predictors are not safe to share
+between concurrent callers.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import cv2
+
+from detection_batch import CONFIDENCE_THRESHOLD, DetectionBatch
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_KIND = os.environ.get('INFERENCE_EXECUTOR', 'thread')
+EXECUTOR_WORKERS = int(os.environ.get('INFERENCE_WORKERS', '1'))
+FRAME_IO_WORKERS = int(os.environ.get('FRAME_IO_WORKERS', '4'))
+
+# Per-worker model (thread-local also works inside pool processes)
+_worker_state = threading.local()
+
+
+def _load_worker_model(model_path: str, torch_threads: Optional[int] = None):
+    if torch_threads:
+        # Several processes sharing the cores: avoid oversubscribing them
+        import torch
+        torch.set_num_threads(torch_threads)
+    from ultralytics import YOLO
+    _worker_state.model = YOLO(model_path)
+
+
+def predict_in_worker(frames: List[Any]) -> List[DetectionBatch]:
+    """
+    Run the worker's own YOLO model on a batch of frames.
+
+    Results are reduced to vehicle DetectionBatches inside the worker so only
+    a few small arrays cross back to the caller (cheap to pickle in process
+    mode).
+    """
+    return [DetectionBatch.from_result(result) for result in _worker_state.model(frames)]
+
+
+def count_vehicles_in_worker(frames: List[Any], min_confidence: float = 0.0) -> List[int]:
+    """Vehicle count per frame for a batch, using the worker's own YOLO model"""
+    return [len(DetectionBatch.from_result(result, min_confidence=min_confidence))
+            for result in _worker_state.model(frames)]
+
+
+def _read_batches(video_path: str, start: int, stop: Optional[int],
+                  batch_size: int) -> Iterator[List[Any]]:
+    """Decoded frames of ``[start, stop)`` of a video file (to the end when ``stop`` is None), in batches"""
+    cap = cv2.VideoCapture(video_path)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    frames: List[Any] = []
+    remaining = None if stop is None else stop - start
+    try:
+        while remaining is None or remaining > 0:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+            if remaining is not None:
+                remaining -= 1
+            if len(frames) == batch_size:
+                yield frames
+                frames = []
+        if frames:
+            yield frames
+    finally:
+        cap.release()
+
+
+def count_frames_in_worker(video_path: str, start: int, stop: Optional[int],
+                           batch_size: int = 8, min_confidence: float = 0.0) -> List[int]:
+    """
+    Vehicle count of every frame in ``[start, stop)`` of a video file (to the
+    end when ``stop`` is None), using the worker's own YOLO model.
+    """
+    counts: List[int] = []
+    for frames in _read_batches(video_path, start, stop, batch_size):
+        counts.extend(count_vehicles_in_worker(frames, min_confidence))
+    return counts
+
+
+def detect_frames_in_worker(video_path: str, start: int, stop: Optional[int],
+                            batch_size: int = 8,
+                            min_confidence: float = CONFIDENCE_THRESHOLD) -> List[DetectionBatch]:
+    """Vehicle detections of every frame in ``[start, stop)`` of a video file"""
+    detections: List[DetectionBatch] = []
+    for frames in _read_batches(video_path, start, stop, batch_size):
+        detections.extend(DetectionBatch.from_result(result, min_confidence=min_confidence)
+                          for result in _worker_state.model(frames))
+    return detections
+
+
+class InferenceExecutor:
+    """Thread or process pool that tracks how much work is waiting on it"""
+
+    def __init__(self, kind: str = 'thread', max_workers: int = 1,
+                 model_path: Optional[str] = None, start_method: Optional[str] = None,
+                 torch_threads: Optional[int] = None):
+        """
+        Args:
+            kind: 'thread' or 'process'
+            max_workers: Pool size
+            model_path: YOLO weights loaded once per worker (inference pools only)
+            start_method: multiprocessing start method for process pools
+                ('spawn' avoids forking a parent that already runs torch threads)
+            torch_threads: Intra-op threads per worker (None keeps torch's default)
+        """
+        if kind not in ('thread', 'process'):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self.model_path = model_path
+
+        initializer = _load_worker_model if model_path else None
+        initargs = (model_path, torch_threads) if model_path else ()
+        if kind == 'process':
+            mp_context = multiprocessing.get_context(start_method) if start_method else None
+            self._pool: Executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=mp_context,
+                initializer=initializer, initargs=initargs)
+        else:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix='inference',
+                initializer=initializer, initargs=initargs)
+
+        self._in_flight = 0
+        self._completed = 0
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Submit a blocking call to the pool and await its result"""
+        loop = asyncio.get_running_loop()
+        self._in_flight += 1
+        try:
+            return await loop.run_in_executor(self._pool, fn, *args)
+        finally:
+            self._in_flight -= 1
+            self._completed += 1
+
+    async def predict(self, frames: List[Any]) -> List[DetectionBatch]:
+        """Run YOLO on a batch of frames using the worker-local model"""
+        return await self.run(predict_in_worker, frames)
+
+    @property
+    def queue_depth(self) -> int:
+        """Submitted calls that are waiting for a free worker"""
+        return max(0, self._in_flight - self.max_workers)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "workers": self.max_workers,
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+            "completed": self._completed,
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
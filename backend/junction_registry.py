@@ -0,0 +1,127 @@
+"""
+Registry of traffic junctions and the names each service knows them by.
+
+The API server keys signal state by a short id (``01_``), the drone server
+keys videos and producers by config name (``junction_01_normal``) and the
+frontend uses its own identifiers (``normal_01``). Every name is registered
+here as an alias of one canonical junction, so both servers resolve any of
+them with a single dict lookup. Junctions can be added at runtime.
+
+The built-in junctions can be replaced by a JSON list of junction objects
+(``{"id", "drone_name", "aliases", "default_direction"}``) pointed to by the
+``JUNCTIONS_CONFIG`` environment variable.
+"""
+
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JUNCTIONS_CONFIG = os.environ.get('JUNCTIONS_CONFIG')
+
+DEFAULT_JUNCTIONS = [
+    {"id": "01_", "drone_name": "junction_01_normal", "aliases": ["normal_01"]},
+    {"id": "02_", "drone_name": "junction_02_normal", "aliases": ["normal_02"]},
+    {"id": "05_", "drone_name": "junction_03_flipped", "aliases": ["flipped_03"]},
+    {"id": "rifatuslu_", "drone_name": "junction_04_flipped", "aliases": ["flipped_04"]},
+]
+
+
+class Junction:
+    """One junction: canonical id, drone video name and extra aliases"""
+
+    __slots__ = ('id', 'drone_name', 'aliases', 'default_direction')
+
+    def __init__(self, id: str, drone_name: Optional[str] = None,
+                 aliases: Iterable[str] = (), default_direction: str = 'north'):
+        self.id = id
+        self.drone_name = drone_name
+        self.aliases = list(aliases)
+        self.default_direction = default_direction
+
+    def names(self) -> List[str]:
+        names = [self.id] + self.aliases
+        if self.drone_name:
+            names.append(self.drone_name)
+        return names
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "drone_name": self.drone_name,
+            "aliases": self.aliases,
+            "default_direction": self.default_direction,
+        }
+
+
+class JunctionRegistry:
+    """Canonical junctions plus a flat alias index"""
+
+    def __init__(self, junctions: Iterable[Dict[str, Any]] = ()):
+        self.junctions: Dict[str, Junction] = {}
+        self._aliases: Dict[str, str] = {}
+        for junction in junctions:
+            self.register(**junction)
+
+    def register(self, id: str, drone_name: Optional[str] = None,
+                 aliases: Iterable[str] = (), default_direction: str = 'north') -> Junction:
+        """
+        Add or replace a junction.
+
+        Raises ValueError if one of its names already belongs to another junction.
+        """
+        junction = Junction(id, drone_name, aliases, default_direction)
+        for name in junction.names():
+            owner = self._aliases.get(name)
+            if owner is not None and owner != id:
+                raise ValueError(f"Name {name!r} already belongs to junction {owner!r}")
+
+        previous = self.junctions.get(id)
+        if previous is not None:
+            for name in previous.names():
+                self._aliases.pop(name, None)
+        self.junctions[id] = junction
+        for name in junction.names():
+            self._aliases[name] = id
+        return junction
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Canonical id for any registered name, None if unknown"""
+        return self._aliases.get(name)
+
+    def get(self, name: str) -> Optional[Junction]:
+        junction_id = self._aliases.get(name)
+        return self.junctions[junction_id] if junction_id is not None else None
+
+    def drone_name(self, name: str) -> str:
+        """Drone video name for any registered name (the name itself if unknown)"""
+        junction = self.get(name)
+        if junction is None or not junction.drone_name:
+            return name
+        return junction.drone_name
+
+    def defaults(self) -> Dict[str, str]:
+        """Initial direction per canonical id"""
+        return {junction.id: junction.default_direction for junction in self.junctions.values()}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._aliases
+
+    def __len__(self) -> int:
+        return len(self.junctions)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return [junction.to_dict() for junction in self.junctions.values()]
+
+
+def load_registry(path: Optional[str] = JUNCTIONS_CONFIG) -> JunctionRegistry:
+    """Registry from a JSON config file, or the built-in junctions"""
+    if path:
+        try:
+            with open(path, 'r') as f:
+                return JunctionRegistry(json.load(f))
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"Error loading junction config {path}: {e}")
+    return JunctionRegistry(DEFAULT_JUNCTIONS)
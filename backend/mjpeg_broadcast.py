@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Encode-once MJPEG broadcasting.
+
+Every feed (a drone junction, a joined or stitched video) JPEG-encodes each
+frame once and hands the same multipart chunk (one ``bytes`` object) to all of
+its viewers. Viewers have a small bounded backlog: when a viewer falls behind,
+its oldest frames are dropped so it skips ahead to the newest one instead of
+queueing stale frames, and the drops are counted per viewer.
+
+Viewers may ask for a smaller ``width`` and/or a JPEG ``quality``. Requests
+are normalised to a small set of renditions; each rendition is resized and
+encoded once per source frame, only while it has viewers, and shared by all
+viewers that asked for it.
+
+Looping video files are served by ``PacedVideoPublisher``: an asyncio task per
+(file, fps) that reads and encodes on a bounded executor and paces itself
+against a deadline clock, so viewers never occupy a server worker thread.
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Set, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VIEWER_BACKLOG = 1
+MULTIPART_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+MJPEG_MEDIA_TYPE = "multipart/x-mixed-replace; boundary=frame"
+
+# Rendition normalisation: widths snap to multiples of WIDTH_STEP and
+# qualities to multiples of QUALITY_STEP so similar requests share an encode
+WIDTH_STEP = 32
+MIN_WIDTH = 64
+QUALITY_STEP = 5
+MIN_QUALITY = 10
+MAX_QUALITY = 95
+
+RenditionKey = Tuple[Optional[int], Optional[int]]
+
+DEFAULT_STREAM_FPS = float(os.environ.get('DEFAULT_STREAM_FPS', '10'))
+MAX_STREAM_FPS = 30.0
+# Concurrent MJPEG viewers allowed per hub (i.e. per server process)
+MAX_STREAM_VIEWERS = int(os.environ.get('MAX_STREAM_VIEWERS', '500'))
+
+
+class ViewerLimitError(Exception):
+    """Raised when a hub already serves its maximum number of viewers"""
+
+
+def normalize_rendition(width: Optional[int] = None, quality: Optional[int] = None) -> RenditionKey:
+    """Snap requested width/quality to a shared rendition key (None = source/default)"""
+    if width is not None:
+        width = max(MIN_WIDTH, int(round(width / WIDTH_STEP)) * WIDTH_STEP)
+    if quality is not None:
+        quality = int(round(quality / QUALITY_STEP)) * QUALITY_STEP
+        quality = min(MAX_QUALITY, max(MIN_QUALITY, quality))
+    return width, quality
+
+
+class MJPEGViewer:
+    """One connected viewer of a feed with a bounded frame backlog"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, backlog: int = DEFAULT_VIEWER_BACKLOG):
+        self.id = next(self._ids)
+        self.frames: Deque[bytes] = deque(maxlen=max(1, backlog))
+        self.rendition: RenditionKey = (None, None)
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+        self._ready = asyncio.Event()
+
+    def push(self, chunk: bytes):
+        if len(self.frames) == self.frames.maxlen:
+            # Deque drops the oldest frame on append
+            self.dropped += 1
+        self.frames.append(chunk)
+        self._ready.set()
+
+    def close(self):
+        """End the stream once the backlog is drained (the source has stopped)"""
+        self.closed = True
+        self._ready.set()
+
+    async def next(self) -> Optional[bytes]:
+        """Wait for and return the oldest frame still in the backlog, None once closed"""
+        while not self.frames:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        self.sent += 1
+        return self.frames.popleft()
+
+    def stats(self) -> Dict[str, int]:
+        return {"id": self.id, "sent": self.sent, "dropped": self.dropped,
+                "backlog": len(self.frames)}
+
+
+class MJPEGRendition:
+    """One width/quality variant of a feed and the viewers watching it"""
+
+    def __init__(self, width: Optional[int] = None, quality: Optional[int] = None):
+        """
+        Args:
+            width: Output width in pixels, source width when None
+            quality: JPEG quality, OpenCV default when None
+        """
+        self.width = width
+        self.quality = quality
+        self.viewers: Set[MJPEGViewer] = set()
+        self.frames_encoded = 0
+        self.bytes_encoded = 0
+
+    def render(self, frame: np.ndarray) -> Optional[bytes]:
+        """Resize (never upscale) and encode a frame into a multipart chunk"""
+        if self.width is not None and self.width < frame.shape[1]:
+            height = max(1, int(round(frame.shape[0] * self.width / frame.shape[1])))
+            frame = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.quality] if self.quality else []
+        ret, buffer = cv2.imencode('.jpg', frame, params)
+        if not ret:
+            return None
+        return MULTIPART_HEADER + buffer.tobytes() + b'\r\n'
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "width": self.width,
+            "quality": self.quality,
+            "viewers": len(self.viewers),
+            "frames_encoded": self.frames_encoded,
+            "avg_frame_bytes": self.bytes_encoded / self.frames_encoded if self.frames_encoded else 0,
+            "dropped": sum(viewer.dropped for viewer in self.viewers),
+            "per_viewer": [viewer.stats() for viewer in self.viewers],
+        }
+
+
+class MJPEGFeed:
+    """A single source of frames shared by all of its viewers"""
+
+    def __init__(self, key: str, executor=None):
+        """
+        Args:
+            key: Feed identifier (junction name or video path)
+            executor: Optional InferenceExecutor used for resizing and encoding
+        """
+        self.key = key
+        self.executor = executor
+        self.renditions: Dict[RenditionKey, MJPEGRendition] = {}
+
+    @property
+    def viewer_count(self) -> int:
+        return sum(len(rendition.viewers) for rendition in self.renditions.values())
+
+    def add_viewer(self, viewer: MJPEGViewer, width: Optional[int] = None,
+                   quality: Optional[int] = None):
+        key = normalize_rendition(width, quality)
+        if key not in self.renditions:
+            self.renditions[key] = MJPEGRendition(*key)
+        self.renditions[key].viewers.add(viewer)
+        viewer.rendition = key
+
+    def remove_viewer(self, viewer: MJPEGViewer):
+        rendition = self.renditions.get(viewer.rendition)
+        if rendition is not None:
+            rendition.viewers.discard(viewer)
+            if not rendition.viewers:
+                del self.renditions[viewer.rendition]
+
+    def close(self):
+        """Close every viewer's stream, e.g. when the source cannot be read"""
+        for rendition in self.renditions.values():
+            for viewer in rendition.viewers:
+                viewer.close()
+        self.renditions.clear()
+
+    async def _render(self, rendition: MJPEGRendition, frame: np.ndarray) -> Optional[bytes]:
+        if self.executor is not None:
+            return await self.executor.run(rendition.render, frame)
+        return rendition.render(frame)
+
+    async def publish_frame(self, frame: np.ndarray):
+        """Encode each watched rendition of a frame once and broadcast it"""
+        active = [rendition for rendition in self.renditions.values() if rendition.viewers]
+        if not active:
+            return
+        chunks = await asyncio.gather(*(self._render(rendition, frame) for rendition in active))
+        for rendition, chunk in zip(active, chunks):
+            if chunk is None:
+                continue
+            rendition.frames_encoded += 1
+            rendition.bytes_encoded += len(chunk)
+            for viewer in rendition.viewers:
+                viewer.push(chunk)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "viewers": self.viewer_count,
+            "renditions": [rendition.stats() for rendition in self.renditions.values()],
+        }
+
+
+class MJPEGHub:
+    """Registry of MJPEG feeds for one server"""
+
+    def __init__(self, executor=None, backlog: int = DEFAULT_VIEWER_BACKLOG,
+                 max_viewers: int = MAX_STREAM_VIEWERS):
+        """
+        Args:
+            executor: InferenceExecutor for decoding, resizing and encoding
+            backlog: Frames buffered per viewer before the oldest is dropped
+            max_viewers: Concurrent viewers allowed across all feeds
+        """
+        self.executor = executor
+        self.backlog = backlog
+        self.max_viewers = max_viewers
+        self.feeds: Dict[str, MJPEGFeed] = {}
+        self.publishers: Dict[str, 'PacedVideoPublisher'] = {}
+
+    @property
+    def viewer_count(self) -> int:
+        return sum(feed.viewer_count for feed in self.feeds.values())
+
+    def feed(self, key: str) -> MJPEGFeed:
+        if key not in self.feeds:
+            self.feeds[key] = MJPEGFeed(key, self.executor)
+        return self.feeds[key]
+
+    def subscribe(self, key: str, width: Optional[int] = None,
+                  quality: Optional[int] = None) -> MJPEGViewer:
+        """Register a viewer on a feed (before its response starts streaming)"""
+        if self.viewer_count >= self.max_viewers:
+            raise ViewerLimitError(f"Viewer limit of {self.max_viewers} reached")
+        viewer = MJPEGViewer(self.backlog)
+        self.feed(key).add_viewer(viewer, width, quality)
+        return viewer
+
+    async def stream(self, key: str, viewer: MJPEGViewer) -> AsyncIterator[bytes]:
+        """Multipart body for one viewer; unsubscribes when the client goes away"""
+        try:
+            while True:
+                chunk = await viewer.next()
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self.feed(key).remove_viewer(viewer)
+
+    def stream_video_file(self, video_path: str, fps: Optional[float] = None,
+                          width: Optional[int] = None,
+                          quality: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Subscribe to a looping video file feed, starting its publisher if needed.
+        
+        Each (file, fps) pair is its own feed. Raises ViewerLimitError when
+        the hub is full.
+        """
+        fps = min(MAX_STREAM_FPS, max(1.0, fps or DEFAULT_STREAM_FPS))
+        key = f"{video_path}@{fps:g}fps"
+        viewer = self.subscribe(key, width, quality)
+        publisher = self.publishers.get(key)
+        if publisher is None:
+            publisher = PacedVideoPublisher(self.feed(key), video_path, fps, self.executor)
+            self.publishers[key] = publisher
+        publisher.start()
+        return self.stream(key, viewer)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "viewers": self.viewer_count,
+            "max_viewers": self.max_viewers,
+            "executor": self.executor.stats() if self.executor is not None else None,
+            "feeds": {key: feed.stats() for key, feed in self.feeds.items()},
+        }
+
+
+class FramePacer:
+    """Deadline-based pacing that does not drift with per-frame work time"""
+
+    def __init__(self, fps: float):
+        self.interval = 1.0 / fps
+        self._next: Optional[float] = None
+
+    async def wait(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._next is None or now - self._next > self.interval:
+            # First frame, or fell more than a frame behind: resynchronise
+            self._next = now
+        self._next += self.interval
+        await asyncio.sleep(max(0.0, self._next - now))
+
+
+class PacedVideoPublisher:
+    """Reads a video file in a loop and publishes it to a feed while it has viewers"""
+
+    def __init__(self, feed: MJPEGFeed, video_path: str, fps: float = DEFAULT_STREAM_FPS,
+                 executor=None):
+        """
+        Args:
+            feed: Feed the frames are broadcast on
+            video_path: Video file to loop
+            fps: Target frames per second
+            executor: InferenceExecutor used for decoding (inline when None)
+        """
+        self.feed = feed
+        self.video_path = video_path
+        self.fps = fps
+        self.executor = executor
+        self._cap: Optional[cv2.VideoCapture] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _read_frame(self) -> Optional[np.ndarray]:
+        if self._cap is None:
+            self._cap = cv2.VideoCapture(self.video_path)
+        ret, frame = self._cap.read()
+        if not ret:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Loop: restart video
+            ret, frame = self._cap.read()
+        return frame if ret else None
+
+    async def _call(self, fn, *args):
+        if self.executor is not None:
+            return await self.executor.run(fn, *args)
+        return fn(*args)
+
+    async def _run(self):
+        pacer = FramePacer(self.fps)
+        try:
+            while self.feed.viewer_count:
+                frame = await self._call(self._read_frame)
+                if frame is None:
+                    logger.error(f"Cannot read frames from {self.video_path}")
+                    self.feed.close()
+                    break
+                await self.feed.publish_frame(frame)
+                await pacer.wait()
+        except Exception as e:
+            logger.error(f"Error streaming {self.video_path}: {e}")
+            self.feed.close()
+        finally:
+            cap, self._cap = self._cap, None
+            # Detach before the last await, so a viewer subscribing while the
+            # capture is released starts a fresh run instead of being ignored
+            if self._task is asyncio.current_task():
+                self._task = None
+            if cap is not None:
+                await self._call(cap.release)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Offline detection precompute for the recorded junction videos.
+
+Runs YOLO over every frame of each drone junction video listed in
+drone_junctions_config.json (clustered into its hexagonal direction zones)
+and of each video in joined_videos/, spread over one process per CPU core,
+and writes a detection index per video (see detection_index). Servers started
+with DETECTION_REPLAY=1 then serve vehicle counts from the indexes without
+loading a model. The per-frame detection caches beside the videos are filled
+too, so live mode starts warm.
+
+    python precompute_detections.py
+    python precompute_detections.py --only drone --workers 4 --force
+
+Indexes already built for the same video, model, thresholds and zones are
+skipped unless --force is given.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from glob import glob
+from typing import Any, Dict, List
+
+import cv2
+
+from detection_batch import CONFIDENCE_THRESHOLD
+from detection_index import DETECTION_INDEX_DIR, index_path, read_meta, video_identity, write_index
+from detection_jobs import plan_segments
+from frame_detection_cache import open_frame_cache
+from hexagonal_clustering import HexagonalCluster
+from inference_executor import InferenceExecutor, detect_frames_in_worker
+from result_cache import model_identity
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# Detection thresholds of the servers replaying each kind of video
+DRONE_MIN_CONFIDENCE = CONFIDENCE_THRESHOLD
+JOINED_MIN_CONFIDENCE = 0.0
+
+
+def zones_hash(hexagonal_points: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(hexagonal_points, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def find_videos(config_path: str, joined_dir: str, only: str) -> List[Dict[str, Any]]:
+    """Every video to index, with what its index should be built from"""
+    videos = []
+    if only in ('all', 'drone') and os.path.exists(config_path):
+        with open(config_path) as f:
+            config = json.load(f)
+        for junction_name, junction_config in config.items():
+            video_path = os.path.join(os.path.dirname(config_path), junction_config['video_file'])
+            if not os.path.exists(video_path):
+                print(f"⚠️ Video not found: {video_path}")
+                continue
+            videos.append({"kind": "drone", "name": junction_name, "video_path": video_path,
+                           "min_confidence": DRONE_MIN_CONFIDENCE,
+                           "zones_config": zones_hash(junction_config['hexagonal_points'])})
+    if only in ('all', 'joined'):
+        for video_path in sorted(glob(os.path.join(joined_dir, '*.mp4'))):
+            name = os.path.splitext(os.path.basename(video_path))[0]
+            videos.append({"kind": "joined", "name": name, "video_path": video_path,
+                           "min_confidence": JOINED_MIN_CONFIDENCE, "zones_config": None})
+    return videos
+
+
+def index_meta(video: Dict[str, Any], model_path: str) -> Dict[str, Any]:
+    return {
+        "video": video_identity(video["video_path"]),
+        "model": model_identity(model_path),
+        "min_confidence": video["min_confidence"],
+        "zones_config": video["zones_config"],
+    }
+
+
+def up_to_date(video: Dict[str, Any], meta: Dict[str, Any], output: str) -> bool:
+    existing = read_meta(index_path(video["kind"], video["name"], output))
+    return existing is not None and all(existing.get(key) == value for key, value in meta.items())
+
+
+async def precompute_video(video: Dict[str, Any], meta: Dict[str, Any], executor: InferenceExecutor,
+                           clusterer: HexagonalCluster, args) -> None:
+    video_path = video["video_path"]
+    cap = cv2.VideoCapture(video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+
+    started = time.perf_counter()
+    segments = plan_segments(total_frames, executor.max_workers, args.segment_frames)
+    results = await asyncio.gather(*(
+        executor.run(detect_frames_in_worker, video_path, start, stop, args.batch_size,
+                     video["min_confidence"])
+        for start, stop in segments))
+    detections = [batch for segment in results for batch in segment]
+    if not detections:
+        print(f"❌ {video['kind']}/{video['name']}: no frames could be decoded")
+        return
+
+    clusters = None
+    if video["kind"] == "drone":
+        clusters = [clusterer.cluster(batch, video["name"], frame)
+                    for frame, batch in enumerate(detections)]
+    write_index(index_path(video["kind"], video["name"], args.output), detections, clusters,
+                {**meta, "fps": fps, "built_at": time.time()})
+
+    cache = open_frame_cache(video_path, args.model, video["min_confidence"])
+    if cache is not None:
+        for frame, batch in enumerate(detections):
+            cache.put(frame, batch)
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ {video['kind']}/{video['name']}: {len(detections)} frames, "
+          f"{sum(len(batch) for batch in detections)} detections in {elapsed:.1f}s "
+          f"({len(detections) / elapsed:.1f} FPS)")
+
+
+async def precompute(videos: List[Dict[str, Any]], args) -> None:
+    executor = InferenceExecutor('process', args.workers, args.model, start_method='spawn',
+                                 torch_threads=1)
+    clusterer = HexagonalCluster(args.config)
+    try:
+        # Every video's segments share the pool, so all cores stay busy
+        await asyncio.gather(*(precompute_video(video, meta, executor, clusterer, args)
+                               for video, meta in videos))
+    finally:
+        executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute detection indexes for replay mode")
+    parser.add_argument('--config', default=os.path.join(BACKEND_DIR, 'drone_videos',
+                                                         'drone_junctions_config.json'),
+                        help="Drone junction config (videos and hexagonal zones)")
+    parser.add_argument('--joined-dir', default=os.path.join(BACKEND_DIR, 'joined_videos'),
+                        help="Directory of joined junction videos")
+    parser.add_argument('--only', choices=('all', 'drone', 'joined'), default='all')
+    parser.add_argument('--model', default=os.path.join(BACKEND_DIR, 'yolov8n.pt'),
+                        help="YOLO weights")
+    parser.add_argument('--output', default=DETECTION_INDEX_DIR, help="Index directory")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Detection processes (default: all cores)")
+    parser.add_argument('--batch-size', type=int, default=8, help="Frames per YOLO call")
+    parser.add_argument('--segment-frames', type=int, default=0,
+                        help="Frames per work unit (0: split each video across the workers)")
+    parser.add_argument('--force', action='store_true', help="Rebuild up-to-date indexes")
+    args = parser.parse_args()
+
+    videos = []
+    for video in find_videos(args.config, args.joined_dir, args.only):
+        meta = index_meta(video, args.model)
+        if not args.force and up_to_date(video, meta, args.output):
+            print(f"⏭️ {video['kind']}/{video['name']}: index up to date")
+            continue
+        videos.append((video, meta))
+    if not videos:
+        print("Nothing to precompute")
+        return
+
+    print(f"Indexing {len(videos)} videos with {args.workers} workers into {args.output}")
+    started = time.perf_counter()
+    asyncio.run(precompute(videos, args))
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of uploaded-video detection results.
+
+Operators often upload the same clip again. Results are stored on disk under
+a key made of the video's SHA-256 (computed while the upload is copied or
+streamed, so no extra pass over the file), the model identity (weights name
+and content hash) and the detection parameters, so a repeated upload returns
+its per-frame counts without running inference.
+
+Each entry is one small ``.npz`` (int32 counts plus the source size). The
+directory is bounded by total bytes and evicted least recently used first;
+hits refresh an entry's mtime, so recency survives restarts.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_DIR = os.environ.get(
+    'RESULT_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'result_cache'))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_MB', '256')) * 1024 * 1024
+COPY_CHUNK_BYTES = 1 << 20
+
+
+def copy_and_hash(src: BinaryIO, dst: BinaryIO) -> Tuple[str, int]:
+    """Copy a file object while hashing it; returns (sha256 hex, bytes)"""
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = src.read(COPY_CHUNK_BYTES)
+        if not chunk:
+            break
+        digest.update(chunk)
+        dst.write(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class HashingStream:
+    """Wraps an async iterator of byte chunks, hashing them as they pass through"""
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self.chunks = chunks
+        self._digest = hashlib.sha256()
+        self.size = 0
+        self.complete = False
+
+    async def __aiter__(self):
+        async for chunk in self.chunks:
+            self._digest.update(chunk)
+            self.size += len(chunk)
+            yield chunk
+        self.complete = True
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+_model_ids: Dict[str, str] = {}
+
+
+def model_identity(model_path: str) -> str:
+    """Weights name plus content hash (computed once per process); the name alone if not on disk"""
+    identity = _model_ids.get(model_path)
+    if identity is None:
+        identity = os.path.basename(model_path)
+        if os.path.exists(model_path):
+            digest = hashlib.sha256()
+            with open(model_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(COPY_CHUNK_BYTES), b''):
+                    digest.update(chunk)
+            identity = f"{identity}:{digest.hexdigest()[:16]}"
+        _model_ids[model_path] = identity
+    return identity
+
+
+class ResultCache:
+    """Size-bounded LRU of per-frame counts keyed by content, model and parameters"""
+
+    def __init__(self, directory: str = RESULT_CACHE_DIR, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # key -> entry file size, least recently used first
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self.size_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+        self._load()
+
+    @staticmethod
+    def key(content_hash: str, model_id: str, params: Dict[str, Any]) -> str:
+        material = json.dumps({"content": content_hash, "model": model_id, "params": params},
+                              sort_keys=True)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self.size_bytes += size
+
+    def get(self, key: str) -> Optional[List[int]]:
+        with self._lock:
+            if key not in self._entries:
+                # Possibly written by another worker process
+                try:
+                    size = os.path.getsize(self._path(key))
+                except OSError:
+                    self.misses += 1
+                    return None
+                self._entries[key] = size
+                self.size_bytes += size
+            self._entries.move_to_end(key)
+        try:
+            with np.load(self._path(key)) as entry:
+                counts = entry['counts'].tolist()
+                source_bytes = int(entry['source_bytes'])
+            os.utime(self._path(key))
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Dropping unreadable result cache entry {key}: {e}")
+            with self._lock:
+                self.size_bytes -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += source_bytes
+        return counts
+
+    def put(self, key: str, counts: List[int], source_bytes: int):
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.savez(f, counts=np.asarray(counts, dtype=np.int32),
+                     source_bytes=np.int64(source_bytes))
+        os.replace(temp_path, path)
+        with self._lock:
+            self.size_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = os.path.getsize(path)
+            self.size_bytes += self._entries[key]
+            while self.size_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self.size_bytes -= old_size
+                self.evictions += 1
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,284 @@
+"""
+Pluggable storage for junction signal state.
+
+``SignalHub`` only knows the subscribers of its own process. With
+``uvicorn --workers N`` every worker has its own hub, so updates must be
+shared through a backend:
+
+- ``memory``: process-local, publishes straight into the hub (single worker).
+- ``sqlite`` (default): state and an append-only event log in a SQLite file in
+  WAL mode. Every worker polls the log (a cheap ``PRAGMA data_version`` check
+  when nothing changed) and replays new events into its hub, so a POST to any
+  worker reaches subscribers on all workers within ``poll_interval``.
+
+Select with ``SIGNAL_BACKEND`` and ``SIGNAL_DB_PATH``; no external service is
+needed either way.
+
+The backend also holds the latest per-direction vehicle counts and active
+emergency preemptions, and elects one worker (``acquire_controller``) to run the adaptive signal controller so
+phase changes are not published once per worker.
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from signal_hub import SignalHub
+
+logger = logging.getLogger(__name__)
+
+SIGNAL_BACKEND = os.environ.get('SIGNAL_BACKEND', 'sqlite')
+SIGNAL_DB_PATH = os.environ.get(
+    'SIGNAL_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'signal_state.db'))
+POLL_INTERVAL = float(os.environ.get('SIGNAL_POLL_MS', '20')) / 1000.0
+# Events kept in the log for workers that fall behind
+EVENT_LOG_SIZE = 10000
+# Events written (by this worker) between prunes of the log
+PRUNE_INTERVAL = 1000
+# Events loaded into the hub's replay rings at startup
+REPLAY_EVENTS = 1000
+
+
+class MemorySignalBackend:
+    """Single-process backend: updates go straight to the local hub"""
+
+    def __init__(self):
+        self.hub: Optional[SignalHub] = None
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._preemptions: List[Dict] = []
+
+    async def start(self, hub: SignalHub, defaults: Dict[str, str]):
+        self.hub = hub
+        for junction, direction in defaults.items():
+            hub.status.setdefault(junction, direction)
+
+    def acquire_controller(self) -> bool:
+        return True
+
+    async def save_counts(self, counts: Dict[str, Dict[str, int]]):
+        self._counts.update(counts)
+
+    async def load_counts(self) -> Dict[str, Dict[str, int]]:
+        """Counts saved since the previous call"""
+        counts, self._counts = self._counts, {}
+        return counts
+
+    async def save_preemption(self, record: Dict):
+        self._preemptions.append(record)
+
+    async def load_preemptions(self) -> List[Dict]:
+        """Preemption records saved since the previous call"""
+        records, self._preemptions = self._preemptions, []
+        return records
+
+    async def publish(self, junction: str, direction: str):
+        self.hub.publish(junction, direction)
+
+    async def publish_many(self, updates: Iterable[Tuple[str, str]]):
+        self.hub.publish_many(updates)
+
+    async def stop(self):
+        pass
+
+
+class SQLiteSignalBackend:
+    """Shares signal state between worker processes through a SQLite WAL file"""
+
+    def __init__(self, path: str = SIGNAL_DB_PATH, poll_interval: float = POLL_INTERVAL):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.hub: Optional[SignalHub] = None
+        self.last_event_id = 0
+        # One thread owns the connection, so no locking is needed around it
+        self._db_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='signal-db')
+        self._conn: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._poller: Optional[asyncio.Task] = None
+        self._poll_lock = asyncio.Lock()
+        self._counts_seen = 0.0
+        self._preemptions_seen = 0
+        self._controller_lock = None
+        # Newest event id at this worker's last prune
+        self._pruned_at = 0
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._db_thread, fn, *args)
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self.path, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS signal_state ("
+            "junction TEXT PRIMARY KEY, direction TEXT NOT NULL, updated_at REAL NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS signal_events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, junction TEXT NOT NULL, "
+            "direction TEXT NOT NULL, created_at REAL NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS junction_counts ("
+            "junction TEXT PRIMARY KEY, counts TEXT NOT NULL, updated_at REAL NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS signal_preemptions ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, junction TEXT NOT NULL, "
+            "record TEXT NOT NULL, until REAL NOT NULL)")
+
+    def _load(self, defaults: Dict[str, str]) -> Tuple[Dict[str, str], List[Tuple[int, str, str]]]:
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO signal_state (junction, direction, updated_at) VALUES (?, ?, ?)",
+            [(junction, direction, now) for junction, direction in defaults.items()])
+        state = dict(self._conn.execute("SELECT junction, direction FROM signal_state"))
+        # Recent events seed the hub's replay rings (a client may resume on any worker)
+        recent = self._conn.execute(
+            "SELECT id, junction, direction FROM signal_events ORDER BY id DESC LIMIT ?",
+            (REPLAY_EVENTS,)).fetchall()
+        return state, recent[::-1]
+
+    def _write(self, updates: List[Tuple[str, str]]):
+        now = time.time()
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany(
+                "INSERT INTO signal_state (junction, direction, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(junction) DO UPDATE SET direction = excluded.direction, "
+                "updated_at = excluded.updated_at",
+                [(junction, direction, now) for junction, direction in updates])
+            self._conn.executemany(
+                "INSERT INTO signal_events (junction, direction, created_at) VALUES (?, ?, ?)",
+                [(junction, direction, now) for junction, direction in updates])
+            last_id = self._conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            # Batches step over any fixed id, so prune by distance from the last prune
+            if last_id - self._pruned_at >= PRUNE_INTERVAL:
+                self._conn.execute("DELETE FROM signal_events WHERE id <= ?",
+                                   (last_id - EVENT_LOG_SIZE,))
+                self._pruned_at = last_id
+
+    def _save_counts(self, counts: Dict[str, Dict[str, int]]):
+        now = time.time()
+        self._conn.executemany(
+            "INSERT INTO junction_counts (junction, counts, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(junction) DO UPDATE SET counts = excluded.counts, "
+            "updated_at = excluded.updated_at",
+            [(junction, json.dumps(junction_counts), now)
+             for junction, junction_counts in counts.items()])
+
+    def _load_counts(self, since: float) -> List[Tuple[str, str, float]]:
+        return self._conn.execute(
+            "SELECT junction, counts, updated_at FROM junction_counts WHERE updated_at > ?",
+            (since,)).fetchall()
+
+    def _save_preemption(self, record: Dict):
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM signal_preemptions WHERE until <= ?", (time.time(),))
+            self._conn.execute(
+                "INSERT INTO signal_preemptions (junction, record, until) VALUES (?, ?, ?)",
+                (record["junction"], json.dumps(record), record["until"]))
+
+    def _load_preemptions(self, after_id: int) -> List[Tuple[int, str]]:
+        return self._conn.execute(
+            "SELECT id, record FROM signal_preemptions WHERE id > ? AND until > ? ORDER BY id",
+            (after_id, time.time())).fetchall()
+
+    def _read_new(self, after_id: int, force: bool = False) -> Optional[List[Tuple[int, str, str]]]:
+        # data_version only changes when *another* connection commits, so our
+        # own writes force a read
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version and not force:
+            return None
+        self._data_version = version
+        return self._conn.execute(
+            "SELECT id, junction, direction FROM signal_events WHERE id > ? ORDER BY id",
+            (after_id,)).fetchall()
+
+    async def start(self, hub: SignalHub, defaults: Dict[str, str]):
+        self.hub = hub
+        await self._run(self._connect)
+        state, recent = await self._run(self._load, defaults)
+        self._deliver(recent)
+        hub.status.update(state)
+        self._poller = asyncio.create_task(self._poll_loop())
+        logger.info(f"Signal state shared through {self.path}")
+
+    async def _poll_once(self, force: bool = False):
+        async with self._poll_lock:
+            rows = await self._run(self._read_new, self.last_event_id, force)
+            self._deliver(rows)
+
+    def _deliver(self, rows: Optional[List[Tuple[int, str, str]]]):
+        if rows:
+            self.hub.publish_many(((junction, direction) for _, junction, direction in rows),
+                                  [event_id for event_id, _, _ in rows])
+            self.last_event_id = rows[-1][0]
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                await self._poll_once()
+            except Exception as e:
+                logger.error(f"Error polling signal events: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def publish(self, junction: str, direction: str):
+        await self.publish_many([(junction, direction)])
+
+    async def publish_many(self, updates: Iterable[Tuple[str, str]]):
+        """Persist updates, then deliver them locally without waiting for the poller"""
+        await self._run(self._write, list(updates))
+        await self._poll_once(force=True)
+
+    def acquire_controller(self) -> bool:
+        """Try to become the worker that runs the signal controller (non-blocking)"""
+        if self._controller_lock is not None:
+            return True
+        lock = open(f"{self.path}.controller.lock", 'w')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return False
+        # Held until this process exits
+        self._controller_lock = lock
+        return True
+
+    async def save_counts(self, counts: Dict[str, Dict[str, int]]):
+        await self._run(self._save_counts, counts)
+
+    async def load_counts(self) -> Dict[str, Dict[str, int]]:
+        """Counts saved (by any worker) since the previous call"""
+        rows = await self._run(self._load_counts, self._counts_seen)
+        if rows:
+            self._counts_seen = max(updated_at for _, _, updated_at in rows)
+        return {junction: json.loads(counts) for junction, counts, _ in rows}
+
+    async def save_preemption(self, record: Dict):
+        await self._run(self._save_preemption, record)
+
+    async def load_preemptions(self) -> List[Dict]:
+        """Active preemption records saved (by any worker) since the previous call"""
+        rows = await self._run(self._load_preemptions, self._preemptions_seen)
+        if rows:
+            self._preemptions_seen = rows[-1][0]
+        return [json.loads(record) for _, record in rows]
+
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+        if self._conn is not None:
+            await self._run(self._conn.close)
+        self._db_thread.shutdown(wait=False)
+
+
+def create_signal_backend(kind: str = SIGNAL_BACKEND):
+    if kind == 'memory':
+        return MemorySignalBackend()
+    if kind == 'sqlite':
+        return SQLiteSignalBackend()
+    raise ValueError(f"Unknown signal backend: {kind}")
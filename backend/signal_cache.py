@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+In-process mirror of the API server's junction signal status.
+
+One background task keeps a single streaming connection to the API server's
+all-junctions SSE endpoint and applies every update to a local dict, so
+reading a junction's signal is a dictionary lookup instead of a new HTTP
+request. The task reconnects with exponential backoff (resuming with
+``Last-Event-ID``), and every read reports how stale the cache is.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MIN_BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30.0
+# The API server sends a keepalive every 30 s; no message for longer than
+# this means the connection is probably dead
+STALE_AFTER_SECONDS = 75.0
+
+
+class SignalStatusCache:
+    """Local copy of every junction's active direction, fed by one SSE connection"""
+
+    def __init__(self, url: str):
+        """
+        Args:
+            url: API server all-junctions stream (``.../junction_signal_status/all``)
+        """
+        self.url = url
+        self.status: Dict[str, str] = {}
+        self.changed_at: Dict[str, float] = {}
+        self.connected = False
+        self.last_message = 0.0
+        self.last_event_id: Optional[str] = None
+        self.reconnects = 0
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since anything (update or keepalive) was received"""
+        return time.time() - self.last_message if self.last_message else None
+
+    @property
+    def stale(self) -> bool:
+        age = self.age
+        return not self.connected or age is None or age > STALE_AFTER_SECONDS
+
+    def get(self, junction: str) -> Optional[str]:
+        return self.status.get(junction)
+
+    def _apply(self, data: Dict[str, Any]):
+        now = time.time()
+        if 'signals' in data:
+            # Snapshot (on connect and as keepalive)
+            for junction, direction in data['signals'].items():
+                if self.status.get(junction) != direction:
+                    self.changed_at[junction] = now
+            self.status.update(data['signals'])
+        elif 'junction' in data:
+            self.status[data['junction']] = data['active_signal']
+            self.changed_at[data['junction']] = now
+
+    async def _consume(self, session):
+        headers = {'Accept': 'text/event-stream'}
+        if self.last_event_id is not None:
+            headers['Last-Event-ID'] = self.last_event_id
+        async with session.get(self.url, headers=headers) as response:
+            response.raise_for_status()
+            self.connected = True
+            logger.info(f"📡 Signal cache connected to {self.url}")
+            event_id, data_lines = None, []
+            async for raw in response.content:
+                line = raw.decode('utf-8').rstrip('\r\n')
+                if line:
+                    if line.startswith('id:'):
+                        event_id = line[3:].strip()
+                    elif line.startswith('data:'):
+                        data_lines.append(line[5:].strip())
+                    continue
+                # Blank line: end of event
+                self.last_message = time.time()
+                if data_lines:
+                    self._apply(json.loads('\n'.join(data_lines)))
+                if event_id is not None:
+                    self.last_event_id = event_id
+                event_id, data_lines = None, []
+
+    async def _run(self):
+        import aiohttp
+
+        backoff = MIN_BACKOFF_SECONDS
+        # No total timeout: the stream is meant to stay open
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=5, sock_read=STALE_AFTER_SECONDS)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            while True:
+                try:
+                    await self._consume(session)
+                    self.last_error = "stream closed by server"
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.last_error = str(e) or type(e).__name__
+                if self.connected:
+                    # Was up: retry quickly
+                    backoff = MIN_BACKOFF_SECONDS
+                self.connected = False
+                self.reconnects += 1
+                delay = backoff * (0.5 + random.random())
+                logger.warning(f"Signal cache disconnected ({self.last_error}); "
+                               f"reconnecting in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                backoff = min(MAX_BACKOFF_SECONDS, backoff * 2)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "connected": self.connected,
+            "stale": self.stale,
+            "age_seconds": self.age,
+            "junctions": len(self.status),
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+            "last_event_id": self.last_event_id,
+        }
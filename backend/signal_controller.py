@@ -0,0 +1,304 @@
+"""
+Server-side adaptive signal timing.
+
+Each junction cycles north -> east -> south -> west. Green times come from the
+Webster-style split the admin dashboard used to compute in the browser: the
+cycle grows with the number of waiting vehicles and is shared out in
+proportion to each direction's count, with a minimum green per phase.
+
+All junctions live in NumPy arrays (one row per junction), so recomputing the
+splits and advancing the phase clock are a handful of vectorised operations
+per tick regardless of how many junctions there are. Phase changes are
+published as one batch through the signal backend, i.e. the same channel the
+manual ``POST /junction_signal_status`` uses.
+
+Every API worker keeps a controller, but only the elected leader ticks and
+publishes. The others follow published changes, so any worker can report
+the current timing.
+
+Emergency preemption (``preempt``) holds one direction green for a fixed time
+with priority over the cycle: published changes are ignored for a held
+junction, and when the hold ends the interrupted phase resumes with the green
+it had left. Holds are shared between workers as records through the backend
+(``load_preemptions``), so the leader honours a hold set on any worker.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PHASES = ['north', 'east', 'south', 'west']
+LOST_TIME = 16  # lost time per cycle (s)
+MIN_GREEN = 10  # minimum green per phase (s)
+MIN_CYCLE = 60
+DEFAULT_GREEN = 30  # green per phase when no vehicles are counted
+SECONDS_PER_VEHICLE = 2
+TICK_SECONDS = float(os.environ.get('SIGNAL_TICK_MS', '250')) / 1000.0
+# How often the leader reloads counts from the backend
+COUNTS_REFRESH_SECONDS = 1.0
+
+# (junction, direction) updates -> published
+PublishFn = Callable[[List[Tuple[str, str]]], Awaitable[None]]
+# () -> {junction: {direction: count}} changed since the last call
+LoadCountsFn = Callable[[], Awaitable[Dict[str, Dict[str, int]]]]
+# () -> whether this process may run the phase clock
+AcquireFn = Callable[[], bool]
+# () -> preemption records saved (by any worker) since the last call
+LoadPreemptionsFn = Callable[[], Awaitable[List[Dict]]]
+# Seconds between leadership attempts by followers
+LEADER_RETRY_SECONDS = 5.0
+
+
+def webster_green_times(counts: np.ndarray) -> np.ndarray:
+    """
+    Green seconds per phase for an (N, P) array of vehicle counts.
+
+    Cycle C = max(60, 1.5 L + 5 + 2 * vehicles); each phase gets its share of
+    C - L, at least MIN_GREEN. Junctions without vehicles get DEFAULT_GREEN.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    total = counts.sum(axis=1)
+    cycle = np.maximum(MIN_CYCLE, 1.5 * LOST_TIME + 5 + total * SECONDS_PER_VEHICLE)
+    share = np.divide(counts, total[:, None], out=np.zeros_like(counts), where=total[:, None] > 0)
+    # Round half up, as the dashboard's Math.round did
+    greens = np.maximum(MIN_GREEN, np.floor(share * (cycle - LOST_TIME)[:, None] + 0.5))
+    greens[total == 0] = DEFAULT_GREEN
+    return greens
+
+
+class SignalController:
+    """Phase clock and green splits for every controlled junction"""
+
+    def __init__(self, publish: PublishFn, load_counts: Optional[LoadCountsFn] = None,
+                 acquire: Optional[AcquireFn] = None,
+                 load_preemptions: Optional[LoadPreemptionsFn] = None, tick: float = TICK_SECONDS):
+        """
+        Args:
+            publish: Publishes a batch of (junction, direction) changes
+            load_counts: Returns per-direction counts updated since the last call
+            acquire: Leader election; always leader when None
+            load_preemptions: Returns preemption records saved since the last call
+            tick: Seconds between phase clock ticks
+        """
+        self.publish = publish
+        self.load_counts = load_counts
+        self.acquire = acquire
+        self.load_preemptions = load_preemptions
+        self.leader = acquire is None
+        self.tick_seconds = tick
+        self.junctions: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.counts = np.zeros((0, len(PHASES)))
+        self.greens = np.zeros((0, len(PHASES)))
+        self.phase = np.zeros(0, dtype=np.int8)
+        self.phase_end = np.zeros(0)
+        # Emergency holds: end time (0 = none) and the phase to resume afterwards
+        self.hold_until = np.zeros(0)
+        self.resume_phase = np.zeros(0, dtype=np.int8)
+        self.resume_remaining = np.zeros(0)
+        self.ticks = 0
+        self.preemptions = 0
+        self.changes = 0
+        self.last_tick_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def add_junctions(self, current: Dict[str, str], now: Optional[float] = None):
+        """Start controlling junctions, each from its current direction"""
+        new = [junction for junction in current if junction not in self.index]
+        if not new:
+            return
+        now = time.time() if now is None else now
+        phase = np.array([PHASES.index(current[j]) if current[j] in PHASES else 0 for j in new],
+                         dtype=np.int8)
+        greens = webster_green_times(np.zeros((len(new), len(PHASES))))
+        for junction in new:
+            self.index[junction] = len(self.junctions)
+            self.junctions.append(junction)
+        self.counts = np.vstack([self.counts, np.zeros((len(new), len(PHASES)))])
+        self.greens = np.vstack([self.greens, greens])
+        self.phase = np.concatenate([self.phase, phase])
+        self.phase_end = np.concatenate([self.phase_end, now + greens[np.arange(len(new)), phase]])
+        self.hold_until = np.concatenate([self.hold_until, np.zeros(len(new))])
+        self.resume_phase = np.concatenate([self.resume_phase, phase])
+        self.resume_remaining = np.concatenate([self.resume_remaining, np.zeros(len(new))])
+
+    def update_counts(self, counts: Dict[str, Dict[str, int]]):
+        """Set per-direction counts; new splits apply from each junction's next phase"""
+        known = [(self.index[junction], junction_counts) for junction, junction_counts
+                 in counts.items() if junction in self.index]
+        if not known:
+            return
+        rows = [row for row, _ in known]
+        values = np.array([[junction_counts.get(direction, 0) for direction in PHASES]
+                           for _, junction_counts in known], dtype=np.float64)
+        self.counts[rows] = values
+        self.greens[rows] = webster_green_times(values)
+
+    def set_phase(self, junction: str, direction: str, now: Optional[float] = None):
+        """
+        Follow a published change (manual override, or the leader's tick on a
+        follower): restart the junction's clock on ``direction``. Unknown
+        junctions (registered at runtime) start being controlled. Ignored
+        while the junction is held by a preemption.
+        """
+        row = self.index.get(junction)
+        if row is None:
+            self.add_junctions({junction: direction}, now)
+            return
+        if direction not in PHASES:
+            return
+        phase = PHASES.index(direction)
+        if phase == self.phase[row]:
+            return
+        now = time.time() if now is None else now
+        if self.hold_until[row] > now:
+            return
+        self.phase[row] = phase
+        self.phase_end[row] = now + self.greens[row, phase]
+
+    def preempt(self, junction: str, direction: str, hold: float,
+                now: Optional[float] = None) -> Dict:
+        """
+        Hold ``direction`` green for ``hold`` seconds, then resume the
+        interrupted phase. Extending an active hold keeps the original resume
+        point. Returns the record to share with the other workers.
+        """
+        now = time.time() if now is None else now
+        row = self.index.get(junction)
+        if row is None:
+            self.add_junctions({junction: direction}, now)
+            row = self.index[junction]
+        if self.hold_until[row] > now:
+            resume, remaining = int(self.resume_phase[row]), float(self.resume_remaining[row])
+        else:
+            resume, remaining = int(self.phase[row]), max(0.0, float(self.phase_end[row] - now))
+        record = {"junction": junction, "direction": direction, "until": now + hold,
+                  "resume": PHASES[resume], "resume_remaining": remaining}
+        self.apply_preemption(record, now)
+        return record
+
+    def apply_preemption(self, record: Dict, now: Optional[float] = None) -> bool:
+        """
+        Apply a preemption record (from this or another worker); expired ones
+        are ignored. Returns True if the junction's phase changed, i.e. the
+        held direction still has to be published from here.
+        """
+        now = time.time() if now is None else now
+        if record["until"] <= now or record["direction"] not in PHASES:
+            return False
+        row = self.index.get(record["junction"])
+        if row is None:
+            self.add_junctions({record["junction"]: record["direction"]}, now)
+            row = self.index[record["junction"]]
+        if self.hold_until[row] != record["until"]:
+            self.preemptions += 1
+        phase = PHASES.index(record["direction"])
+        changed = bool(self.phase[row] != phase)
+        self.phase[row] = phase
+        self.phase_end[row] = record["until"]
+        self.hold_until[row] = record["until"]
+        self.resume_phase[row] = PHASES.index(record["resume"]) if record["resume"] in PHASES else 0
+        self.resume_remaining[row] = record["resume_remaining"]
+        return changed
+
+    def tick(self, now: Optional[float] = None) -> List[Tuple[str, str]]:
+        """
+        Advance every junction whose green has run out; returns the changes.
+        Junctions coming out of a preemption resume the interrupted phase with
+        the green it had left (at least MIN_GREEN).
+        """
+        now = time.time() if now is None else now
+        expired = np.flatnonzero(self.phase_end <= now)
+        if expired.size == 0:
+            return []
+        held = self.hold_until[expired] > 0
+        phase = np.where(held, self.resume_phase[expired], (self.phase[expired] + 1) % len(PHASES))
+        green = np.where(held, np.maximum(self.resume_remaining[expired], MIN_GREEN),
+                         self.greens[expired, phase])
+        self.phase[expired] = phase
+        self.phase_end[expired] = now + green
+        self.hold_until[expired] = 0
+        return [(self.junctions[row], PHASES[p]) for row, p in zip(expired.tolist(), phase.tolist())]
+
+    def state(self, junction: str, now: Optional[float] = None) -> Optional[Dict]:
+        row = self.index.get(junction)
+        if row is None:
+            return None
+        now = time.time() if now is None else now
+        return {
+            "junction": junction,
+            "active_signal": PHASES[self.phase[row]],
+            "remaining": max(0.0, float(self.phase_end[row] - now)),
+            "preempted": bool(self.hold_until[row] > now),
+            "green_times": dict(zip(PHASES, self.greens[row].astype(int).tolist())),
+            "counts": dict(zip(PHASES, self.counts[row].astype(int).tolist())),
+        }
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        logger.info(f"🚦 Signal controller running for {len(self.junctions)} junctions")
+        next_refresh = 0.0
+        next_election = 0.0
+        while True:
+            try:
+                now = time.time()
+                if self.load_counts is not None and now >= next_refresh:
+                    self.update_counts(await self.load_counts())
+                    next_refresh = now + COUNTS_REFRESH_SECONDS
+                # Holds that found the junction on another phase (the leader ticked
+                # it away before loading the record) are published again
+                held = []
+                if self.load_preemptions is not None:
+                    for record in await self.load_preemptions():
+                        if self.apply_preemption(record, now):
+                            held.append((record["junction"], record["direction"]))
+                if not self.leader:
+                    if now >= next_election:
+                        self.leader = self.acquire()
+                        next_election = now + LEADER_RETRY_SECONDS
+                        if self.leader:
+                            logger.info("🚦 This worker now runs the signal phase clock")
+                    if not self.leader:
+                        await asyncio.sleep(self.tick_seconds)
+                        continue
+                started = time.perf_counter()
+                changes = held + self.tick(now)
+                self.last_tick_ms = (time.perf_counter() - started) * 1000
+                self.ticks += 1
+                if changes:
+                    self.changes += len(changes)
+                    await self.publish(changes)
+            except Exception as e:
+                logger.error(f"Error in signal controller tick: {e}")
+            await asyncio.sleep(self.tick_seconds)
+
+    def stats(self) -> Dict:
+        return {
+            "junctions": len(self.junctions),
+            "running": self._task is not None and not self._task.done(),
+            "leader": self.leader,
+            "tick_seconds": self.tick_seconds,
+            "ticks": self.ticks,
+            "phase_changes": self.changes,
+            "preemptions": self.preemptions,
+            "held": int(np.count_nonzero(self.hold_until > time.time())),
+            "last_tick_ms": self.last_tick_ms,
+        }
@@ -0,0 +1,216 @@
+"""
+Asyncio pub/sub hub for junction signal status.
+
+All state lives on the event loop, so publishing needs no locks: an update
+serialises its SSE payload once and drops it into every subscriber's bounded
+buffer without blocking. A subscriber that falls behind loses its oldest
+buffered updates (the newest state always gets through), and a disconnected
+client's generator unsubscribes itself when Starlette cancels it.
+
+Every update carries a monotonically increasing SSE event id, and the last
+``HISTORY_SIZE`` formatted events of each junction are kept in a ring buffer.
+A reconnecting ``EventSource`` sends ``Last-Event-ID`` and gets the events it
+missed replayed from the ring; if the ring no longer reaches back that far it
+gets the current state instead.
+
+Subscribing to ``ALL_JUNCTIONS`` yields every junction's updates on one
+stream (``{"junction", "active_signal"}`` events, starting from a
+``{"signals": {...}}`` snapshot) for server-side consumers that mirror the
+whole state.
+"""
+
+import asyncio
+import json
+import itertools
+from collections import defaultdict, deque
+from typing import AsyncIterator, Callable, Deque, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+DEFAULT_DIRECTION = 'north'
+SUBSCRIBER_BUFFER = 8
+KEEPALIVE_SECONDS = 30
+# Recent events kept per junction for Last-Event-ID replay
+HISTORY_SIZE = 64
+# Pseudo-junction for a stream of every junction's updates
+ALL_JUNCTIONS = '*'
+ALL_HISTORY_SIZE = 1024
+
+# (event id, formatted SSE event)
+Event = Tuple[int, str]
+
+
+class SignalSubscriber:
+    """One SSE client with a bounded buffer of pending events"""
+
+    __slots__ = ('junction', 'queue', 'dropped')
+
+    def __init__(self, junction: str, buffer_size: int = SUBSCRIBER_BUFFER):
+        self.junction = junction
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def offer(self, event: Event):
+        if self.queue.full():
+            # Keep the newest state; drop the oldest pending event
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class SignalHub:
+    """Current signal per junction plus one broadcast set per junction"""
+
+    def __init__(self, buffer_size: int = SUBSCRIBER_BUFFER,
+                 keepalive: float = KEEPALIVE_SECONDS, history_size: int = HISTORY_SIZE):
+        self.buffer_size = buffer_size
+        self.keepalive = keepalive
+        self.history_size = history_size
+        self.status: Dict[str, str] = {}
+        self.subscribers: Dict[str, Set[SignalSubscriber]] = defaultdict(set)
+        self.history: Dict[str, Deque[Event]] = {}
+        # Id of the newest event each junction's ring has already dropped
+        self.evicted: Dict[str, int] = {}
+        self.last_id = 0
+        # Called with (junction, direction) for every update, e.g. by the controller
+        self.listeners: List[Callable[[str, str], None]] = []
+        self._ids = itertools.count(1)
+
+    @staticmethod
+    def format_event(direction: str, event_id: Optional[int] = None) -> str:
+        data = f"data: {json.dumps({'active_signal': direction})}\n\n"
+        return f"id: {event_id}\n{data}" if event_id is not None else data
+
+    @staticmethod
+    def format_all_event(junction: str, direction: str, event_id: Optional[int] = None) -> str:
+        data = f"data: {json.dumps({'junction': junction, 'active_signal': direction})}\n\n"
+        return f"id: {event_id}\n{data}" if event_id is not None else data
+
+    def _record(self, junction: str, event: Event):
+        ring = self.history.get(junction)
+        if ring is None:
+            size = ALL_HISTORY_SIZE if junction == ALL_JUNCTIONS else self.history_size
+            ring = self.history[junction] = deque(maxlen=size)
+        elif len(ring) == ring.maxlen:
+            self.evicted[junction] = ring[0][0]
+        ring.append(event)
+
+    def replay(self, junction: str, last_event_id: int) -> Optional[Sequence[Event]]:
+        """Events newer than ``last_event_id``, or None if some were already evicted"""
+        if last_event_id < self.evicted.get(junction, 0):
+            return None
+        return [event for event in self.history.get(junction, ()) if event[0] > last_event_id]
+
+    def get(self, junction: str) -> str:
+        return self.status.get(junction, DEFAULT_DIRECTION)
+
+    def subscribe(self, junction: str) -> SignalSubscriber:
+        # A whole-state mirror must not lose updates to a large batch
+        buffer_size = ALL_HISTORY_SIZE if junction == ALL_JUNCTIONS else self.buffer_size
+        subscriber = SignalSubscriber(junction, buffer_size)
+        self.subscribers[junction].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: SignalSubscriber):
+        junction_subscribers = self.subscribers.get(subscriber.junction)
+        if junction_subscribers is not None:
+            junction_subscribers.discard(subscriber)
+            if not junction_subscribers:
+                del self.subscribers[subscriber.junction]
+
+    def publish(self, junction: str, direction: str) -> int:
+        """Set a junction's active direction and notify its subscribers"""
+        return self.publish_many([(junction, direction)])
+
+    def publish_many(self, updates: Iterable[Tuple[str, str]],
+                     event_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        Apply a batch of updates, then make one broadcast pass: each affected
+        junction's subscribers get only its final direction. Returns the
+        number of subscribers notified.
+
+        ``event_ids`` supplies ids assigned by a shared backend so they agree
+        across workers; otherwise the hub numbers events itself.
+        """
+        ids = iter(event_ids) if event_ids is not None else self._ids
+        latest: Dict[str, Event] = {}
+        latest_all: Dict[str, Event] = {}
+        for junction, direction in updates:
+            event_id = next(ids)
+            self.last_id = max(self.last_id, event_id)
+            event = (event_id, self.format_event(direction, event_id))
+            self.status[junction] = direction
+            self._record(junction, event)
+            all_event = (event_id, self.format_all_event(junction, direction, event_id))
+            self._record(ALL_JUNCTIONS, all_event)
+            latest[junction] = event
+            latest_all[junction] = all_event
+            for listener in self.listeners:
+                listener(junction, direction)
+
+        notified = 0
+        for junction, event in latest.items():
+            subscribers = self.subscribers.get(junction)
+            if not subscribers:
+                continue
+            for subscriber in subscribers:
+                subscriber.offer(event)
+            notified += len(subscribers)
+
+        all_subscribers = self.subscribers.get(ALL_JUNCTIONS)
+        if all_subscribers:
+            for subscriber in all_subscribers:
+                for event in latest_all.values():
+                    subscriber.offer(event)
+            notified += len(all_subscribers)
+        return notified
+
+    def _snapshot(self, junction: str) -> Event:
+        if junction == ALL_JUNCTIONS:
+            data = f"data: {json.dumps({'signals': self.status})}\n\n"
+            return self.last_id, f"id: {self.last_id}\n{data}" if self.last_id else data
+        ring = self.history.get(junction)
+        event_id = ring[-1][0] if ring else None
+        return event_id or 0, self.format_event(self.get(junction), event_id)
+
+    async def stream(self, subscriber: SignalSubscriber,
+                     last_event_id: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        SSE body: current status (or the events missed since ``last_event_id``),
+        then every update, with periodic keepalives.
+        """
+        junction = subscriber.junction
+        if last_event_id is not None and last_event_id > self.last_id:
+            # Id from before a restart: it says nothing about what was missed
+            last_event_id = None
+        try:
+            missed = self.replay(junction, last_event_id) if last_event_id is not None else None
+            backlog = missed if missed is not None else [self._snapshot(junction)]
+            sent = last_event_id or 0
+            for event_id, event in backlog:
+                sent = max(sent, event_id)
+                yield event
+            while True:
+                try:
+                    event_id, event = await asyncio.wait_for(subscriber.queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    # Send keepalive (no id, so the client's Last-Event-ID is kept)
+                    if junction == ALL_JUNCTIONS:
+                        yield f"data: {json.dumps({'signals': self.status})}\n\n"
+                    else:
+                        yield self.format_event(self.get(junction))
+                    continue
+                if event_id <= sent:
+                    # Already replayed from the ring
+                    continue
+                sent = event_id
+                yield event
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            junction: {
+                "subscribers": len(subscribers),
+                "dropped": sum(subscriber.dropped for subscriber in subscribers),
+            }
+            for junction, subscribers in self.subscribers.items()
+        }
@@ -0,0 +1,160 @@
+"""
+Emergency preemption: an approved emergency request turns its junction green.
+
+``SignalPreemption.preempt`` holds the requested direction green through the
+same backend/hub path as ``POST /junction_signal_status``, with priority over
+the adaptive controller, and restores the interrupted phase afterwards:
+
+- with the controller enabled the hold lives in the controller (shared with
+  the other workers through the backend) and the leader's tick restores it;
+- without it, a timer on this worker publishes the previous direction.
+
+Approve-to-green latency (approval request received -> green published to
+this worker's subscribers) is recorded in a histogram.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from signal_hub import SignalHub
+
+logger = logging.getLogger(__name__)
+
+PREEMPTION_HOLD_SECONDS = float(os.environ.get('PREEMPTION_HOLD_SECONDS', '30'))
+# Histogram bucket upper bounds (ms)
+LATENCY_BUCKETS_MS: Tuple[float, ...] = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (cumulative counts, Prometheus style)"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot: above the largest bucket
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        for i, bound in enumerate(self.buckets):
+            if ms <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile"""
+        if self.count == 0:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.max_ms
+
+    def stats(self) -> Dict:
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets.append({"le": bound, "count": cumulative})
+        buckets.append({"le": "+Inf", "count": self.count})
+        return {
+            "count": self.count,
+            "mean_ms": self.sum_ms / self.count if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": self.max_ms,
+            "buckets": buckets,
+        }
+
+
+class SignalPreemption:
+    """Turns junctions green for emergency vehicles and restores them afterwards"""
+
+    def __init__(self, backend, hub: SignalHub, controller=None,
+                 hold: float = PREEMPTION_HOLD_SECONDS):
+        """
+        Args:
+            backend: Signal backend (publish/save_preemption)
+            hub: This worker's signal hub (current directions)
+            controller: Adaptive controller that owns holds; None to restore by timer
+            hold: Seconds the emergency direction stays green
+        """
+        self.backend = backend
+        self.hub = hub
+        self.controller = controller
+        self.hold = hold
+        self.approve_to_green = LatencyHistogram()
+        self.publish_latency = LatencyHistogram()
+        self.preemptions = 0
+        # Used without a controller: junction -> (restore timer, direction to restore)
+        self._restores: Dict[str, Tuple[asyncio.TimerHandle, str]] = {}
+
+    async def preempt(self, junction: str, direction: str,
+                      started: Optional[float] = None) -> Dict:
+        """
+        Hold ``direction`` green at ``junction``.
+
+        Args:
+            started: ``time.perf_counter()`` when the approval arrived
+        """
+        publish_started = time.perf_counter()
+        if self.controller is not None:
+            record = self.controller.preempt(junction, direction, self.hold)
+            # Shared before the green goes out, so the leader cannot tick the
+            # junction away without knowing it is held
+            await self.backend.save_preemption(record)
+        else:
+            record = self._schedule_restore(junction, direction)
+        await self.backend.publish(junction, direction)
+        done = time.perf_counter()
+        self.publish_latency.observe((done - publish_started) * 1000)
+        self.approve_to_green.observe((done - (started or publish_started)) * 1000)
+        self.preemptions += 1
+        logger.info(f"🚑 Preempted {junction} -> {direction} for {self.hold:.0f}s")
+        return record
+
+    def _schedule_restore(self, junction: str, direction: str) -> Dict:
+        previous = self._restores.pop(junction, None)
+        if previous is not None:
+            # Extend the hold, keeping the original direction to restore
+            previous[0].cancel()
+            resume = previous[1]
+        else:
+            resume = self.hub.get(junction)
+        timer = asyncio.get_running_loop().call_later(
+            self.hold, lambda: asyncio.create_task(self._restore(junction, resume)))
+        self._restores[junction] = (timer, resume)
+        return {"junction": junction, "direction": direction, "until": time.time() + self.hold,
+                "resume": resume, "resume_remaining": 0.0}
+
+    async def _restore(self, junction: str, direction: str):
+        self._restores.pop(junction, None)
+        try:
+            await self.backend.publish(junction, direction)
+        except Exception as e:
+            logger.error(f"Error restoring {junction} after preemption: {e}")
+
+    def stop(self):
+        for timer, _ in self._restores.values():
+            timer.cancel()
+        self._restores.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "preemptions": self.preemptions,
+            "hold_seconds": self.hold,
+            "restore": "controller" if self.controller is not None else "timer",
+            "approve_to_green": self.approve_to_green.stats(),
+            "signal_publish": self.publish_latency.stats(),
+        }
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Decode an uploaded video while it is still arriving.
+
+``stream_frames`` turns the request body (an async iterator of byte chunks)
+into decoded BGR frames as soon as the decoder can produce them:
+
+- ffmpeg pipe (when ``ffmpeg`` is on PATH and the container can be decoded
+  front to back): chunks are written to ffmpeg's stdin and raw frames read
+  from its stdout (yuv4mpeg), so nothing touches the disk. MP4s qualify when
+  their ``moov`` index precedes ``mdat`` ("faststart"); other containers are
+  handed to ffmpeg directly.
+- growing file (fallback): chunks are appended to a temp file that OpenCV
+  reopens as it grows, resuming at the next frame. The last frame decoded
+  before the current end of file is held back until more data arrives, as it
+  may be truncated. An MP4 with its index at the end cannot be decoded until
+  the index arrives, so such uploads still decode only once complete.
+
+``count_stream`` runs detection on the frames in batches, several batches in
+flight on the executor, and yields the counts in frame order.
+
+Responses that stream while the request body is still being read must use
+``DuplexStreamingResponse``, with the body read through ``track_body``.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import deque
+from typing import AsyncIterator, List, Optional
+
+import cv2
+import numpy as np
+from starlette.responses import StreamingResponse
+
+from inference_executor import InferenceExecutor, count_vehicles_in_worker
+
+logger = logging.getLogger(__name__)
+
+FFMPEG = shutil.which('ffmpeg')
+STREAM_INGEST_BATCH = int(os.environ.get('STREAM_INGEST_BATCH', '8'))
+# Bytes buffered while looking for the MP4 moov/mdat order
+SNIFF_LIMIT = 1 << 20
+# Growing-file mode: reopen the capture after this many new bytes
+REOPEN_BYTES = 1 << 20
+REOPEN_WAIT_SECONDS = 0.5
+DECODED_BUFFER = 32
+
+
+async def track_body(chunks: AsyncIterator[bytes], read: asyncio.Event) -> AsyncIterator[bytes]:
+    """Pass the request body through, setting ``read`` once it has been consumed"""
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        read.set()
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that leaves ``receive`` to the body reader until the
+    request body has been read.
+
+    On older ASGI servers Starlette's disconnect listener consumes
+    ``http.request`` messages concurrently with the body, which would steal
+    chunks from a handler still reading ``request.stream()``; here the
+    listener waits for ``body_read`` first. A disconnect during the
+    upload surfaces as ``ClientDisconnect`` from the body reader; once
+    ``body_read`` is set (see ``track_body``) the response listens itself and
+    cancels the stream, so counting stops with the client either way.
+    """
+
+    def __init__(self, content, body_read: asyncio.Event, *args, **kwargs):
+        super().__init__(content, *args, **kwargs)
+        self.body_read = body_read
+
+    async def listen_for_disconnect(self, receive):
+        await self.body_read.wait()
+        await super().listen_for_disconnect(receive)
+
+
+def mp4_streamable(head: bytes) -> Optional[bool]:
+    """
+    Whether a container can be decoded from a pipe, judged from its first bytes.
+
+    Returns True for non-MP4 data and MP4s whose ``moov`` box comes before
+    ``mdat``, False when ``mdat`` comes first, None if more bytes are needed.
+    """
+    if len(head) < 8:
+        return None
+    if head[4:8] != b'ftyp':
+        return True
+    offset = 0
+    while offset + 8 <= len(head):
+        size = int.from_bytes(head[offset:offset + 4], 'big')
+        kind = head[offset + 4:offset + 8]
+        if kind == b'moov':
+            return True
+        if kind == b'mdat':
+            return False
+        if size == 1:
+            if offset + 16 > len(head):
+                return None
+            size = int.from_bytes(head[offset + 8:offset + 16], 'big')
+        if size < 8:
+            return False
+        offset += size
+    return None
+
+
+async def _ffmpeg_frames(head: bytes, chunks: AsyncIterator[bytes]) -> AsyncIterator[np.ndarray]:
+    proc = await asyncio.create_subprocess_exec(
+        FFMPEG, '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0',
+        # I420 needs even dimensions
+        '-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2', '-f', 'yuv4mpegpipe', '-pix_fmt', 'yuv420p',
+        'pipe:1',
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE)
+
+    async def feed():
+        try:
+            proc.stdin.write(head)
+            async for chunk in chunks:
+                proc.stdin.write(chunk)
+                await proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            proc.stdin.close()
+
+    feeder = asyncio.create_task(feed())
+    errors = asyncio.create_task(proc.stderr.read())
+    try:
+        header = (await proc.stdout.readline()).split()
+        if not header or header[0] != b'YUV4MPEG2':
+            await feeder
+            raise ValueError(f"ffmpeg could not decode the upload: "
+                             f"{(await errors).decode(errors='replace').strip()}")
+        params = {field[:1]: field[1:] for field in header[1:]}
+        width, height = int(params[b'W']), int(params[b'H'])
+        frame_size = width * height * 3 // 2
+        while True:
+            line = await proc.stdout.readline()
+            if not line.startswith(b'FRAME'):
+                break
+            data = await proc.stdout.readexactly(frame_size)
+            yuv = np.frombuffer(data, np.uint8).reshape(height * 3 // 2, width)
+            yield cv2.cvtColor(yuv, cv2.COLOR_YUV2BGR_I420)
+        await feeder
+    finally:
+        feeder.cancel()
+        if proc.returncode is None:
+            proc.kill()
+        await proc.wait()
+        errors.cancel()
+
+
+def _decode_growing_file(path: str, grown: threading.Event, complete: threading.Event,
+                         emit, stopped: threading.Event):
+    """Decoder thread: read frames from a file that is still being written"""
+    next_frame = 0
+    while not stopped.is_set():
+        # Cleared before reading so growth during this pass wakes the next wait
+        grown.clear()
+        finished = complete.is_set()
+        cap = cv2.VideoCapture(path)
+        if cap.isOpened():
+            if next_frame:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, next_frame)
+            held = None
+            while not stopped.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if held is not None:
+                    emit(held)
+                    next_frame += 1
+                held = frame
+            if held is not None and finished:
+                emit(held)
+                next_frame += 1
+        cap.release()
+        if finished:
+            return
+        grown.wait(REOPEN_WAIT_SECONDS)
+
+
+async def _growing_file_frames(head: bytes, chunks: AsyncIterator[bytes]) -> AsyncIterator[np.ndarray]:
+    loop = asyncio.get_running_loop()
+    frames: asyncio.Queue = asyncio.Queue(maxsize=DECODED_BUFFER)
+    grown, complete, stopped = threading.Event(), threading.Event(), threading.Event()
+    done = object()
+
+    def emit(frame):
+        # Blocks the decoder thread while the consumer is behind
+        asyncio.run_coroutine_threadsafe(frames.put(frame), loop).result()
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp_video:
+        path = temp_video.name
+
+    async def receive():
+        unannounced = 0
+        with open(path, 'ab', buffering=0) as out:
+            out.write(head)
+            async for chunk in chunks:
+                out.write(chunk)
+                unannounced += len(chunk)
+                if unannounced >= REOPEN_BYTES:
+                    unannounced = 0
+                    grown.set()
+        complete.set()
+        grown.set()
+
+    def decode():
+        try:
+            _decode_growing_file(path, grown, complete, emit, stopped)
+        finally:
+            asyncio.run_coroutine_threadsafe(frames.put(done), loop)
+
+    receiver = asyncio.create_task(receive())
+    decoder = loop.run_in_executor(None, decode)
+    try:
+        while True:
+            frame = await frames.get()
+            if frame is done:
+                break
+            yield frame
+        await receiver
+    finally:
+        stopped.set()
+        grown.set()
+        receiver.cancel()
+        # Unblock a decoder waiting on a full queue, then let it exit
+        while not frames.empty():
+            frames.get_nowait()
+        await asyncio.wait([decoder], timeout=5)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+async def stream_frames(chunks: AsyncIterator[bytes]) -> AsyncIterator[np.ndarray]:
+    """Decoded frames of an upload, produced while its bytes are still arriving"""
+    chunks = chunks.__aiter__()
+    head = b''
+    streamable = None
+    while streamable is None and len(head) < SNIFF_LIMIT:
+        try:
+            head += await chunks.__anext__()
+        except StopAsyncIteration:
+            break
+        streamable = mp4_streamable(head)
+    if FFMPEG and streamable:
+        logger.info("Streaming ingest via ffmpeg pipe")
+        source = _ffmpeg_frames(head, chunks)
+    else:
+        logger.info("Streaming ingest via growing temp file")
+        source = _growing_file_frames(head, chunks)
+    async for frame in source:
+        yield frame
+
+
+async def count_stream(frames: AsyncIterator[np.ndarray], executor: InferenceExecutor,
+                       batch_size: int = STREAM_INGEST_BATCH,
+                       max_in_flight: Optional[int] = None) -> AsyncIterator[List[int]]:
+    """Vehicle counts for each batch of frames, in order, with batches run concurrently"""
+    max_in_flight = max_in_flight or executor.max_workers
+    in_flight: deque = deque()
+    batch: List[np.ndarray] = []
+    try:
+        async for frame in frames:
+            batch.append(frame)
+            if len(batch) == batch_size:
+                in_flight.append(asyncio.ensure_future(executor.run(count_vehicles_in_worker, batch)))
+                batch = []
+            while in_flight and (len(in_flight) >= max_in_flight or in_flight[0].done()):
+                yield await in_flight.popleft()
+        if batch:
+            in_flight.append(asyncio.ensure_future(executor.run(count_vehicles_in_worker, batch)))
+        while in_flight:
+            yield await in_flight.popleft()
+    finally:
+        for future in in_flight:
+            future.cancel()
@@ -0,0 +1,49 @@
+import numpy as np
+
+from detection_batch import DetectionBatch
+
+
+def legacy_dicts(data):
+    """The per-box loop DetectionBatch replaced (vehicle classes above 0.5)"""
+    detections = []
+    for x1, y1, x2, y2, confidence, class_id in data:
+        confidence, class_id = float(np.float32(confidence)), int(class_id)
+        if class_id in [2, 3, 5, 7] and confidence > 0.5:
+            x1, y1, x2, y2 = np.float32([x1, y1, x2, y2])
+            detections.append({'bbox': [float(x1), float(y1), float(x2 - x1), float(y2 - y1)],
+                               'confidence': confidence, 'class_id': class_id})
+    return detections
+
+
+def random_boxes(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    corners = rng.uniform(0, 1900, (n, 2))
+    sizes = rng.uniform(5, 120, (n, 2))
+    return np.column_stack([corners, corners + sizes, rng.uniform(0, 1, n),
+                            rng.choice([0, 1, 2, 3, 5, 7, 9], n)]).astype(np.float32)
+
+
+def test_batch_matches_the_dict_path():
+    data = random_boxes()
+    batch = DetectionBatch.from_array(data)
+    assert batch.to_dicts() == legacy_dicts(data)
+    assert set(batch.cls.tolist()) <= {2, 3, 5, 7}
+    assert (batch.conf > 0.5).all()
+
+
+def test_centres_match_the_dict_path():
+    batch = DetectionBatch.from_array(random_boxes(seed=1))
+    expected = [(int(x + w / 2), int(y + h / 2)) for x, y, w, h in
+                (d['bbox'] for d in batch.to_dicts())]
+    assert [tuple(c) for c in batch.centers().tolist()] == expected
+
+
+def test_dicts_round_trip():
+    batch = DetectionBatch.from_array(random_boxes(seed=2), classes=None, min_confidence=0.0)
+    again = DetectionBatch.from_dicts(batch.to_dicts())
+    np.testing.assert_allclose(again.xyxy, batch.xyxy, atol=1e-3)
+    np.testing.assert_array_equal(again.conf, batch.conf)
+    np.testing.assert_array_equal(again.cls, batch.cls)
+    assert DetectionBatch.coerce(batch) is batch
+    assert len(DetectionBatch.coerce([])) == 0
+    assert len(batch[batch.cls == 2]) == int(np.count_nonzero(batch.cls == 2))
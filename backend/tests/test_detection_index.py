@@ -0,0 +1,83 @@
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from detection_batch import ClusterResult, DetectionBatch
+from detection_index import DetectionIndex, read_meta, write_index
+from vehicle_count_stream import replay_vehicle_counter
+
+ZONES = ['north', 'east']
+
+
+def frame_detections(frame):
+    n = frame % 3
+    return DetectionBatch(np.full((n, 4), frame), np.full(n, 0.8), np.full(n, 2))
+
+
+def build(tmp_path, frames=6, fps=25.0, clustered=True):
+    detections = [frame_detections(frame) for frame in range(frames)]
+    clusters = None
+    if clustered:
+        clusters = []
+        for frame, batch in enumerate(detections):
+            assignments = (np.arange(len(batch)) % 2).astype(np.int8)
+            counts = {zone: int(np.count_nonzero(assignments == i)) for i, zone in enumerate(ZONES)}
+            clusters.append(ClusterResult('01_', batch, assignments, list(ZONES), counts, frame))
+    directory = str(tmp_path / 'drone' / '01_')
+    write_index(directory, detections, clusters, {"fps": fps, "model": "yolov8n.pt"})
+    return DetectionIndex(directory), detections, clusters
+
+
+def test_index_round_trips_detections_and_clusters(tmp_path):
+    index, detections, clusters = build(tmp_path)
+    assert index.frames == 6 and index.fps == 25.0
+    assert index.totals.tolist() == [len(batch) for batch in detections]
+    for frame, batch in enumerate(detections):
+        np.testing.assert_array_equal(index.detections(frame).xyxy, batch.xyxy)
+        result = index.cluster('01_', frame, 1.5)
+        np.testing.assert_array_equal(result.assignments, clusters[frame].assignments)
+        assert result.counts == clusters[frame].counts
+        assert result.directions == ZONES
+
+
+def test_replay_wraps_around_the_recording(tmp_path):
+    index, detections, _ = build(tmp_path)
+    assert index.total(6 + 2) == len(detections[2])
+    assert index.counts(6 * 3 + 1) == index.counts(1)
+    assert index.position(2.0) == 50
+
+
+def test_unclustered_index_has_no_direction_counts(tmp_path):
+    index, _, _ = build(tmp_path, clustered=False)
+    assert index.counts(2) == {}
+    assert index.cluster('x', 2, 0.0).assignments.tolist() == [-1, -1]
+
+
+def test_rebuilding_replaces_the_index(tmp_path):
+    build(tmp_path, frames=6)
+    index, _, _ = build(tmp_path, frames=4)
+    assert index.frames == 4
+    assert read_meta(index.directory)["frames"] == 4
+
+
+def test_replay_stream_follows_the_wall_clock(tmp_path):
+    index, detections, _ = build(tmp_path, frames=6, fps=50.0)
+
+    async def take(n):
+        stream = replay_vehicle_counter(index)
+        events = [await stream.__anext__() for _ in range(n)]
+        await stream.aclose()
+        return events
+
+    started = time.time()
+    events = [json.loads(event[len("data: "):]) for event in asyncio.run(take(8))]
+    elapsed = time.time() - started
+    first = index.position(started)
+    frames = [event['frame'] for event in events]
+    # Starts on the wall clock's frame and moves on every event, wrapping around
+    assert frames[0] == first % 6
+    assert all(frame != previous for previous, frame in zip(frames, frames[1:]))
+    assert [event['vehicles'] for event in events] == [len(detections[f]) for f in frames]
+    assert elapsed >= 6 / 50.0
@@ -0,0 +1,69 @@
+import hashlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import detection_jobs
+from detection_jobs import DetectionJobQueue, plan_segments
+from result_cache import ResultCache
+
+BODY = b"recorded junction video bytes"
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    queue = DetectionJobQueue(cache=ResultCache(str(tmp_path / 'results')))
+    monkeypatch.setattr(detection_jobs, 'job_queue', queue)
+    app = FastAPI()
+    app.include_router(detection_jobs.router)
+    content_hash = hashlib.sha256(BODY).hexdigest()
+    queue.cache.put(queue.cache_key(content_hash), [1, 2, 3], len(BODY))
+    return TestClient(app), content_hash
+
+
+def test_stream_cache_hit_is_served_once_the_body_matches(client):
+    client, content_hash = client
+    response = client.post('/detect_vehicles_video/stream', content=BODY,
+                           headers={'X-Content-SHA256': content_hash.upper()})
+    assert response.status_code == 200
+    assert response.headers['x-cache'] == 'hit'
+    assert response.text.count('data: ') == 3
+    job = detection_jobs.job_queue.jobs[response.headers['x-job-id']]
+    assert job.cached and job.source_bytes == len(BODY)
+
+
+def test_stream_cache_hit_rejects_a_body_with_other_content(client):
+    client, content_hash = client
+    response = client.post('/detect_vehicles_video/stream', content=b"some other video",
+                           headers={'X-Content-SHA256': content_hash})
+    assert response.status_code == 400
+    assert 'x-cache' not in response.headers
+
+
+def test_plan_segments_cover_the_video_in_order():
+    segments = plan_segments(1000, 4, 0)
+    assert len(segments) == 16
+    # The last range is open ended: container frame counts are estimates
+    assert segments[0][0] == 0 and segments[-1][1] is None
+    assert all(stop == start for (_, stop), (start, _) in zip(segments, segments[1:]))
+    assert plan_segments(0, 4, 0) == [(0, None)]
+
+
+def test_upload_waits_for_the_counts_unless_asked_not_to(client, monkeypatch):
+    client, _ = client
+
+    async def fake_segment(self, job, index):
+        return index, [2, 0, 1]
+
+    monkeypatch.setattr(DetectionJobQueue, '_run_segment', fake_segment)
+    response = client.post('/detect_vehicles_video/', files={'file': ('a.mp4', b'first video')})
+    assert response.status_code == 200
+    assert response.json() == {"vehicle_counts": [{"frame": 0, "vehicles": 2},
+                                                  {"frame": 1, "vehicles": 0},
+                                                  {"frame": 2, "vehicles": 1}]}
+
+    response = client.post('/detect_vehicles_video/?wait=false',
+                           files={'file': ('b.mp4', b'second video')})
+    assert response.status_code == 202
+    assert response.json()['status_url'].endswith(response.json()['job_id'])
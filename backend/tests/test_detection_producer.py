@@ -0,0 +1,90 @@
+import asyncio
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+from detection_producer import JunctionProducer
+from mjpeg_broadcast import MJPEGFeed, MJPEGViewer
+
+
+class InlineExecutor:
+    async def run(self, fn, *args):
+        return fn(*args)
+
+
+def make_video(tmp_path, frames=10):
+    path = str(tmp_path / 'junction.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 25.0, (32, 32))
+    for frame in range(frames):
+        writer.write(np.full((32, 32, 3), frame * 20, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def make_producer(capture):
+    processed = []
+
+    async def process_frame(frame, frame_index, video_frame):
+        processed.append(video_frame)
+        return SimpleNamespace(counts={'north': video_frame}, frame_index=frame_index,
+                               timestamp=float(frame_index))
+
+    producer = JunctionProducer('junction_01', capture, process_frame, lambda frame, _: frame,
+                                InlineExecutor(), MJPEGFeed('junction_01'), frame_interval=0.2)
+    return producer, processed
+
+
+def test_idle_sampling_follows_the_recording_and_wraps(tmp_path):
+    capture = cv2.VideoCapture(make_video(tmp_path))
+    producer, processed = make_producer(capture)
+
+    async def run():
+        for _ in range(3):
+            await producer.sample(1.0)
+
+    try:
+        asyncio.run(run())
+    finally:
+        capture.release()
+    # One frame per second of video (5 frames at 0.2 s), wrapping after frame 9
+    assert processed == [4, 9, 4]
+    assert producer.latest['cluster'].counts == {'north': 4}
+    assert len(producer.history) == 3
+
+
+def test_sampling_is_skipped_while_the_producer_runs(tmp_path):
+    capture = cv2.VideoCapture(make_video(tmp_path))
+    producer, processed = make_producer(capture)
+
+    async def run():
+        queue = producer.subscribe()
+        await asyncio.wait_for(queue.get(), 2)
+        sampled = await producer.sample(1.0)
+        producer.unsubscribe(queue)
+        await producer.stop()
+        return sampled
+
+    try:
+        assert asyncio.run(run()) is None
+    finally:
+        capture.release()
+    assert processed[0] == 0
+
+
+def test_unreadable_video_ends_subscriber_streams(tmp_path):
+    capture = cv2.VideoCapture(str(tmp_path / 'missing.avi'))
+    producer, processed = make_producer(capture)
+
+    async def run():
+        viewer = MJPEGViewer()
+        producer.mjpeg_feed.add_viewer(viewer)
+        queue = producer.subscribe()
+        packet = await asyncio.wait_for(queue.get(), 2)
+        chunk = await asyncio.wait_for(viewer.next(), 2)
+        return packet, chunk
+
+    assert asyncio.run(run()) == (None, None)
+    assert processed == []
+    assert producer.subscriber_count == 0
+    assert producer.mjpeg_feed.viewer_count == 0
@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+
+from detection_batch import DetectionBatch
+from frame_detection_cache import FrameDetectionCache
+
+
+def batch(n):
+    return DetectionBatch(np.arange(n * 4).reshape(n, 4), np.full(n, 0.9), np.full(n, 2))
+
+
+def make_video(tmp_path):
+    video = tmp_path / 'junction.mp4'
+    video.write_bytes(b'not really a video')
+    return str(video)
+
+
+def test_detections_round_trip_and_survive_reopening(tmp_path):
+    video = make_video(tmp_path)
+    cache = FrameDetectionCache(video, 5, 'yolov8n.pt', 0.5)
+    cache.put(0, batch(3))
+    cache.put(2, DetectionBatch.empty())
+    cache.put(0, batch(1))  # already cached: ignored
+    assert cache.get(1) is None
+
+    reopened = FrameDetectionCache(video, 5, 'yolov8n.pt', 0.5)
+    assert reopened.directory == cache.directory
+    np.testing.assert_array_equal(reopened.get(0).xyxy, batch(3).xyxy)
+    assert len(reopened.get(2)) == 0
+    assert reopened.counts().tolist() == [3, -1, 0, -1, -1]
+    assert not reopened.complete
+
+
+def test_each_key_has_its_own_directory(tmp_path):
+    video = make_video(tmp_path)
+    caches = [FrameDetectionCache(video, 5, 'yolov8n.pt', 0.5),
+              FrameDetectionCache(video, 5, 'yolov8s.pt', 0.5),
+              FrameDetectionCache(video, 5, 'yolov8n.pt', 0.0),
+              FrameDetectionCache(video, 5, 'yolov8n.pt', 0.5, np.array([2]))]
+    assert len({cache.directory for cache in caches}) == len(caches)
+    for n, cache in enumerate(caches, 1):
+        cache.put(0, batch(n))
+    # Opening one key never discards another key's detections
+    reopened = [FrameDetectionCache(video, 5, 'yolov8n.pt', 0.5),
+                FrameDetectionCache(video, 5, 'yolov8s.pt', 0.5),
+                FrameDetectionCache(video, 5, 'yolov8n.pt', 0.0),
+                FrameDetectionCache(video, 5, 'yolov8n.pt', 0.5, np.array([2]))]
+    assert [len(cache.get(0)) for cache in reopened] == [1, 2, 3, 4]
+
+
+def test_replaced_video_gets_a_fresh_cache(tmp_path):
+    video = make_video(tmp_path)
+    cache = FrameDetectionCache(video, 5, 'yolov8n.pt', 0.5)
+    cache.put(0, batch(2))
+    stat = os.stat(video)
+    os.utime(video, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    replaced = FrameDetectionCache(video, 5, 'yolov8n.pt', 0.5)
+    assert replaced.directory != cache.directory
+    assert replaced.get(0) is None
@@ -0,0 +1,80 @@
+import numpy as np
+
+from detection_batch import DetectionBatch
+from hexagonal_clustering import HexagonalCluster
+
+ZONES = {
+    'north': [[700, 100], [1200, 100], [1100, 450], [800, 450]],
+    'east': [[1250, 300], [1700, 350], [1650, 750], [1150, 600]],
+    'west': [[200, 350], [750, 300], [800, 650], [250, 750]],
+    'south': [[800, 650], [1150, 650], [1300, 1000], [650, 1000]],
+}
+
+
+def shapely_zone(clusterer, x, y):
+    """The lookup the LUT replaced: containing zone, else the nearest one"""
+    polygons = clusterer.polygons['01_']
+    for direction, polygon in polygons.items():
+        if clusterer.point_in_polygon((x, y), polygon):
+            return direction
+    return clusterer.find_closest_polygon((x, y), polygons)
+
+
+def make_clusterer():
+    clusterer = HexagonalCluster()
+    clusterer.set_manual_points('01_', ZONES)
+    return clusterer
+
+
+def test_zone_lut_matches_the_shapely_lookup():
+    clusterer = make_clusterer()
+    lut = clusterer.get_zone_lut('01_')
+    directions = list(ZONES)
+    rng = np.random.default_rng(0)
+    xs = rng.integers(0, lut.shape[1], 3000)
+    ys = rng.integers(0, lut.shape[0], 3000)
+    # Zone corners lie on edges, where containment is decided exactly
+    corners = np.concatenate([np.array(points) for points in ZONES.values()])
+    xs, ys = np.concatenate([xs, corners[:, 0]]), np.concatenate([ys, corners[:, 1]])
+    expected = [shapely_zone(clusterer, x, y) for x, y in zip(xs.tolist(), ys.tolist())]
+    actual = [directions[zone] for zone in lut[ys, xs].tolist()]
+    assert actual == expected
+
+def test_centres_outside_the_lut_are_classified_directly():
+    clusterer = make_clusterer()
+    lut = clusterer.get_zone_lut('01_')
+    # Boxes centred at (950, 300) (north) and beyond the raster's right edge (east)
+    detections = [{'bbox': [940, 290, 20, 20]}, {'bbox': [lut.shape[1] + 90, 490, 20, 20]}]
+    result = clusterer.cluster(detections, '01_')
+    assert [result.directions[zone] for zone in result.assignments.tolist()] == ['north', 'east']
+    assert result.counts == {'north': 1, 'east': 1, 'west': 0, 'south': 0}
+
+
+def legacy_cluster(clusterer, detections):
+    """The per-dict shapely clustering ClusterResult replaced"""
+    clustered = {'north': [], 'east': [], 'west': [], 'south': []}
+    for detection in detections:
+        x, y, w, h = detection['bbox']
+        clustered[shapely_zone(clusterer, int(x + w / 2), int(y + h / 2))].append(detection)
+    return clustered
+
+
+def test_cluster_result_matches_the_dict_path():
+    clusterer = make_clusterer()
+    rng = np.random.default_rng(1)
+    boxes = [[*rng.uniform((0, 0), (1900, 1070)), 20, 16] for _ in range(300)]
+    detections = [{'bbox': bbox, 'confidence': 0.9, 'class_id': 2} for bbox in boxes]
+    batch = DetectionBatch.from_dicts(detections)
+
+    expected = legacy_cluster(clusterer, batch.to_dicts())
+    result = clusterer.cluster(batch, '01_', frame_index=7, timestamp=1.5)
+    assert {d: result.in_direction(d).to_dicts() for d in expected} == expected
+    assert result.counts == {d: len(found) for d, found in expected.items()}
+    assert clusterer.cluster_detections(detections, '01_') == expected
+    assert (result.frame_index, result.timestamp, len(result)) == (7, 1.5, len(boxes))
+
+
+def test_unknown_junction_clusters_nothing():
+    result = make_clusterer().cluster([{'bbox': [0, 0, 5, 5]}], 'missing')
+    assert result.assignments.tolist() == [-1]
+    assert result.counts == {'north': 0, 'east': 0, 'west': 0, 'south': 0}
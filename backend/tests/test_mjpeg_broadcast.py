@@ -0,0 +1,69 @@
+import asyncio
+
+import cv2
+import numpy as np
+
+from mjpeg_broadcast import MJPEGFeed, MJPEGHub, MJPEGViewer, PacedVideoPublisher
+
+
+class GatedExecutor:
+    """Runs calls inline, holding capture releases until the gate opens"""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.releasing = asyncio.Event()
+
+    async def run(self, fn, *args):
+        if getattr(fn, '__name__', '') == 'release':
+            self.releasing.set()
+            await self.gate.wait()
+        return fn(*args)
+
+
+def make_video(tmp_path):
+    path = str(tmp_path / 'feed.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 25.0, (32, 32))
+    for frame in range(5):
+        writer.write(np.full((32, 32, 3), frame * 40, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def test_viewer_joining_during_release_restarts_the_publisher(tmp_path):
+    video = make_video(tmp_path)
+
+    async def run():
+        executor = GatedExecutor()
+        feed = MJPEGFeed('feed')
+        publisher = PacedVideoPublisher(feed, video, fps=50, executor=executor)
+        first = MJPEGViewer()
+        feed.add_viewer(first)
+        publisher.start()
+        await asyncio.wait_for(first.next(), 2)
+        feed.remove_viewer(first)
+        await asyncio.wait_for(executor.releasing.wait(), 2)
+
+        # The last viewer left and the capture is being released
+        second = MJPEGViewer()
+        feed.add_viewer(second)
+        publisher.start()
+        executor.gate.set()
+        chunk = await asyncio.wait_for(second.next(), 2)
+        feed.remove_viewer(second)
+        return chunk
+
+    assert b'\xff\xd8' in asyncio.run(run())
+
+
+async def collect(body):
+    return [chunk async for chunk in body]
+
+
+def test_unreadable_video_ends_viewer_streams(tmp_path):
+    async def run():
+        hub = MJPEGHub()
+        body = hub.stream_video_file(str(tmp_path / 'missing.avi'), fps=25)
+        chunks = await asyncio.wait_for(collect(body), 2)
+        return chunks, hub.viewer_count
+
+    assert asyncio.run(run()) == ([], 0)
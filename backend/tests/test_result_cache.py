@@ -0,0 +1,62 @@
+import asyncio
+import hashlib
+import io
+import os
+
+from result_cache import HashingStream, ResultCache, copy_and_hash, model_identity
+
+PARAMS = {"min_confidence": 0.0, "classes": [2, 3, 5, 7]}
+
+
+def test_key_covers_content_model_and_parameters():
+    key = ResultCache.key('abc', 'yolov8n.pt:1234', PARAMS)
+    assert key == ResultCache.key('abc', 'yolov8n.pt:1234', dict(reversed(PARAMS.items())))
+    assert len({key,
+                ResultCache.key('abd', 'yolov8n.pt:1234', PARAMS),
+                ResultCache.key('abc', 'yolov8n.pt:5678', PARAMS),
+                ResultCache.key('abc', 'yolov8n.pt:1234', {**PARAMS, "min_confidence": 0.5})}) == 4
+
+
+def test_model_identity_hashes_the_weights(tmp_path):
+    first, second = tmp_path / 'a' / 'yolov8n.pt', tmp_path / 'b' / 'yolov8n.pt'
+    for path, weights in ((first, b'weights one'), (second, b'weights two')):
+        path.parent.mkdir()
+        path.write_bytes(weights)
+    assert model_identity(str(first)) != model_identity(str(second))
+    assert model_identity(str(first)).startswith('yolov8n.pt:')
+    assert model_identity(str(tmp_path / 'missing.pt')) == 'missing.pt'
+
+
+def test_upload_hashes_match_the_content():
+    data = os.urandom(3 << 20)
+    digest, size = copy_and_hash(io.BytesIO(data), io.BytesIO())
+    assert (digest, size) == (hashlib.sha256(data).hexdigest(), len(data))
+
+    async def stream():
+        for start in range(0, len(data), 1000):
+            yield data[start:start + 1000]
+
+    async def consume():
+        upload = HashingStream(stream())
+        chunks = [chunk async for chunk in upload]
+        return upload, b"".join(chunks)
+
+    upload, body = asyncio.run(consume())
+    assert body == data and upload.complete
+    assert (upload.hexdigest(), upload.size) == (digest, size)
+
+
+def test_entries_are_shared_and_evicted_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=10_000)
+    cache.put('a', [1, 2], 100)
+    cache.put('b', [3], 200)
+    entry_bytes = cache.size_bytes // 2
+    # Another worker sees entries written by this one
+    assert ResultCache(str(tmp_path)).get('a') == [1, 2]
+    assert cache.get('a') == [1, 2] and cache.get('missing') is None
+
+    small = ResultCache(str(tmp_path), max_bytes=entry_bytes * 2)
+    assert small.get('b') == [3]  # now the most recently used
+    small.put('c', [4], 300)
+    assert small.get('a') is None and small.get('b') == [3] and small.get('c') == [4]
+    assert small.stats()["evictions"] == 1 and small.stats()["bytes_saved"] == 200 + 200 + 300
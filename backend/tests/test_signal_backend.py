@@ -0,0 +1,71 @@
+import asyncio
+
+import signal_backend
+from signal_backend import SQLiteSignalBackend
+from signal_hub import SignalHub
+
+
+def event_ids(backend):
+    return [row[0] for row in backend._conn.execute("SELECT id FROM signal_events ORDER BY id")]
+
+
+def test_batches_are_pruned_to_the_log_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(signal_backend, 'EVENT_LOG_SIZE', 20)
+    monkeypatch.setattr(signal_backend, 'PRUNE_INTERVAL', 10)
+    backend = SQLiteSignalBackend(str(tmp_path / 'signals.db'))
+    backend._connect()
+    # Batches of 7 never land on a multiple of the prune interval
+    for batch in range(30):
+        backend._write([(f'{junction:02d}_', 'east') for junction in range(7)])
+    ids = event_ids(backend)
+    assert ids[-1] == 210
+    assert len(ids) < 20 + 10 + 7
+    assert ids[0] > 210 - 20 - 10 - 7
+    backend._conn.close()
+
+
+def test_event_ids_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / 'signals.db')
+
+    async def run():
+        first_hub, second_hub = SignalHub(), SignalHub()
+        first, second = SQLiteSignalBackend(path, 0.01), SQLiteSignalBackend(path, 0.01)
+        await first.start(first_hub, {'01_': 'north'})
+        await second.start(second_hub, {'01_': 'north'})
+        subscriber = second_hub.subscribe('01_')
+        await first.publish_many([('01_', 'east'), ('02_', 'west')])
+        await first.publish('01_', 'south')
+        await asyncio.sleep(0.1)
+        received = []
+        while not subscriber.queue.empty():
+            received.append(subscriber.queue.get_nowait()[0])
+        await first.stop()
+        await second.stop()
+        return first_hub, second_hub, received
+
+    first_hub, second_hub, received = asyncio.run(run())
+    assert first_hub.last_id == second_hub.last_id == 3
+    assert second_hub.status == {'01_': 'south', '02_': 'west'}
+    # Ids come from the shared log, so Last-Event-ID means the same on every worker
+    assert received and received[-1] == 3
+    assert [event_id for event_id, _ in second_hub.replay('01_', 0)] == [1, 3]
+
+
+def test_new_worker_seeds_replay_rings_from_the_log(tmp_path):
+    path = str(tmp_path / 'signals.db')
+
+    async def run():
+        writer = SQLiteSignalBackend(path)
+        await writer.start(SignalHub(), {})
+        for direction in ('east', 'south', 'west'):
+            await writer.publish('01_', direction)
+        await writer.stop()
+        hub = SignalHub()
+        reader = SQLiteSignalBackend(path)
+        await reader.start(hub, {})
+        await reader.stop()
+        return hub
+
+    hub = asyncio.run(run())
+    assert [event_id for event_id, _ in hub.replay('01_', 1)] == [2, 3]
+    assert hub.get('01_') == 'west'
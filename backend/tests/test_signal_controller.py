@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import numpy as np
+
+from signal_controller import DEFAULT_GREEN, MIN_GREEN, SignalController, webster_green_times
+from signal_preemption import SignalPreemption
+from signal_hub import SignalHub
+
+
+async def no_publish(changes):
+    pass
+
+
+def test_webster_green_times():
+    greens = webster_green_times(np.array([[0, 0, 0, 0], [10, 10, 0, 0], [50, 0, 0, 0], [1, 1, 1, 1]]))
+    assert greens[0].tolist() == [DEFAULT_GREEN] * 4
+    # Cycle max(60, 1.5 * 16 + 5 + 2 * 20) = 69; 53 s of green shared, halves round up
+    assert greens[1].tolist() == [27, 27, MIN_GREEN, MIN_GREEN]
+    assert greens[2].tolist() == [113, MIN_GREEN, MIN_GREEN, MIN_GREEN]
+    # Short cycles are stretched to the minimum of 60
+    assert greens[3].tolist() == [11, 11, 11, 11]
+
+
+def test_new_counts_apply_from_the_next_phase():
+    controller = SignalController(no_publish)
+    controller.add_junctions({'01_': 'north'}, now=0)
+    controller.update_counts({'01_': {'north': 10, 'east': 10}, 'unknown': {'north': 5}})
+    assert controller.state('01_', now=0)["green_times"] == {
+        'north': 27, 'east': 27, 'south': MIN_GREEN, 'west': MIN_GREEN}
+    assert controller.tick(now=DEFAULT_GREEN - 1) == []
+    assert controller.tick(now=DEFAULT_GREEN) == [('01_', 'east')]
+    assert controller.state('01_', now=DEFAULT_GREEN)["remaining"] == 27
+
+
+def test_preempt_holds_direction_then_resumes_interrupted_phase():
+    controller = SignalController(no_publish)
+    controller.add_junctions({'01_': 'east'}, now=0)
+    record = controller.preempt('01_', 'north', hold=30, now=5)
+    assert record["resume"] == 'east' and record["resume_remaining"] == 25
+    # Published changes are ignored while held
+    controller.set_phase('01_', 'south', now=10)
+    assert controller.state('01_', now=10)["active_signal"] == 'north'
+    assert controller.tick(now=20) == []
+    assert controller.tick(now=35) == [('01_', 'east')]
+    assert controller.state('01_', now=35)["remaining"] == 25
+
+
+def test_apply_preemption_reports_whether_phase_changed():
+    controller = SignalController(no_publish)
+    controller.add_junctions({'01_': 'east', '02_': 'north'}, now=0)
+    now = time.time()
+    assert controller.apply_preemption({"junction": '01_', "direction": 'north', "until": now + 30,
+                                        "resume": 'east', "resume_remaining": 5.0}, now)
+    assert not controller.apply_preemption({"junction": '02_', "direction": 'north', "until": now + 30,
+                                            "resume": 'north', "resume_remaining": 5.0}, now)
+    # Expired records are ignored
+    assert not controller.apply_preemption({"junction": '02_', "direction": 'west', "until": now - 1,
+                                            "resume": 'north', "resume_remaining": 5.0}, now)
+
+
+def test_leader_republishes_hold_loaded_after_ticking_away():
+    published = []
+    records = []
+
+    async def publish(changes):
+        published.extend(changes)
+
+    async def load_preemptions():
+        loaded, records[:] = list(records), []
+        return loaded
+
+    async def run():
+        controller = SignalController(publish, load_preemptions=load_preemptions, tick=0.01)
+        # The emergency worker published north, but the leader has since ticked to east
+        controller.add_junctions({'01_': 'east'})
+        records.append({"junction": '01_', "direction": 'north', "until": time.time() + 30,
+                        "resume": 'east', "resume_remaining": 10.0})
+        controller.start()
+        await asyncio.sleep(0.05)
+        await controller.stop()
+        return controller.state('01_')
+
+    state = asyncio.run(run())
+    assert published == [('01_', 'north')]
+    assert state["active_signal"] == 'north' and state["preempted"]
+
+
+class RecordingBackend:
+    def __init__(self):
+        self.calls = []
+
+    async def save_preemption(self, record):
+        self.calls.append(('save', record["direction"]))
+
+    async def publish(self, junction, direction):
+        self.calls.append(('publish', direction))
+
+
+def test_preemption_record_is_saved_before_green_is_published():
+    backend = RecordingBackend()
+    controller = SignalController(no_publish)
+    controller.add_junctions({'01_': 'east'})
+    preemption = SignalPreemption(backend, SignalHub(), controller, hold=30)
+    asyncio.run(preemption.preempt('01_', 'north'))
+    assert backend.calls == [('save', 'north'), ('publish', 'north')]
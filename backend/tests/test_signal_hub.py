@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+from bench_signal_latency import event_direction
+from signal_hub import ALL_JUNCTIONS, SignalHub
+
+
+def parse(text):
+    """(id or None, data dict) of one formatted SSE event"""
+    event_id, data = None, None
+    for line in text.splitlines():
+        if line.startswith("id: "):
+            event_id = int(line[len("id: "):])
+        elif line.startswith("data: "):
+            data = json.loads(line[len("data: "):])
+    return event_id, data
+
+
+def drain(subscriber):
+    events = []
+    while not subscriber.queue.empty():
+        events.append(subscriber.queue.get_nowait())
+    return events
+
+
+def test_queue_items_are_id_and_formatted_event():
+    hub = SignalHub()
+    subscriber = hub.subscribe('01_')
+    hub.publish('01_', 'east')
+    event_id = hub.last_id
+    (queued_id, text), = drain(subscriber)
+    assert queued_id == event_id
+    assert parse(text) == (event_id, {"active_signal": "east"})
+    # The latency benchmark consumes the same queue items
+    assert event_direction((queued_id, text)) == 'east'
+
+
+def test_batch_sends_each_junction_its_final_direction():
+    hub = SignalHub()
+    first, everything = hub.subscribe('01_'), hub.subscribe(ALL_JUNCTIONS)
+    hub.publish_many([('01_', 'east'), ('02_', 'west'), ('01_', 'south')])
+    assert [parse(text)[1] for _, text in drain(first)] == [{"active_signal": "south"}]
+    assert sorted(parse(text)[1]["junction"] for _, text in drain(everything)) == ['01_', '02_']
+    assert hub.get('01_') == 'south' and hub.get('03_') == 'north'
+
+
+def test_slow_subscriber_keeps_newest_events():
+    hub = SignalHub(buffer_size=2)
+    subscriber = hub.subscribe('01_')
+    for direction in ('north', 'east', 'south'):
+        hub.publish('01_', direction)
+    assert [event_direction(event) for event in drain(subscriber)] == ['east', 'south']
+    assert subscriber.dropped == 1
+
+
+def test_replay_returns_missed_events_or_none_once_evicted():
+    hub = SignalHub(history_size=3)
+    for direction in ('north', 'east', 'south', 'west'):
+        hub.publish('01_', direction)
+    assert [event_id for event_id, _ in hub.replay('01_', 2)] == [3, 4]
+    assert hub.replay('01_', 4) == []
+    # Event 1 was evicted from the ring: a client that last saw it cannot be caught up
+    assert hub.replay('01_', 0) is None
+
+
+async def first_events(hub, junction, count, last_event_id=None):
+    stream = hub.stream(hub.subscribe(junction), last_event_id)
+    try:
+        return [parse(await stream.__anext__()) for _ in range(count)]
+    finally:
+        await stream.aclose()
+
+
+def test_stream_resumes_from_last_event_id():
+    hub = SignalHub()
+    for direction in ('north', 'east', 'south'):
+        hub.publish('01_', direction)
+    events = asyncio.run(first_events(hub, '01_', 2, last_event_id=1))
+    assert events == [(2, {"active_signal": "east"}), (3, {"active_signal": "south"})]
+
+
+def test_stream_without_or_with_unknown_id_starts_from_snapshot():
+    hub = SignalHub()
+    hub.publish('01_', 'east')
+    assert asyncio.run(first_events(hub, '01_', 1)) == [(1, {"active_signal": "east"})]
+    # An id from before a restart is ignored rather than trusted
+    assert asyncio.run(first_events(hub, '01_', 1, last_event_id=99)) == [(1, {"active_signal": "east"})]
+
+
+def test_stream_skips_queued_events_already_replayed():
+    async def run():
+        hub = SignalHub()
+        hub.publish('01_', 'east')
+        subscriber = hub.subscribe('01_')
+        hub.publish('01_', 'south')  # queued and also in the ring
+        stream = hub.stream(subscriber, last_event_id=1)
+        replayed = parse(await stream.__anext__())
+        hub.publish('01_', 'west')
+        live = parse(await stream.__anext__())
+        await stream.aclose()
+        return replayed, live
+    assert asyncio.run(run()) == ((2, {"active_signal": "south"}), (3, {"active_signal": "west"}))
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from starlette.requests import ClientDisconnect, Request
+
+from streaming_ingest import DuplexStreamingResponse, mp4_streamable, track_body
+
+
+def scope(spec_version):
+    return {"type": "http", "method": "POST", "path": "/", "headers": [],
+            "asgi": {"version": "3.0", "spec_version": spec_version}}
+
+
+def test_stream_is_cancelled_when_the_client_leaves_after_the_upload():
+    messages = [{"type": "http.request", "body": b"abc", "more_body": True},
+                {"type": "http.request", "body": b"def", "more_body": False}]
+    received, sent, stopped = [], [], []
+
+    async def run():
+        left = asyncio.Event()
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await left.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        async def events(body):
+            async for chunk in body:
+                received.append(chunk)
+            try:
+                while True:
+                    yield "data: {}\n\n"
+                    await asyncio.sleep(0.01)
+                    if len(sent) > 3:
+                        left.set()
+            finally:
+                stopped.append(True)
+
+        request = Request(scope("2.0"), receive)
+        body_read = asyncio.Event()
+        response = DuplexStreamingResponse(events(track_body(request.stream(), body_read)),
+                                           body_read, media_type="text/event-stream")
+        await asyncio.wait_for(response(scope("2.0"), receive, send), 2)
+
+    asyncio.run(run())
+    assert b"".join(received) == b"abcdef"
+    assert stopped == [True]
+
+
+def test_send_errors_become_client_disconnects():
+    async def run():
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            raise OSError("connection reset")
+
+        async def events():
+            yield "data: {}\n\n"
+
+        response = DuplexStreamingResponse(events(), asyncio.Event())
+        await response(scope("2.4"), receive, send)
+
+    with pytest.raises(ClientDisconnect):
+        asyncio.run(run())
+
+
+def test_mp4_streamable():
+    assert mp4_streamable(b"\x1aE\xdf\xa3" + b"\0" * 8) is True
+    moov_first = (16).to_bytes(4, 'big') + b"ftypisom" + b"\0" * 4 + (8).to_bytes(4, 'big') + b"moov"
+    mdat_first = (16).to_bytes(4, 'big') + b"ftypisom" + b"\0" * 4 + (8).to_bytes(4, 'big') + b"mdat"
+    assert mp4_streamable(moov_first) is True
+    assert mp4_streamable(mdat_first) is False
+    assert mp4_streamable(b"\0\0\0\x20ftypisom") is None
@@ -0,0 +1,72 @@
+import json
+import time
+
+import cv2
+import numpy as np
+
+from vehicle_count_stream import frame_vehicle_counter
+
+FPS = 50.0
+FRAMES = 10
+
+
+class FakeTensor:
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class FakeBoxes:
+    def __init__(self, data):
+        self.data = FakeTensor(data)
+
+    def __len__(self):
+        return len(self.data.array)
+
+
+class FakeResult:
+    def __init__(self, vehicles):
+        self.boxes = FakeBoxes(np.array([[0, 0, 10, 10, 0.9, 2]] * vehicles, dtype=np.float32))
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, frame):
+        self.calls += 1
+        return [FakeResult(self.calls % 3)]
+
+
+def make_video(tmp_path):
+    path = str(tmp_path / 'junction.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), FPS, (32, 32))
+    for frame in range(FRAMES):
+        writer.write(np.full((32, 32, 3), frame * 20, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def counts(events):
+    return [json.loads(event[len("data: "):])['vehicles'] for event in events]
+
+
+def test_counts_come_from_the_cache_after_one_pass_and_are_paced(tmp_path):
+    video = make_video(tmp_path)
+    model = FakeModel()
+    live = list(frame_vehicle_counter(video, model, 'yolov8n.pt'))
+    assert model.calls == FRAMES
+    assert counts(live) == [n % 3 for n in range(1, FRAMES + 1)]
+
+    started = time.monotonic()
+    cached = list(frame_vehicle_counter(video, model, 'yolov8n.pt'))
+    elapsed = time.monotonic() - started
+    assert model.calls == FRAMES
+    assert cached == live
+    # A complete cache plays back at the video's frame rate, not in one burst
+    assert elapsed >= (FRAMES - 1) / FPS * 0.9
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+SSE vehicle counts per frame of a joined junction video.
+
+Shared by ``backend.py`` and ``video_server.py`` (``/junction_vehicle_count``).
+Frames are detected live until the per-frame detection cache (see
+``frame_detection_cache``) holds the whole video; from then on counts are read
+from the cache without decoding. Either way events are paced at the video's
+frame rate, so a cached video plays back in real time instead of arriving in
+one burst.
+
+In replay mode (``DETECTION_REPLAY=1``) counts come from the video's
+precomputed detection index instead (``replay_vehicle_counter``).
+"""
+
+import asyncio
+import os
+import time
+from typing import Optional
+
+import cv2
+
+from detection_batch import DetectionBatch
+from detection_index import DetectionIndex, index_path, load_index
+from frame_detection_cache import open_frame_cache
+
+
+def count_event(frame_idx: int, count: int) -> str:
+    return f"data: {{\"frame\": {frame_idx}, \"vehicles\": {count}}}\n\n"
+
+
+def wait_for_frame(started: float, frame_idx: int, fps: float):
+    """Sleep until ``frame_idx`` is due; frames that are already late go out at once"""
+    delay = started + frame_idx / fps - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def frame_vehicle_counter(video_path: str, model, model_path: str):
+    """
+    Yield one SSE count event per frame of ``video_path``.
+
+    Runs in Starlette's threadpool (a sync iterator), so pacing with
+    ``time.sleep`` does not block the event loop.
+    """
+    cache = open_frame_cache(video_path, model_path, min_confidence=0.0)
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    started = time.monotonic()
+    if cache is not None and cache.complete:
+        cap.release()
+        for frame_idx, count in enumerate(cache.counts().tolist()):
+            wait_for_frame(started, frame_idx, fps)
+            yield count_event(frame_idx, count)
+        return
+    frame_idx = 0
+    try:
+        while True:
+            detections = cache.get(frame_idx) if cache is not None else None
+            if detections is not None:
+                # Cached: advance without converting the frame
+                if not cap.grab():
+                    break
+            else:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                results_list = model(frame)
+                detections = DetectionBatch.from_result(results_list[0], min_confidence=0.0)
+                if cache is not None:
+                    cache.put(frame_idx, detections)
+            wait_for_frame(started, frame_idx, fps)
+            yield count_event(frame_idx, len(detections))
+            frame_idx += 1
+    finally:
+        cap.release()
+
+
+def find_index(junction: str, direction: str) -> Optional[DetectionIndex]:
+    """Detection index of a joined junction video (either naming), if precomputed"""
+    for name in (f"{junction}_{direction}", f"{junction}__{direction}"):
+        if os.path.isdir(index_path('joined', name)):
+            return load_index('joined', name)
+    return None
+
+
+async def replay_vehicle_counter(index: DetectionIndex):
+    """
+    Yield one SSE count event per frame of a detection index, following the
+    wall clock (``DetectionIndex.position``) so every viewer and worker shows
+    the same frame. Loops with the recording until the client disconnects.
+
+    An async generator: replay streams hold no threadpool thread, so one
+    server can feed many dashboards.
+    """
+    while True:
+        frame = index.position(time.time())
+        yield count_event(frame % index.frames, index.total(frame))
+        await asyncio.sleep(max(0.0, (frame + 1) / index.fps - time.time()))
@@ -1,17 +1,25 @@
 # video_server.py - Dedicated video processing server
 import os
 import uvicorn
-from fastapi import FastAPI, File, UploadFile, Query
+from fastapi import FastAPI, Query
 from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import cv2
-import shutil
 from ultralytics import YOLO
-import tempfile
 import numpy as np
 import time
+from typing import Optional
+
+from detection_index import DETECTION_REPLAY
+from detection_jobs import router as detection_jobs_router
+from inference_executor import InferenceExecutor
+from mjpeg_broadcast import MJPEG_MEDIA_TYPE, MJPEGHub, ViewerLimitError
+from vehicle_count_stream import find_index, frame_vehicle_counter, replay_vehicle_counter
+
+STREAM_IO_WORKERS = int(os.environ.get('STREAM_IO_WORKERS', '4'))
 
 app = FastAPI()
+app.include_router(detection_jobs_router)
 
 # Allow frontend access
 app.add_middleware(
@@ -22,95 +30,62 @@ app.add_middleware(
 )
 
 # Load YOLOv8n model (pretrained on COCO)
-model = YOLO('yolov8n.pt')
-
-@app.post("/detect_vehicles_video/")
-async def detect_vehicles_video(file: UploadFile = File(...)):
-    # Save uploaded video to a temp file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp_video:
-        shutil.copyfileobj(file.file, temp_video)
-        temp_video_path = temp_video.name
+MODEL_PATH = 'yolov8n.pt'
+# Replay mode (DETECTION_REPLAY=1) serves counts from precompute_detections.py indexes
+model = None if DETECTION_REPLAY else YOLO(MODEL_PATH)
 
-    cap = cv2.VideoCapture(temp_video_path)
-    frame_results = []
-    frame_idx = 0
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        # Run detection
-        results_list = model(frame)
-        count = 0
-        for det in results_list[0].boxes.cls:
-            if int(det) in [2, 3, 5, 7]:
-                count += 1
-        frame_results.append({"frame": frame_idx, "vehicles": count})
-        frame_idx += 1
-    cap.release()
-    os.remove(temp_video_path)
-    return JSONResponse(content={"vehicle_counts": frame_results})
+# MJPEG feeds: each video is decoded and encoded once on a bounded executor
+# and shared by all of its viewers (10 FPS unless the viewer asks for ?fps=)
+stream_executor = InferenceExecutor('thread', STREAM_IO_WORKERS)
+mjpeg_hub = MJPEGHub(stream_executor)
 
-# Helper: MJPEG video stream generator
-def generate_video_stream(video_path):
-    cap = cv2.VideoCapture(video_path)
-    frame_delay = 0.1  # 0.1s per frame = 10 FPS (adjust as needed)
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Loop: restart video
-            continue
-        ret, buffer = cv2.imencode('.jpg', frame)
-        if not ret:
-            continue
-        frame_bytes = buffer.tobytes()
-        yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        time.sleep(frame_delay)
-    cap.release()
-
-# Helper: SSE vehicle count per frame
-def frame_vehicle_counter(video_path, model):
-    cap = cv2.VideoCapture(video_path)
-    frame_idx = 0
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        results_list = model(frame)
-        count = 0
-        for det in results_list[0].boxes.cls:
-            if int(det) in [2, 3, 5, 7]:
-                count += 1
-        yield f"data: {{\"frame\": {frame_idx}, \"vehicles\": {count}}}\n\n"
-        frame_idx += 1
-    cap.release()
+def video_feed_response(video_path: str, fps: Optional[float], width: Optional[int],
+                        quality: Optional[int]):
+    try:
+        stream = mjpeg_hub.stream_video_file(video_path, fps, width, quality)
+    except ViewerLimitError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=503)
+    return StreamingResponse(stream, media_type=MJPEG_MEDIA_TYPE)
 
 @app.get("/junction_video_feed/{direction}")
-def junction_video_feed(direction: str, junction: str = Query(...)):
+async def junction_video_feed(direction: str, junction: str = Query(...), fps: Optional[float] = Query(None),
+                              width: Optional[int] = Query(None), quality: Optional[int] = Query(None)):
     # Accept both single and double underscore naming for compatibility
     video_path1 = f"joined_videos/{junction}_{direction}.mp4"
     video_path2 = f"joined_videos/{junction}__{direction}.mp4"
     video_path = video_path1 if os.path.exists(video_path1) else video_path2
     if not os.path.exists(video_path):
         return JSONResponse(content={"error": "Video not found"}, status_code=404)
-    return StreamingResponse(generate_video_stream(video_path), media_type="multipart/x-mixed-replace; boundary=frame")
+    return video_feed_response(video_path, fps, width, quality)
 
 @app.get("/junction_vehicle_count/{direction}")
 def junction_vehicle_count(direction: str, junction: str = Query(...)):
+    if DETECTION_REPLAY:
+        index = find_index(junction, direction)
+        if index is None:
+            return JSONResponse(content={"error": "No detection index for this video"}, status_code=404)
+        return StreamingResponse(replay_vehicle_counter(index), media_type="text/event-stream")
     video_path1 = f"joined_videos/{junction}_{direction}.mp4"
     video_path2 = f"joined_videos/{junction}__{direction}.mp4"
     video_path = video_path1 if os.path.exists(video_path1) else video_path2
     if not os.path.exists(video_path):
         return JSONResponse(content={"error": "Video not found"}, status_code=404)
     def event_stream():
-        yield from frame_vehicle_counter(video_path, model)
+        yield from frame_vehicle_counter(video_path, model, MODEL_PATH)
     return StreamingResponse(event_stream(), media_type="text/event-stream")
 
 @app.get("/stitched_video_feed/{prefix}")
-def stitched_video_feed(prefix: str):
+async def stitched_video_feed(prefix: str, fps: Optional[float] = Query(None),
+                              width: Optional[int] = Query(None), quality: Optional[int] = Query(None)):
     video_path = f"stitched_videos/{prefix}.mp4"
     if not os.path.exists(video_path):
         return JSONResponse(content={"error": "Video not found"}, status_code=404)
-    return StreamingResponse(generate_video_stream(video_path), media_type="multipart/x-mixed-replace; boundary=frame")
+    return video_feed_response(video_path, fps, width, quality)
+
+@app.get("/video_stream_stats")
+def video_stream_stats():
+    """Viewers, renditions, encoded frames and per-viewer dropped frames for each MJPEG feed"""
+    return mjpeg_hub.stats()
 
 @app.get("/")
 def root():
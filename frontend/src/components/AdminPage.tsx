@@ -1,7 +1,13 @@
 
 import React, { useState, useEffect, useRef } from 'react';
 import JunctionSimulation from './JunctionSimulation';
-import { getAllVehicleCountsUrl, getVideoStreamUrl, updateSignalDirection } from '../utils/apiUtils';
+import {
+  getAllVehicleCountsUrl,
+  getSignalStatusUrl,
+  getSignalTiming,
+  getVideoStreamUrl,
+  updateSignalDirection,
+} from '../utils/apiUtils';
 import type { Junction, Direction } from '../utils/apiUtils';
 import './AdminPage.css';
 
@@ -20,56 +26,32 @@ const AdminPage: React.FC = () => {
   const [timer, setTimer] = useState<number>(60);
   const [greenTimes, setGreenTimes] = useState<{ [key: string]: number }>({ north: 30, east: 30, south: 30, west: 30 });
 
-  // Webster's formula implementation
-  function calculateWebsterGreenTimes(counts: { [key: string]: number }) {
-    // Webster's formula: C = (1.5L + 5) / (1 - Y),
-    // where L = total lost time per cycle (assume 16s for 4-way),
-    // Y = sum(y_i) = sum(flow/saturation), assume saturation = 1 vehicle/sec per direction
-    // For demo, flow = vehicle count, saturation = 1 veh/sec, so y_i = count/green_guess
-    // We'll distribute green time proportional to demand
-    const L = 16; // lost time per cycle (s)
-    const minGreen = 10; // minimum green per phase (s)
-    const totalVehicles = DIRECTIONS.reduce((sum, dir) => sum + (counts[dir] || 0), 0);
-    if (totalVehicles === 0) {
-      // Default split
-      return { north: 30, east: 30, south: 30, west: 30 };
-    }
-    // Proportional split
-    const cycle = Math.max(60, 1.5 * L + 5 + totalVehicles * 2); // simple scaling for demo
-    let greens: { [key: string]: number } = {};
-    DIRECTIONS.forEach(dir => {
-      greens[dir] = Math.max(minGreen, Math.round((counts[dir] || 0) / totalVehicles * (cycle - L)));
-    });
-    return greens;
-  }
-
-  // Recalculate green times whenever vehicleCounts change
-  useEffect(() => {
-    setGreenTimes(calculateWebsterGreenTimes(vehicleCounts));
-  }, [vehicleCounts]);
-
-  // Timer and signal cycling using dynamic green times
+  // Signal timing (Webster green splits and the phase clock) runs on the API
+  // server; follow its changes and count down the reported remaining green
   useEffect(() => {
-    setTimer(greenTimes[activeOverride] || 30);
-  }, [activeOverride, greenTimes]);
+    const es = new window.EventSource(getSignalStatusUrl(selectedJunction));
+    es.onmessage = async (event: MessageEvent) => {
+      try {
+        const data = JSON.parse(event.data);
+        setActiveOverride(data.active_signal);
+        const timing = await getSignalTiming(selectedJunction);
+        if (timing) {
+          setGreenTimes(timing.green_times);
+          setTimer(Math.round(timing.remaining));
+        }
+      } catch (e) {
+        console.error('[AdminPage] Error handling signal update:', e);
+      }
+    };
+    return () => es.close();
+  }, [selectedJunction]);
 
   useEffect(() => {
-    if (!greenTimes[activeOverride]) return;
-    if (timer <= 0) {
-      // Move to next direction
-      setActiveOverride(prevDir => {
-        const idx = DIRECTIONS.indexOf(prevDir);
-        const nextDir = DIRECTIONS[(idx + 1) % DIRECTIONS.length];
-        handleUpdateSignalStatus(nextDir); // Send automatic change to backend
-        return nextDir;
-      });
-      return;
-    }
     const interval = setInterval(() => {
       setTimer(prev => prev > 0 ? prev - 1 : 0);
     }, 1000);
     return () => clearInterval(interval);
-  }, [timer, greenTimes, activeOverride]);
+  }, []);
   
   const eventSourceRef = useRef<EventSource | null>(null);
 
@@ -85,8 +67,7 @@ const AdminPage: React.FC = () => {
   // Enhanced signal override handler
   const handleSignalOverride = (dir: Direction) => {
     setActiveOverride(dir);
-    setTimer(greenTimes[dir] || 30);
-    handleUpdateSignalStatus(dir); // Send to backend
+    handleUpdateSignalStatus(dir); // Send to backend; the server restarts the phase clock
   };
   // Setup single SSE for all directions (more efficient)
   useEffect(() => {
@@ -198,7 +179,7 @@ const AdminPage: React.FC = () => {
               Surveillance Camera Feed
             </div>
             <img
-              src={getVideoStreamUrl(selectedJunction)}
+              src={getVideoStreamUrl(selectedJunction, { width: 640, quality: 70 })}
               alt="video feed"
               className="admin-video-img"
             />
@@ -8,8 +8,12 @@ const JUNCTIONS = [
   { label: 'Junction 04', value: 'flipped_04' },
 ];
 
+// Approach the vehicle arrives from; this direction is held green on approval
+const DIRECTIONS = ['north', 'east', 'south', 'west'];
+
 const EmergencyRequest: React.FC = () => {
   const [junction, setJunction] = useState(JUNCTIONS[0].value);
+  const [direction, setDirection] = useState(DIRECTIONS[0]);
   const [vehicleId, setVehicleId] = useState('');
   const [cause, setCause] = useState('');
   const [status, setStatus] = useState<'idle'|'pending'|'approved'|'denied'|'sent'>('idle');
@@ -32,7 +36,7 @@ const EmergencyRequest: React.FC = () => {
           'Content-Type': 'application/json',
           'Authorization': `Bearer ${token}`
         },
-        body: JSON.stringify({ junction, vehicle_id: vehicleId, cause })
+        body: JSON.stringify({ junction, direction, vehicle_id: vehicleId, cause })
       });
       if (!res.ok) {
         const data = await res.json();
@@ -62,6 +66,12 @@ const EmergencyRequest: React.FC = () => {
               <option key={j.value} value={j.value}>{j.label}</option>
             ))}
           </select>
+          <label className="emergency-request-label">Approach Direction:</label>
+          <select className="emergency-request-dropdown" value={direction} onChange={e => setDirection(e.target.value)}>
+            {DIRECTIONS.map(d => (
+              <option key={d} value={d}>{d.charAt(0).toUpperCase() + d.slice(1)}</option>
+            ))}
+          </select>
           <label className="emergency-request-label">Vehicle ID:</label>
           <input className="emergency-request-input" value={vehicleId} onChange={e => setVehicleId(e.target.value)} required />
           <label className="emergency-request-label">Emergency Cause:</label>
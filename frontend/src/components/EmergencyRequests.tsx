@@ -1,4 +1,7 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
+import {
+  appendPage, fetchEmergencyPage, mergeFirstPage, subscribeEmergencyFeed, upsertRequest
+} from '../utils/apiUtils';
 import './EmergencyRequests.css';
 
 interface EmergencyRequest {
@@ -21,18 +24,16 @@ const JUNCTIONS = [
 const EmergencyRequests: React.FC = () => {
   const [requests, setRequests] = useState<EmergencyRequest[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  // Once older pages are loaded, refreshes must not reset the cursor
+  const morePagesLoaded = useRef(false);
 
   const fetchRequests = async () => {
-    const token = localStorage.getItem('jwt_token');
-    if (!token) return;
-
     try {
-      const res = await fetch('http://localhost:8000/emergency/requests', {
-        headers: { 'Authorization': `Bearer ${token}` }
-      });
-      if (res.ok) {
-        const data = await res.json();
-        setRequests(data);
+      const page = await fetchEmergencyPage<EmergencyRequest>('/emergency/requests');
+      if (page) {
+        setRequests(prev => mergeFirstPage(prev, page.items));
+        if (!morePagesLoaded.current) setNextCursor(page.next_cursor);
       }
     } catch (error) {
       console.error('Failed to fetch requests:', error);
@@ -40,11 +41,27 @@ const EmergencyRequests: React.FC = () => {
     setLoading(false);
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      const page = await fetchEmergencyPage<EmergencyRequest>('/emergency/requests', { cursor: nextCursor });
+      if (page) {
+        morePagesLoaded.current = true;
+        setRequests(prev => appendPage(prev, page.items));
+        setNextCursor(page.next_cursor);
+      }
+    } catch (error) {
+      console.error('Failed to load more requests:', error);
+    }
+  };
+
   useEffect(() => {
     fetchRequests();
-    // Refresh every 10 seconds
-    const interval = setInterval(fetchRequests, 10000);
-    return () => clearInterval(interval);
+    // Status changes are pushed by the server; refetch only on (re)connect
+    return subscribeEmergencyFeed<EmergencyRequest>(
+      request => setRequests(prev => upsertRequest(prev, request)),
+      fetchRequests
+    );
   }, []);
 
   const handleApprove = async (requestId: string) => {
@@ -58,8 +75,9 @@ const EmergencyRequests: React.FC = () => {
           'Authorization': `Bearer ${token}`
         }
       });
-      if (res.ok) {
-        fetchRequests(); // Refresh the list
+      // The change arrives on the emergency feed
+      if (!res.ok) {
+        console.error(`Request update failed: ${res.status}`);
       }
     } catch (error) {
       console.error('Failed to approve request:', error);
@@ -77,8 +95,9 @@ const EmergencyRequests: React.FC = () => {
           'Authorization': `Bearer ${token}`
         }
       });
-      if (res.ok) {
-        fetchRequests(); // Refresh the list
+      // The change arrives on the emergency feed
+      if (!res.ok) {
+        console.error(`Request update failed: ${res.status}`);
       }
     } catch (error) {
       console.error('Failed to deny request:', error);
@@ -159,6 +178,11 @@ const EmergencyRequests: React.FC = () => {
             ))}
           </div>
         )}
+        {nextCursor && (
+          <button className="emergency-requests-load-more" onClick={loadMore}>
+            Load older requests
+          </button>
+        )}
       </div>
     </div>
   );
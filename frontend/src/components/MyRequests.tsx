@@ -1,4 +1,7 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
+import {
+  appendPage, fetchEmergencyPage, mergeFirstPage, subscribeEmergencyFeed, upsertRequest
+} from '../utils/apiUtils';
 import './MyRequests.css';
 
 interface EmergencyRequest {
@@ -22,6 +25,9 @@ const JUNCTIONS = [
 const MyRequests: React.FC = () => {
   const [requests, setRequests] = useState<EmergencyRequest[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  // Once older pages are loaded, refreshes must not reset the cursor
+  const morePagesLoaded = useRef(false);
 
   const getJunctionLabel = (value: string) => {
     const junction = JUNCTIONS.find(j => j.value === value);
@@ -47,16 +53,11 @@ const MyRequests: React.FC = () => {
   };
 
   const fetchMyRequests = async () => {
-    const token = localStorage.getItem('jwt_token');
-    if (!token) return;
-
     try {
-      const res = await fetch('http://localhost:8000/emergency/my-requests', {
-        headers: { 'Authorization': `Bearer ${token}` }
-      });
-      if (res.ok) {
-        const data = await res.json();
-        setRequests(data);
+      const page = await fetchEmergencyPage<EmergencyRequest>('/emergency/my-requests');
+      if (page) {
+        setRequests(prev => mergeFirstPage(prev, page.items));
+        if (!morePagesLoaded.current) setNextCursor(page.next_cursor);
       }
     } catch (error) {
       console.error('Failed to fetch my requests:', error);
@@ -64,11 +65,27 @@ const MyRequests: React.FC = () => {
     setLoading(false);
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      const page = await fetchEmergencyPage<EmergencyRequest>('/emergency/my-requests', { cursor: nextCursor });
+      if (page) {
+        morePagesLoaded.current = true;
+        setRequests(prev => appendPage(prev, page.items));
+        setNextCursor(page.next_cursor);
+      }
+    } catch (error) {
+      console.error('Failed to load more my requests:', error);
+    }
+  };
+
   useEffect(() => {
     fetchMyRequests();
-    // Refresh every 30 seconds to check for status updates
-    const interval = setInterval(fetchMyRequests, 30000);
-    return () => clearInterval(interval);
+    // Status changes are pushed by the server; refetch only on (re)connect
+    return subscribeEmergencyFeed<EmergencyRequest>(
+      request => setRequests(prev => upsertRequest(prev, request)),
+      fetchMyRequests
+    );
   }, []);
 
   const formatDate = (dateString: string) => {
@@ -147,6 +164,11 @@ const MyRequests: React.FC = () => {
           ))}
         </div>
       )}
+      {nextCursor && (
+        <button className="load-more-btn" onClick={loadMore}>
+          Load older requests
+        </button>
+      )}
     </div>
   );
 };
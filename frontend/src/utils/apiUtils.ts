@@ -7,13 +7,8 @@ export type Direction = 'north' | 'east' | 'south' | 'west';
 const API_BASE = 'http://localhost:8000';
 const DRONE_BASE = 'http://localhost:8002';
 
-// Junction mapping for drone system (direct mapping now)
-const DRONE_JUNCTION_MAP: Record<Junction, string> = {
-  'normal_01': 'junction_01_normal',
-  'normal_02': 'junction_02_normal', 
-  'flipped_03': 'junction_03_flipped',
-  'flipped_04': 'junction_04_flipped'
-};
+// Both servers resolve these identifiers through their junction registry,
+// so no per-server name mapping is needed here.
 
 /**
  * Get vehicle count endpoint URL for drone detection
@@ -22,8 +17,7 @@ export const getVehicleCountUrl = (
   direction: Direction,
   junction: Junction
 ): string => {
-  const droneJunction = DRONE_JUNCTION_MAP[junction];
-  return `${DRONE_BASE}/drone/junction_vehicle_count/${direction}?junction=${droneJunction}`;
+  return `${DRONE_BASE}/drone/junction_vehicle_count/${direction}?junction=${junction}`;
 };
 
 /**
@@ -31,32 +25,51 @@ export const getVehicleCountUrl = (
  * Uses the 'north' endpoint but extracts all_directions data
  */
 export const getAllVehicleCountsUrl = (junction: Junction): string => {
-  const droneJunction = DRONE_JUNCTION_MAP[junction];
-  return `${DRONE_BASE}/drone/junction_vehicle_count/north?junction=${droneJunction}`;
+  return `${DRONE_BASE}/drone/junction_vehicle_count/north?junction=${junction}`;
 };
 
 /**
  * Get signal status endpoint URL for API server
  */
 export const getSignalStatusUrl = (junction: Junction): string => {
-  // Map junction names to API server format
-  const junctionMap: Record<Junction, string> = {
-    'normal_01': '01_',
-    'normal_02': '02_',
-    'flipped_03': '05_',
-    'flipped_04': 'rifatuslu_'
-  };
-  
-  const apiJunction = junctionMap[junction] || junction;
-  return `${API_BASE}/junction_signal_status?junction=${apiJunction}`;
+  return `${API_BASE}/junction_signal_status?junction=${junction}`;
+};
+
+export interface SignalTiming {
+  junction: string;
+  active_signal: Direction;
+  remaining: number;
+  green_times: Record<Direction, number>;
+  counts: Record<Direction, number>;
+}
+
+/**
+ * Get the server-side signal controller's timing for a junction
+ */
+export const getSignalTiming = async (junction: Junction): Promise<SignalTiming | null> => {
+  try {
+    const response = await fetch(`${API_BASE}/signal_controller/${junction}`);
+    if (!response.ok) return null;
+    return await response.json();
+  } catch (error) {
+    console.error('Failed to fetch signal timing:', error);
+    return null;
+  }
 };
 
 /**
  * Get video stream URL for drone detection
+ * Pass width/quality to get a smaller rendition (e.g. for thumbnails)
  */
-export const getVideoStreamUrl = (junction: Junction): string => {
-  const droneJunction = DRONE_JUNCTION_MAP[junction];
-  return `${DRONE_BASE}/drone/video_stream/${droneJunction}`;
+export const getVideoStreamUrl = (
+  junction: Junction,
+  options: { width?: number; quality?: number } = {}
+): string => {
+  const params = new URLSearchParams();
+  if (options.width) params.set('width', String(options.width));
+  if (options.quality) params.set('quality', String(options.quality));
+  const query = params.toString();
+  return `${DRONE_BASE}/drone/video_stream/${junction}${query ? `?${query}` : ''}`;
 };
 
 /**
@@ -67,17 +80,7 @@ export const updateSignalDirection = async (
   direction: Direction
 ): Promise<void> => {
   try {
-    // Map junction names to API server format
-    const junctionMap: Record<Junction, string> = {
-      'normal_01': '01_',
-      'normal_02': '02_',
-      'flipped_03': '05_',
-      'flipped_04': 'rifatuslu_'
-    };
-    
-    const apiJunction = junctionMap[junction] || junction;
-    
-    const response = await fetch(`${API_BASE}/junction_signal_status?junction=${apiJunction}&direction=${direction}`, {
+    const response = await fetch(`${API_BASE}/junction_signal_status?junction=${junction}&direction=${direction}`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -96,6 +99,25 @@ export const updateSignalDirection = async (
   }
 };
 
+/**
+ * Update several junctions' signals in one request (e.g. a green wave)
+ */
+export const updateSignalDirections = async (
+  updates: Partial<Record<Junction, Direction>>
+): Promise<void> => {
+  const response = await fetch(`${API_BASE}/junction_signal_status/batch`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({ updates }),
+  });
+
+  if (!response.ok) {
+    throw new Error(`Failed to update signals: ${response.status}`);
+  }
+};
+
 /**
  * Get available junctions for drone system
  */
@@ -123,5 +145,131 @@ export const getSystemStatus = async (): Promise<any> => {
   }
 };
 
+export interface Page<T> {
+  items: T[];
+  next_cursor: string | null;
+}
+
+/**
+ * Fetch one page of emergency requests, newest first.
+ * Pass the previous page's next_cursor to get the following page.
+ */
+export const fetchEmergencyPage = async <T extends { _id: string }>(
+  path: '/emergency/requests' | '/emergency/my-requests',
+  options: { cursor?: string | null; status?: string; limit?: number } = {}
+): Promise<Page<T> | null> => {
+  const token = localStorage.getItem('jwt_token');
+  if (!token) return null;
+
+  const params = new URLSearchParams();
+  if (options.cursor) params.set('cursor', options.cursor);
+  if (options.status) params.set('status', options.status);
+  if (options.limit) params.set('limit', String(options.limit));
+  const query = params.toString();
+  const res = await fetch(`${API_BASE}${path}${query ? `?${query}` : ''}`, {
+    headers: { 'Authorization': `Bearer ${token}` }
+  });
+  if (!res.ok) return null;
+  return await res.json();
+};
+
+/**
+ * Merge a freshly fetched first page into an already loaded list: the first
+ * page replaces the newest entries, older pages loaded earlier are kept.
+ * ObjectId strings sort in creation order.
+ */
+export const mergeFirstPage = <T extends { _id: string }>(loaded: T[], firstPage: T[]): T[] => {
+  if (firstPage.length === 0) return [];
+  const oldest = firstPage[firstPage.length - 1]._id;
+  return [...firstPage, ...loaded.filter(r => r._id < oldest)];
+};
+
+/**
+ * Append a further page, skipping anything already loaded
+ */
+export const appendPage = <T extends { _id: string }>(loaded: T[], page: T[]): T[] => {
+  const seen = new Set(loaded.map(r => r._id));
+  return [...loaded, ...page.filter(r => !seen.has(r._id))];
+};
+
+export interface EmergencyFeedEvent<T> {
+  type: 'ready' | 'insert' | 'update';
+  request?: T;
+}
+
+const FEED_RETRY_MS = 3000;
+
+/**
+ * Follow the server's emergency request feed (inserts and status changes).
+ * onOpen fires on every (re)connection so callers can refetch what they may
+ * have missed; returns a function that closes the feed.
+ */
+export const subscribeEmergencyFeed = <T extends { _id: string }>(
+  onChange: (request: T) => void,
+  onOpen: () => void
+): (() => void) => {
+  const token = localStorage.getItem('jwt_token');
+  if (!token) return () => {};
+
+  let source: EventSource | null = null;
+  let retry: ReturnType<typeof setTimeout> | undefined;
+  let closed = false;
+
+  const reconnect = () => {
+    if (!closed) retry = setTimeout(connect, FEED_RETRY_MS);
+  };
+
+  const connect = async () => {
+    try {
+      // EventSource cannot send an Authorization header, so the URL carries a
+      // short-lived ticket instead of the access token
+      const res = await fetch(`${API_BASE}/emergency/feed/ticket`, {
+        method: 'POST',
+        headers: { 'Authorization': `Bearer ${token}` }
+      });
+      if (!res.ok) throw new Error(`Feed ticket request failed: ${res.status}`);
+      const { ticket } = await res.json();
+      if (closed) return;
+      source = new EventSource(`${API_BASE}/emergency/feed?ticket=${encodeURIComponent(ticket)}`);
+      source.onopen = onOpen;
+      source.onmessage = (event) => {
+        const data: EmergencyFeedEvent<T> = JSON.parse(event.data);
+        if (data.request) onChange(data.request);
+      };
+      source.onerror = () => {
+        // The browser would retry with the same, by then expired, ticket
+        source?.close();
+        reconnect();
+      };
+    } catch (error) {
+      console.error('Failed to open emergency feed:', error);
+      reconnect();
+    }
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    clearTimeout(retry);
+    source?.close();
+  };
+};
+
+/**
+ * Apply a feed change to a loaded list: replace the request if present,
+ * otherwise insert it in newest-first order
+ */
+export const upsertRequest = <T extends { _id: string }>(loaded: T[], request: T): T[] => {
+  const index = loaded.findIndex(r => r._id === request._id);
+  if (index >= 0) {
+    const next = [...loaded];
+    next[index] = { ...loaded[index], ...request };
+    return next;
+  }
+  const position = loaded.findIndex(r => r._id < request._id);
+  if (position < 0) return [...loaded, request];
+  return [...loaded.slice(0, position), request, ...loaded.slice(position)];
+};
+
 // Export base URLs for direct usage if needed
 export { API_BASE, DRONE_BASE };
\ No newline at end of file